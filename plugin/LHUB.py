@@ -7,16 +7,32 @@
 # <bitbar.desc>Various helpful actions for LogicHub engineers</bitbar.desc>
 # <bitbar.dependencies>See readme.md</bitbar.dependencies>
 
+import array
+import asyncio
 import base64
 import configobj
+import gzip
+import hashlib
+import io
 import json
+import math
+import mmap
 import os
+import queue
 import re
 import sqlparse
 import subprocess
 import shlex
+import signal
+import socket
+import sqlite3
+import statistics
 import sys
+import threading
+import time
+import uuid
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
 import traceback
@@ -44,8 +60,12 @@ chrome_driver_error = None
 try:
     from selenium import webdriver
     from selenium.webdriver.chrome.options import Options
+    from selenium.common.exceptions import TimeoutException
 except:
     chrome_driver_error = "selenium import failed"
+
+    class TimeoutException(Exception):
+        pass
 else:
     chromedriver = distutils.spawn.find_executable("chromedriver")
     if not chromedriver:
@@ -141,6 +161,262 @@ class Browser:
         return save_path
 
 
+class BrowserPoolServer:
+    """
+    Keep a headless Chrome warm in a background process, so screenshots don't pay for a cold browser launch.
+
+    Requests arrive over a unix socket, one JSON line each, and are handled one at a time. Each capture loads
+    in a fresh tab which is closed afterwards. The browser is recycled after max_captures captures (or if it
+    stops responding), and the server exits, quitting Chrome, after idle_timeout seconds without a request.
+    A page which takes longer than page_load_timeout seconds to load fails its capture, so one hung page
+    can't stall every later request.
+    """
+    def __init__(self, socket_path, idle_timeout=600, max_captures=200, page_load_timeout=30):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.page_load_timeout = page_load_timeout
+        self.max_captures = max_captures
+        self.browser = None
+        self.captures = 0
+
+    def _get_browser(self):
+        if self.browser and self.captures >= self.max_captures:
+            self._quit_browser()
+        if not self.browser:
+            self.browser = Browser()
+            self.browser.driver.set_page_load_timeout(self.page_load_timeout)
+            self.captures = 0
+        return self.browser
+
+    def _quit_browser(self):
+        if self.browser:
+            try:
+                self.browser.driver.quit()
+            except Exception:
+                pass
+        self.browser = None
+
+    def capture(self, url, save_path, window_size=None):
+        driver = self._get_browser().driver
+        base_handle = driver.current_window_handle
+        driver.execute_script("window.open('about:blank', '_blank');")
+        driver.switch_to.window([h for h in driver.window_handles if h != base_handle][-1])
+        try:
+            width, height = re.split(r"[x,]", (window_size or self.browser.window_size).replace(" ", ""))
+            driver.set_window_size(int(width), int(height))
+            driver.get(url)
+            if not driver.save_screenshot(save_path):
+                raise RuntimeError(f"Failed to save screenshot to {save_path}")
+        finally:
+            driver.close()
+            driver.switch_to.window(base_handle)
+        self.captures += 1
+        return save_path
+
+    def _handle(self, conn):
+        with conn.makefile("rw") as stream:
+            line = stream.readline()
+            if not line.strip():
+                # Connection check (see BrowserPoolClient.available)
+                return
+            start = time.time()
+            try:
+                request = json.loads(line)
+                response = {"path": self.capture(request["url"], request["save_path"], request.get("window_size"))}
+            except (ValueError, KeyError) as err:
+                response = {"error": f"Invalid request: {err}"}
+            except TimeoutException:
+                # The tab has already been closed, and the browser itself is still fine
+                response = {"error": f"Page did not load within {self.page_load_timeout} seconds"}
+            except Exception as err:
+                # Assume the browser is in a bad state; the next request gets a fresh one
+                self._quit_browser()
+                response = {"error": f"{type(err).__name__}: {err}"}
+            response["seconds"] = time.time() - start
+            stream.write(json.dumps(response) + "\n")
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        # Start the browser before listening, so clients only connect once captures will be fast
+        self._get_browser()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(16)
+        server.settimeout(self.idle_timeout)
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    break
+                with conn:
+                    conn.settimeout(None)
+                    try:
+                        self._handle(conn)
+                    except OSError:
+                        # Client went away before the response was written
+                        pass
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self._quit_browser()
+
+
+class BrowserPoolClient:
+    """Client for BrowserPoolServer"""
+    def __init__(self, socket_path, timeout=60):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def available(self):
+        try:
+            self._connect().close()
+        except OSError:
+            return False
+        return True
+
+    def screenshot(self, url, save_path, window_size=None):
+        with self._connect() as sock, sock.makefile("rw") as stream:
+            stream.write(json.dumps({"url": url, "save_path": save_path, "window_size": window_size}) + "\n")
+            stream.flush()
+            response = json.loads(stream.readline() or "{}")
+        if not response.get("path"):
+            raise RuntimeError(response.get("error") or "No response from browser pool")
+        return response["path"]
+
+
+class BatchScreenshotter:
+    """
+    Screenshot many URLs or HTML files across several headless browsers at once (one per worker thread; each
+    browser is its own process, so throughput scales with the worker count). Every item has a page load
+    timeout, and results are written with deterministic names (input order, name and a hash of the item)
+    plus a manifest, so reruns over the same list produce the same file names.
+    """
+    html_extensions = (".html", ".htm")
+
+    def __init__(self, workers=4, timeout=30, full_page=False, window_size=None):
+        self.workers = max(int(workers), 1)
+        self.timeout = timeout
+        self.full_page = full_page
+        self.window_size = window_size
+        self._local = threading.local()
+        self._browsers = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def resolve_items(cls, text):
+        """
+        Turn input into a list of URLs: a directory (all HTML files in it), a file listing URLs/paths
+        (one per line), or the list itself. Local paths are converted to file:// URLs.
+        """
+        lines = [_line.strip() for _line in (text or "").splitlines() if _line.strip() and not _line.strip().startswith("#")]
+        if len(lines) == 1:
+            path = os.path.expanduser(lines[0])
+            if os.path.isdir(path):
+                lines = sorted(
+                    os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(cls.html_extensions))
+            elif os.path.isfile(path) and not path.lower().endswith(cls.html_extensions):
+                with open(path) as list_file:
+                    return cls.resolve_items(list_file.read())
+        items = []
+        for _line in lines:
+            if re.match(r"^[a-z][a-z0-9+.-]*://", _line, re.I):
+                items.append(_line)
+            else:
+                items.append(Path(os.path.expanduser(_line)).resolve().as_uri())
+        return items
+
+    @staticmethod
+    def output_name(index, url):
+        stem = re.sub(r"\.html?$", "", url.rstrip("/").rsplit("/", 1)[-1], flags=re.I)
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", stem).strip("_")[:40] or "page"
+        return f"{index:03d}_{slug}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}.png"
+
+    def _browser(self):
+        browser = getattr(self._local, "browser", None)
+        if browser is None:
+            browser = Browser(window_size=self.window_size)
+            browser.driver.set_page_load_timeout(self.timeout)
+            self._local.browser = browser
+            with self._lock:
+                self._browsers.append(browser)
+        return browser
+
+    def _discard_browser(self):
+        browser = getattr(self._local, "browser", None)
+        self._local.browser = None
+        if browser:
+            with self._lock:
+                self._browsers.remove(browser)
+            try:
+                browser.driver.quit()
+            except Exception:
+                pass
+
+    def _capture(self, index, url, output_dir):
+        result = {"index": index, "url": url, "file": self.output_name(index, url), "worker": threading.current_thread().name}
+        start = time.time()
+        try:
+            driver = self._browser().driver
+            driver.get(url)
+            if self.full_page:
+                width = driver.get_window_size()["width"]
+                height = driver.execute_script(
+                    "return Math.max(document.body.scrollHeight, document.documentElement.scrollHeight);")
+                driver.set_window_size(width, max(int(height), 1))
+            try:
+                if not driver.save_screenshot(os.path.join(output_dir, result["file"])):
+                    raise RuntimeError("Screenshot was not saved")
+            finally:
+                if self.full_page:
+                    width, height = self._browser().window_size.split(",")
+                    driver.set_window_size(int(width), int(height))
+            result.update(status="ok", error=None)
+        except Exception as err:
+            # Timeouts and crashes can leave the browser mid-load, so this worker starts over with a new one
+            self._discard_browser()
+            result.update(status="failed", error=f"{type(err).__name__}: {str(err).strip().splitlines()[0] if str(err).strip() else ''}", file=None)
+        result["seconds"] = round(time.time() - start, 3)
+        return result
+
+    def run(self, urls, output_dir, progress=None):
+        """
+        :param urls: list of URLs
+        :param output_dir: directory for screenshots and manifest.json
+        :param progress: optional callback, called with each result as it completes
+        :return: list of results (in input order)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(urls)) or 1, thread_name_prefix="screenshot") as executor:
+                futures = [executor.submit(self._capture, n, url, output_dir) for n, url in enumerate(urls, start=1)]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    if progress:
+                        progress(results[-1])
+        finally:
+            for browser in list(self._browsers):
+                try:
+                    browser.driver.quit()
+                except Exception:
+                    pass
+            self._browsers = []
+        results.sort(key=lambda r: r["index"])
+        Reusable.write_json_file(os.path.join(output_dir, "manifest.json"), {
+            "created": datetime.now().isoformat(timespec="seconds"), "workers": self.workers,
+            "full_page": self.full_page, "timeout": self.timeout, "items": results})
+        return results
+
+
 class Reusable:
     # Class for static reusable methods, mainly just to group these together to better organize for readability
 
@@ -283,9 +559,1741 @@ class Reusable:
         return os.path.abspath(_temp_file)
 
     @staticmethod
-    def sort_dict_by_values(_input, reverse=False):
-        # return sorted(_input.items(), key=lambda x: x[1], reverse=reverse)
-        return {k: v for k, v in sorted(_input.items(), key=lambda x: x[1], reverse=reverse)}
+    def sort_dict_by_values(_input, reverse=False):
+        # return sorted(_input.items(), key=lambda x: x[1], reverse=reverse)
+        return {k: v for k, v in sorted(_input.items(), key=lambda x: x[1], reverse=reverse)}
+
+    @staticmethod
+    def read_json_file(file_path, default=None):
+        """Read a JSON state/cache file, returning the default if it is missing or unreadable"""
+        try:
+            with open(file_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def write_json_file(file_path, data):
+        """Write a JSON state/cache file atomically, so that readers never see a partial file"""
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, file_path)
+
+    @staticmethod
+    def format_duration(seconds):
+        """Short human-readable duration, such as 45s, 12m, or 3h05m"""
+        seconds = int(seconds)
+        if seconds < 60:
+            return f"{seconds}s"
+        if seconds < 3600:
+            return f"{seconds // 60}m"
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+
+    @staticmethod
+    def percentile(sorted_values, pct):
+        """
+        Percentile with linear interpolation between the closest ranks (same as numpy's default)
+
+        :param sorted_values: Sequence of numbers, already sorted ascending
+        :param pct: Percentile, from 0 to 100
+        """
+        if not len(sorted_values):
+            return None
+        position = (len(sorted_values) - 1) * pct / 100
+        lower = int(position)
+        upper = min(lower + 1, len(sorted_values) - 1)
+        return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class InlineTable:
+    """
+    Streaming converter for pasted spreadsheet data (TSV or CSV with a header row)
+    into LQL inline tables or Postgres VALUES lists.
+
+    Rows are never held in memory all at once: the source is read twice (once to
+    detect a type for each column, once to render), and output is yielded as a
+    series of statements, each kept under max_statement_size characters.
+    """
+    # Column types, in order of precedence when merging
+    type_null = "null"
+    type_boolean = "boolean"
+    type_bigint = "bigint"
+    type_double = "double"
+    type_string = "string"
+
+    null_values = ("", "null", "NULL", "None")
+    # Numbers with leading zeros (zip codes, IDs, etc.) are intentionally left as strings
+    pattern_bigint = re.compile(r"^[+-]?(?:0|[1-9]\d*)$")
+    pattern_double = re.compile(r"^[+-]?(?:(?:0|[1-9]\d*)(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?$")
+    pattern_boolean = re.compile(r"^(?:true|false)$", re.IGNORECASE)
+
+    def __init__(self, text: str = None, file_path: str = None, delimiter: str = None, max_statement_size: int = 500000):
+        """
+        :param text: Delimited text, such as the contents of the clipboard
+        :param file_path: Alternatively, the path to a delimited file (read lazily)
+        :param delimiter: Field delimiter. If not provided, tab is used when the header contains one, otherwise comma
+        :param max_statement_size: Maximum number of characters per generated statement
+        """
+        assert text or file_path, "No input provided"
+        self.text = text
+        self.file_path = file_path
+        self.max_statement_size = max(int(max_statement_size), 1)
+        self.delimiter = delimiter or self._detect_delimiter()
+        self.columns = []
+        self.column_types = []
+
+    def _open_lines(self):
+        if self.file_path:
+            return open(self.file_path, "r", newline="")
+        return io.StringIO(self.text, newline=None)
+
+    def _detect_delimiter(self):
+        with self._open_lines() as f:
+            header = f.readline()
+        return "\t" if "\t" in header else ","
+
+    def _iter_rows(self):
+        """Yield the header row, followed by every non-blank data row"""
+        with self._open_lines() as f:
+            for row in csv.reader(f, delimiter=self.delimiter):
+                if row and any(cell.strip() for cell in row):
+                    yield row
+
+    @classmethod
+    def detect_value_type(cls, value: str):
+        value = value.strip()
+        if value in cls.null_values:
+            return cls.type_null
+        if cls.pattern_boolean.match(value):
+            return cls.type_boolean
+        if cls.pattern_bigint.match(value):
+            return cls.type_bigint
+        if cls.pattern_double.match(value):
+            return cls.type_double
+        return cls.type_string
+
+    @classmethod
+    def merge_types(cls, current_type, new_type):
+        if current_type == new_type or new_type == cls.type_null:
+            return current_type
+        if current_type == cls.type_null:
+            return new_type
+        if {current_type, new_type} == {cls.type_bigint, cls.type_double}:
+            return cls.type_double
+        return cls.type_string
+
+    def analyze(self):
+        """First pass: read the header and settle on a single type for every column"""
+        rows = self._iter_rows()
+        header = next(rows, None)
+        if not header:
+            raise ValueError("No header row found")
+        self.columns = [c.strip() or f"col_{n + 1}" for n, c in enumerate(header)]
+        self.column_types = [self.type_null] * len(self.columns)
+        for row_num, row in enumerate(rows, start=2):
+            if len(row) > len(self.columns):
+                raise ValueError(f"Row {row_num} has {len(row)} fields, but the header only has {len(self.columns)}")
+            for n, value in enumerate(row):
+                if self.column_types[n] != self.type_string:
+                    self.column_types[n] = self.merge_types(self.column_types[n], self.detect_value_type(value))
+        # Columns without a single value are treated as strings
+        self.column_types = [self.type_string if t == self.type_null else t for t in self.column_types]
+        return list(zip(self.columns, self.column_types))
+
+    @staticmethod
+    def _quote_identifier(name, style):
+        if re.match(r"^[A-Za-z_]\w*$", name):
+            return name
+        if style == "lql":
+            return "`{}`".format(name.replace("`", "``"))
+        return '"{}"'.format(name.replace('"', '""'))
+
+    @staticmethod
+    def _quote_string(value, style):
+        if style == "lql":
+            # Spark SQL string literals use backslash escapes
+            value = value.replace("\\", "\\\\").replace("'", "\\'").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+        else:
+            value = value.replace("'", "''")
+        return f"'{value}'"
+
+    def format_value(self, value, column_type, style):
+        stripped = value.strip()
+        if stripped in self.null_values:
+            return "NULL"
+        if column_type == self.type_boolean:
+            return stripped.lower()
+        if column_type in (self.type_bigint, self.type_double):
+            return stripped
+        return self._quote_string(value, style)
+
+    def _statement_wrappers(self, style):
+        column_list = ", ".join(self._quote_identifier(c, style) for c in self.columns)
+        if style == "lql":
+            return "SELECT * FROM VALUES\n  ", f"\nAS data({column_list})"
+        return f"-- columns: {column_list}\nVALUES\n  ", ";"
+
+    def iter_statements(self, style="lql"):
+        """
+        Second pass: yield complete statements, each under max_statement_size
+        characters (unless a single row is larger than the limit by itself)
+
+        :param style: "lql" for a Spark/LQL inline table, or "values" for a Postgres VALUES list
+        """
+        assert style in ("lql", "values"), f"Unsupported inline table style: {style}"
+        if not self.columns:
+            self.analyze()
+        prefix, suffix = self._statement_wrappers(style)
+        separator = ",\n  "
+        wrapper_size = len(prefix) + len(suffix)
+
+        pending, pending_size = [], wrapper_size
+        rows = self._iter_rows()
+        next(rows, None)
+        for row in rows:
+            row = row + [""] * (len(self.columns) - len(row))
+            row_str = "({})".format(", ".join(self.format_value(v, t, style) for v, t in zip(row, self.column_types)))
+            added_size = len(row_str) + (len(separator) if pending else 0)
+            if pending and pending_size + added_size > self.max_statement_size:
+                yield prefix + separator.join(pending) + suffix
+                pending, pending_size = [], wrapper_size
+                added_size = len(row_str)
+            pending.append(row_str)
+            pending_size += added_size
+        if pending:
+            yield prefix + separator.join(pending) + suffix
+
+
+class RuntimeStatsAggregator:
+    """
+    Aggregate runtimeStats across many batches. Batch records are streamed from
+    a directory of JSON/NDJSON files or from a single NDJSON file, and only the
+    per-node timings are kept, packed into typed arrays rather than lists of
+    Python floats, so tens of thousands of batches fit comfortably in memory.
+    """
+    file_extensions = (".json", ".ndjson", ".jsonl")
+    percentiles = (50, 95, 99)
+
+    def __init__(self):
+        self.node_times = {}
+        self.execution_times = array.array("d")
+        self.batch_count = 0
+        self.skipped_records = 0
+
+    @staticmethod
+    def iter_records(path):
+        """Yield every JSON record found at the given path, one at a time"""
+        path = os.path.expanduser(path)
+        if os.path.isdir(path):
+            file_paths = sorted(
+                os.path.join(root, f) for root, _, files in os.walk(path) for f in files
+                if f.lower().endswith(RuntimeStatsAggregator.file_extensions)
+            )
+        elif os.path.isfile(path):
+            file_paths = [path]
+        else:
+            raise FileNotFoundError(f"Path not found: {path}")
+
+        for file_path in file_paths:
+            with open(file_path, "r") as f:
+                first_char = f.read(1)
+                f.seek(0)
+                if file_path.lower().endswith(".json") and first_char == "[":
+                    # A regular JSON file containing a list of batches
+                    yield from json.load(f, strict=False)
+                    continue
+                for line_num, line in enumerate(f, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line, strict=False)
+                    except json.JSONDecodeError:
+                        if line_num == 1 and file_path.lower().endswith(".json"):
+                            # A single (pretty-printed) JSON document rather than NDJSON
+                            f.seek(0)
+                            yield json.load(f, strict=False)
+                            break
+                        raise
+
+    def add_batch(self, record):
+        stats = record.get("runtimeStats") if isinstance(record, dict) else None
+        if not stats or not isinstance(stats, dict):
+            self.skipped_records += 1
+            return
+        self.batch_count += 1
+        if isinstance(record.get("executionTimeMs"), Number):
+            self.execution_times.append(record["executionTimeMs"])
+        for node, time_ms in stats.items():
+            if isinstance(time_ms, Number):
+                self.node_times.setdefault(node, array.array("d")).append(time_ms)
+
+    def add_path(self, path):
+        for record in self.iter_records(path):
+            self.add_batch(record)
+
+    @classmethod
+    def summarize(cls, values):
+        values = array.array("d", sorted(values))
+        total = math.fsum(values)
+        summary = {
+            "count": len(values),
+            "total": total,
+            "mean": total / len(values) if values else None,
+        }
+        for pct in cls.percentiles:
+            summary[f"p{pct}"] = Reusable.percentile(values, pct)
+        summary["max"] = values[-1] if values else None
+        return summary
+
+    def ranked_nodes(self):
+        """Per-node summaries, ordered by the total runtime each node accounts for"""
+        summaries = {node: self.summarize(times) for node, times in self.node_times.items()}
+        grand_total = math.fsum(s["total"] for s in summaries.values()) or 1
+        ranked = []
+        for node, summary in sorted(summaries.items(), key=lambda x: x[1]["total"], reverse=True):
+            summary["share_pct"] = round(100 * summary["total"] / grand_total, 2)
+            ranked.append(dict(node_name=node, **summary))
+        return ranked
+
+    def write_csv(self, csv_file):
+        fieldnames = ["node_name", "count", "total", "share_pct", "mean"] + [f"p{pct}" for pct in self.percentiles] + ["max"]
+        with open(csv_file, "w") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            rows = self.ranked_nodes()
+            if self.execution_times:
+                rows.insert(0, dict(node_name="executionTimeMs", **self.summarize(self.execution_times)))
+            for row in rows:
+                writer.writerow({k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()})
+        return csv_file
+
+
+class RuntimeStatsHistory:
+    """
+    Local SQLite store of every runtimeStats payload processed by the plugin,
+    keyed by stream/flow, batch and node, for tracking playbook performance over time
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS batches (
+            id INTEGER PRIMARY KEY,
+            recorded_at REAL NOT NULL,
+            stream TEXT NOT NULL,
+            flow TEXT NOT NULL,
+            batch TEXT NOT NULL,
+            version INTEGER,
+            execution_time_ms REAL,
+            UNIQUE (stream, flow, batch)
+        );
+        CREATE INDEX IF NOT EXISTS idx_batches_recorded_at ON batches (recorded_at);
+        CREATE INDEX IF NOT EXISTS idx_batches_flow_version ON batches (flow, version);
+        CREATE TABLE IF NOT EXISTS node_stats (
+            batch_row INTEGER NOT NULL,
+            node TEXT NOT NULL,
+            time_ms REAL NOT NULL,
+            PRIMARY KEY (batch_row, node)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_node_stats_node ON node_stats (node, batch_row);
+    """
+
+    # Batch JSON key names vary a little between LogicHub versions and export paths, so check all known variants
+    keys_stream = ("streamId", "stream_id", "stream")
+    keys_flow = ("flowId", "flow_id", "flow")
+    keys_batch = ("batchId", "batch_id", "id")
+    keys_version = ("flowVersion", "flow_version", "version")
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(self.schema)
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def _first_value(record, keys):
+        for k in keys:
+            if record.get(k) not in (None, ""):
+                return record[k]
+        return None
+
+    def record_batch(self, record, recorded_at=None):
+        """
+        Store one batch. Recording the same batch again replaces its previous entry.
+        If the payload carries no batch ID, a hash of its stats is used instead so that
+        re-processing the same clipboard contents does not create duplicates.
+        """
+        stats = {k: v for k, v in (record.get("runtimeStats") or {}).items() if isinstance(v, Number)}
+        if not stats:
+            return None
+        stream = str(self._first_value(record, self.keys_stream) or "")
+        flow = str(self._first_value(record, self.keys_flow) or "")
+        batch = self._first_value(record, self.keys_batch)
+        if batch is None:
+            batch = "sha1:" + hashlib.sha1(json.dumps(stats, sort_keys=True).encode()).hexdigest()
+        version = self._first_value(record, self.keys_version)
+        try:
+            version = int(version) if version is not None else None
+        except (TypeError, ValueError):
+            version = None
+        execution_time = record.get("executionTimeMs") if isinstance(record.get("executionTimeMs"), Number) else None
+
+        with self.db:
+            cursor = self.db.execute(
+                "SELECT id FROM batches WHERE stream = ? AND flow = ? AND batch = ?", (stream, flow, str(batch)))
+            existing = cursor.fetchone()
+            if existing:
+                self.db.execute("DELETE FROM node_stats WHERE batch_row = ?", existing)
+                self.db.execute("DELETE FROM batches WHERE id = ?", existing)
+            cursor = self.db.execute(
+                "INSERT INTO batches (recorded_at, stream, flow, batch, version, execution_time_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                (recorded_at or time.time(), stream, flow, str(batch), version, execution_time))
+            batch_row = cursor.lastrowid
+            self.db.executemany(
+                "INSERT INTO node_stats (batch_row, node, time_ms) VALUES (?, ?, ?)",
+                ((batch_row, node, time_ms) for node, time_ms in stats.items()))
+        return batch_row
+
+    def node_percentile(self, node, pct=95, days=7, flow=None):
+        """Percentile of a node's runtime over the last N days, as (value, sample count)"""
+        query = "SELECT n.time_ms FROM node_stats n JOIN batches b ON b.id = n.batch_row WHERE n.node = ? AND b.recorded_at >= ?"
+        params = [node, time.time() - days * 86400]
+        if flow:
+            query += " AND b.flow = ?"
+            params.append(flow)
+        values = array.array("d", sorted(row[0] for row in self.db.execute(query, params)))
+        return Reusable.percentile(values, pct), len(values)
+
+    def regressions(self, since_version, factor=2.0, pct=50):
+        """
+        Nodes whose runtime percentile at or after a flow version is at least `factor` times
+        what it was before that version, compared within each flow
+
+        :return: list of dicts, worst regressions first
+        """
+        query = """
+            SELECT b.flow, n.node, b.version >= ? AS after, n.time_ms
+            FROM node_stats n JOIN batches b ON b.id = n.batch_row
+            WHERE b.version IS NOT NULL
+            ORDER BY b.flow, n.node
+        """
+        samples = {}
+        for flow, node, after, time_ms in self.db.execute(query, (int(since_version),)):
+            before_after = samples.setdefault((flow, node), (array.array("d"), array.array("d")))
+            before_after[1 if after else 0].append(time_ms)
+
+        results = []
+        for (flow, node), (before, after) in samples.items():
+            if not before or not after:
+                continue
+            before_value = Reusable.percentile(sorted(before), pct)
+            after_value = Reusable.percentile(sorted(after), pct)
+            ratio = after_value / before_value if before_value else float("inf")
+            if ratio >= factor:
+                results.append({
+                    "flow": flow, "node_name": node, f"p{pct}_before": before_value, f"p{pct}_after": after_value,
+                    "ratio": round(ratio, 2), "batches_before": len(before), "batches_after": len(after),
+                })
+        return sorted(results, key=lambda x: x["ratio"], reverse=True)
+
+
+class FlowCriticalPath:
+    """
+    Join a batch's runtimeStats with the matching flow export to find what actually bounds
+    batch wall time. Nodes are connected through executionDependsOn and through "nodes"
+    lists of node IDs (such as on the Output node); every node's runtime is its weight.
+    """
+
+    def __init__(self, flow_export, runtime_stats: dict):
+        self.weights = {k: v for k, v in runtime_stats.items() if isinstance(v, Number)}
+        self.dependencies = {}
+        self.unmatched_stats = []
+        self._load_flow(flow_export)
+        self.order = self._topological_order()
+
+    @staticmethod
+    def _iter_node_dicts(data):
+        """Yield every dict found within a list stored under a "nodes" key, at any depth"""
+        if isinstance(data, dict):
+            for k, v in data.items():
+                if k == "nodes" and isinstance(v, list):
+                    for node in v:
+                        if isinstance(node, dict):
+                            yield node
+                yield from FlowCriticalPath._iter_node_dicts(v)
+        elif isinstance(data, list):
+            for v in data:
+                yield from FlowCriticalPath._iter_node_dicts(v)
+
+    def _load_flow(self, flow_export):
+        node_dicts = [n for n in self._iter_node_dicts(flow_export) if n.get("name")]
+        if not node_dicts:
+            raise ValueError("No nodes found in flow export")
+
+        # Dependencies may refer to a node by ID, node ID, or name
+        names_by_ref = {}
+        for node in node_dicts:
+            for k in ("id", "nodeId", "name"):
+                if node.get(k):
+                    names_by_ref[node[k]] = node["name"]
+
+        for node in node_dicts:
+            refs = list(node.get("executionDependsOn") or [])
+            refs.extend(x for x in node.get("nodes") or [] if isinstance(x, str))
+            deps = self.dependencies.setdefault(node["name"], set())
+            deps.update(names_by_ref[r] for r in refs if r in names_by_ref and names_by_ref[r] != node["name"])
+
+        # Stats for nodes the flow export doesn't know about are kept as independent nodes
+        for name in self.weights:
+            if name not in self.dependencies:
+                self.unmatched_stats.append(name)
+                self.dependencies[name] = set()
+
+    def _topological_order(self):
+        dependents = {n: [] for n in self.dependencies}
+        remaining = {n: len(deps) for n, deps in self.dependencies.items()}
+        for n, deps in self.dependencies.items():
+            for d in deps:
+                dependents[d].append(n)
+        ready = collections.deque(sorted(n for n, count in remaining.items() if not count))
+        order = []
+        while ready:
+            n = ready.popleft()
+            order.append(n)
+            for m in dependents[n]:
+                remaining[m] -= 1
+                if not remaining[m]:
+                    ready.append(m)
+        if len(order) != len(self.dependencies):
+            raise ValueError("Flow dependencies contain a cycle")
+        return order
+
+    def _finish_times(self, weight_overrides=None):
+        weights = dict(self.weights, **(weight_overrides or {}))
+        finish = {}
+        for n in self.order:
+            finish[n] = weights.get(n, 0) + max((finish[d] for d in self.dependencies[n]), default=0)
+        return finish
+
+    def critical_path(self):
+        """:return: (total time of the critical path, list of node names from first to last)"""
+        finish = self._finish_times()
+        if not finish:
+            return 0, []
+        node = max(finish, key=finish.get)
+        length = finish[node]
+        path = [node]
+        while self.dependencies[node]:
+            node = max(self.dependencies[node], key=finish.get)
+            path.append(node)
+        return length, path[::-1]
+
+    def levels(self):
+        """Nodes grouped by dependency depth; the size of each group is the parallel width at that level"""
+        depth = {}
+        for n in self.order:
+            depth[n] = 1 + max((depth[d] for d in self.dependencies[n]), default=-1)
+        grouped = {}
+        for n, d in depth.items():
+            grouped.setdefault(d, []).append(n)
+        return [sorted(grouped[d], key=lambda x: self.weights.get(x, 0), reverse=True) for d in sorted(grouped)]
+
+    def potential_savings(self):
+        """Wall time saved if each node took no time at all, largest first (nodes with no effect are omitted)"""
+        length = max(self._finish_times().values(), default=0)
+        savings = {}
+        for n in self.order:
+            if not self.weights.get(n):
+                continue
+            saved = length - max(self._finish_times({n: 0}).values(), default=0)
+            if saved > 0:
+                savings[n] = saved
+        return Reusable.sort_dict_by_values(savings, reverse=True)
+
+    def report(self, execution_time_ms=None):
+        virtual_total = sum(self.weights.values())
+        length, path = self.critical_path()
+        lines = [
+            f"executionTimeMs:    {execution_time_ms if execution_time_ms is not None else 'n/a'}",
+            f"VIRTUAL TOTAL:      {virtual_total}",
+            f"Critical path:      {length}",
+            f"Avg. parallelism:   {virtual_total / length:.2f}" if length else "Avg. parallelism:   n/a",
+            "",
+            "Critical path nodes:",
+        ]
+        lines.extend(f"    {self.weights.get(n, 0):>10}  {n}" for n in path)
+        lines.extend(["", "Levels (width: nodes, slowest first):"])
+        for num, nodes in enumerate(self.levels()):
+            lines.append(f"    {num:>3}  width {len(nodes):>3}:  {', '.join(nodes)}")
+        lines.extend(["", "Wall time saved if the node took no time:"])
+        lines.extend(f"    {saved:>10}  {n}" for n, saved in self.potential_savings().items())
+        if self.unmatched_stats:
+            lines.extend(["", "Nodes in runtimeStats but not in the flow export (treated as independent):"])
+            lines.extend(f"    {n}" for n in sorted(self.unmatched_stats))
+        return "\n".join(lines) + "\n"
+
+
+class PgDumpIndex:
+    """
+    Offline access to the table data in a pg_dump backup, without restoring it.
+
+    A plain-format dump (e.g. logichub_backup_data_dump.psql) is memory-mapped and
+    indexed by the byte range of each COPY ... FROM stdin block, skipping over the
+    data itself with mmap.find rather than reading it line by line. A directory-format
+    dump is indexed from the COPY statements in its toc.dat. The index is cached by
+    path, size and mtime, so only the first query of a multi-GB dump scans it, and
+    exporting a table only reads that table's rows.
+    """
+    default_tables = ("integration_instances", "integration_descriptors", "users", "versioned_flows", "batches")
+    copy_pattern = re.compile(rb"COPY (\S+) \((.*)\) FROM stdin;")
+    toc_copy_pattern = re.compile(rb"COPY (\S+) \(([^)]*)\) FROM stdin;\n")
+    toc_file_pattern = re.compile(rb"(\d+)\.dat")
+    copy_escapes = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\"}
+    read_size = 8 * 1024 * 1024
+
+    def __init__(self, path, cache_file=None):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Path not found: {self.path}")
+        self.is_directory = os.path.isdir(self.path)
+        if self.is_directory and not os.path.isfile(os.path.join(self.path, "toc.dat")):
+            raise ValueError(f"Not a directory-format pg_dump (no toc.dat): {self.path}")
+        self.cache_file = cache_file
+        self.from_cache = False
+        self.tables = self._load_cached_index()
+        if self.tables is None:
+            self.tables = self._scan_directory() if self.is_directory else self._scan_plain()
+            self._save_cached_index()
+
+    def _fingerprint(self):
+        stat = os.stat(os.path.join(self.path, "toc.dat") if self.is_directory else self.path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load_cached_index(self):
+        if not self.cache_file:
+            return None
+        cached = (Reusable.read_json_file(self.cache_file, default={}) or {}).get(self.path)
+        if not cached or cached.get("fingerprint") != self._fingerprint():
+            return None
+        self.from_cache = True
+        return cached["tables"]
+
+    def _save_cached_index(self):
+        if not self.cache_file:
+            return
+        cache = Reusable.read_json_file(self.cache_file, default={}) or {}
+        # Drop entries for dumps that have since been deleted
+        cache = {k: v for k, v in cache.items() if os.path.exists(k)}
+        cache[self.path] = {"fingerprint": self._fingerprint(), "tables": self.tables}
+        Reusable.write_json_file(self.cache_file, cache)
+
+    @staticmethod
+    def _parse_copy_header(match):
+        table = match.group(1).decode("utf-8").split(".", 1)[-1].strip('"')
+        columns = [column.strip().strip('"') for column in match.group(2).decode("utf-8").split(",")]
+        return table, columns
+
+    def _scan_plain(self):
+        tables = {}
+        with open(self.path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return tables
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = 0
+                while True:
+                    header_start = mm.find(b"\nCOPY ", pos)
+                    if header_start < 0:
+                        break
+                    header_start += 1
+                    header_end = mm.find(b"\n", header_start)
+                    if header_end < 0:
+                        break
+                    match = self.copy_pattern.fullmatch(mm[header_start:header_end])
+                    if not match:
+                        pos = header_end
+                        continue
+                    # Rows can never contain a bare "\." line, since backslashes in data are escaped
+                    data_end = mm.find(b"\n\\.\n", header_end)
+                    if data_end < 0:
+                        raise ValueError(f"Truncated dump: no end of COPY block at byte {header_start}")
+                    table, columns = self._parse_copy_header(match)
+                    tables[table] = {"columns": columns, "start": header_end + 1, "end": data_end + 1}
+                    pos = data_end + 3
+        return tables
+
+    def _scan_directory(self):
+        tables = {}
+        with open(os.path.join(self.path, "toc.dat"), "rb") as f:
+            toc = f.read()
+        for match in self.toc_copy_pattern.finditer(toc):
+            # The entry's data file name follows its COPY statement in the TOC
+            file_match = self.toc_file_pattern.search(toc, match.end())
+            if not file_match:
+                continue
+            table, columns = self._parse_copy_header(match)
+            data_file = file_match.group(0).decode("ascii")
+            if not os.path.isfile(os.path.join(self.path, data_file)):
+                data_file += ".gz"
+            tables[table] = {"columns": columns, "file": data_file,
+                             "size": os.path.getsize(os.path.join(self.path, data_file))}
+        return tables
+
+    def table_size(self, table):
+        info = self.tables[table]
+        return info["size"] if "file" in info else info["end"] - info["start"]
+
+    def _iter_data_chunks(self, info):
+        if "file" in info:
+            data_path = os.path.join(self.path, info["file"])
+            with (gzip.open if data_path.endswith(".gz") else open)(data_path, "rb") as f:
+                while True:
+                    chunk = f.read(self.read_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        if info["start"] == info["end"]:
+            return
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(info["start"], info["end"], self.read_size):
+                    yield mm[offset:min(offset + self.read_size, info["end"])]
+
+    def iter_rows(self, table):
+        """Yield each row of a table as a list of values, with None for NULL"""
+        info = self.tables[table]
+        remainder = b""
+        for chunk in self._iter_data_chunks(info):
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                if line == b"\\.":
+                    return
+                yield [self.decode_field(value) for value in line.decode("utf-8").split("\t")]
+        if remainder and remainder != b"\\.":
+            yield [self.decode_field(value) for value in remainder.decode("utf-8").split("\t")]
+
+    @classmethod
+    def decode_field(cls, value):
+        """Decode one field of COPY text format; \\N is NULL"""
+        if value == r"\N":
+            return None
+        if "\\" not in value:
+            return value
+        return re.sub(r"\\(.)", lambda m: cls.copy_escapes.get(m.group(1), m.group(1)), value)
+
+    def export(self, tables, output_dir, file_format="csv"):
+        """Write each table to <output_dir>/<table>.csv or .ndjson; returns {table: row count}"""
+        missing = [t for t in tables if t not in self.tables]
+        if missing:
+            raise ValueError(f"Table(s) not found in dump: {', '.join(missing)}")
+        os.makedirs(output_dir, exist_ok=True)
+        row_counts = {}
+        for table in tables:
+            columns = self.tables[table]["columns"]
+            count = 0
+            with open(os.path.join(output_dir, f"{table}.{'ndjson' if file_format == 'json' else 'csv'}"), "w", newline="") as f:
+                if file_format == "json":
+                    for row in self.iter_rows(table):
+                        f.write(json.dumps(dict(zip(columns, row))) + "\n")
+                        count += 1
+                else:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    for row in self.iter_rows(table):
+                        writer.writerow(row)
+                        count += 1
+            row_counts[table] = count
+        return row_counts
+
+    def write_table_list_csv(self, csv_file):
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["table", "data_bytes", "column_count", "columns"])
+            for table in sorted(self.tables, key=self.table_size, reverse=True):
+                columns = self.tables[table]["columns"]
+                writer.writerow([table, self.table_size(table), len(columns), ", ".join(columns)])
+        return csv_file
+
+
+class PsqlSession:
+    """
+    One psql process driven over pipes (optionally through SSH), so that the queries run
+    within a session share a single container exec and database connection. Query results
+    are streamed back as CSV via COPY ... TO STDOUT.
+
+    A session lasts only as long as the plugin process which opened it. Every menu click is
+    a new process, so each action still pays for one exec/ssh and connection setup; only
+    actions which run several queries save anything.
+
+    Usable as a context manager:
+
+        with PsqlSession() as db:
+            for row in db.iter_csv_rows("select * from users"):
+                ...
+    """
+    default_command = "docker exec -i postgres psql --username daemon -d lh"
+    psql_options = ["-X", "-q", "-A", "-t", "-v", "ON_ERROR_STOP=0", "-P", "pager=off"]
+
+    def __init__(self, psql_command: str = None, ssh_host: str = None, timeout: int = 300):
+        """
+        :param psql_command: Command which starts psql (defaults to psql within the postgres container)
+        :param ssh_host: Optional SSH destination (such as user@host) on which to run psql_command
+        :param timeout: Maximum seconds for any single query before the session is killed
+        """
+        self.timeout = timeout
+        self.command = shlex.split(psql_command or self.default_command) + self.psql_options
+        if ssh_host:
+            remote_command = " ".join(shlex.quote(x) for x in self.command)
+            self.command = ["ssh", "-T", "-o", "BatchMode=yes", ssh_host, remote_command]
+        self.process = None
+        self._stderr_lines = queue.Queue()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        log.debug(f"Starting psql session: {self.command}")
+        try:
+            self.process = subprocess.Popen(
+                self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True, bufsize=1)
+        except OSError as err:
+            # Callers only handle RuntimeError, e.g. when psql or ssh is not installed
+            raise RuntimeError(f"Failed to start psql session ({self.command[0]}): {err}") from err
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self._stderr_lines.put(line.rstrip("\n"))
+
+    def close(self):
+        if not self.process:
+            return
+        try:
+            self.process.stdin.write("\\q\n")
+            self.process.stdin.flush()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+    @staticmethod
+    def _strip_query(query):
+        return re.sub(r"[\s;]+$", "", query.strip())
+
+    def _run(self, statement):
+        """Send one statement, yielding its stdout lines until the end-of-command marker is reached"""
+        if not self.process or self.process.poll() is not None:
+            raise RuntimeError("psql session is not running")
+        while not self._stderr_lines.empty():
+            self._stderr_lines.get_nowait()
+
+        # An unterminated statement would stay in psql's query buffer and never run
+        statement = statement.rstrip()
+        if not statement.endswith(";"):
+            statement += ";"
+        marker = f"__LHUB_END_{uuid.uuid4().hex}__"
+        # :ERROR reports whether the statement failed (psql 11+; older versions echo it literally)
+        self.process.stdin.write(f"{statement}\n\\echo {marker} :ERROR\n")
+        self.process.stdin.flush()
+
+        timer = threading.Timer(self.timeout, self.process.kill)
+        timer.start()
+        error_flag = None
+        try:
+            for line in self.process.stdout:
+                if line.startswith(marker):
+                    error_flag = line[len(marker):].strip()
+                    break
+                yield line
+        finally:
+            timer.cancel()
+        if error_flag is None:
+            raise RuntimeError("psql session ended unexpectedly (or the query timed out)")
+
+        errors = []
+        if error_flag != "false":
+            # Give the stderr reader a moment to catch up if psql says (or can't say) an error occurred
+            deadline = time.time() + (1 if error_flag == "true" else 0.1)
+            while time.time() < deadline:
+                try:
+                    errors.append(self._stderr_lines.get(timeout=max(deadline - time.time(), 0.01)))
+                except queue.Empty:
+                    if errors:
+                        break
+        errors = [e for e in errors if "ERROR" in e or "FATAL" in e] or (["Unknown psql error"] if error_flag == "true" else [])
+        if errors:
+            raise RuntimeError("\n".join(errors))
+
+    def execute(self, sql):
+        """Run statements which do not return rows"""
+        for _ in self._run(sql):
+            pass
+
+    def iter_lines(self, sql):
+        """Stream raw (unaligned, tuples only) output lines of a statement"""
+        for line in self._run(sql):
+            yield line.rstrip("\n")
+
+    def iter_csv_rows(self, query):
+        """Stream the results of a query as lists of strings, starting with the header row"""
+        copy_statement = f"COPY ({self._strip_query(query)}) TO STDOUT WITH (FORMAT csv, HEADER);"
+        yield from csv.reader(self._run(copy_statement))
+
+    def query_to_csv(self, query, csv_file):
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            row_count = -1
+            for row in self.iter_csv_rows(query):
+                writer.writerow(row)
+                row_count += 1
+        return max(row_count, 0)
+
+    def query_to_dicts(self, query):
+        rows = self.iter_csv_rows(query)
+        header = next(rows, [])
+        return [dict(zip(header, row)) for row in rows]
+
+
+class QueryBenchmark:
+    """
+    Compare query variants with EXPLAIN (ANALYZE, BUFFERS) over a PsqlSession. Tables can
+    be seeded as session-local TEMP tables, which shadow the real tables of the same name
+    and disappear when the session closes, so seeding never touches real data.
+    """
+
+    def __init__(self, session: PsqlSession, runs: int = 5):
+        self.session = session
+        self.runs = max(int(runs), 1)
+
+    @staticmethod
+    def seed_sql(instances=5000, flows=300, versions=20):
+        # Descriptors and flows are padded so that row sizes resemble real ones
+        return f"""
+            DROP TABLE IF EXISTS pg_temp.integration_instances, pg_temp.versioned_flows;
+            CREATE TEMP TABLE integration_instances AS
+                SELECT n AS id, 'integration-' || (n % 200) AS integration_id, 'Instance ' || n AS label,
+                    json_build_object(
+                        'name', 'Integration ' || (n % 200), 'version', '1.' || (n % 10) || '.0',
+                        'runtimeEnvironment', json_build_object('descriptor', json_build_object(
+                            'image', 'lhub-managed-integrations.logichub.integration' || (n % 200) || ':1.' || (n % 10))),
+                        'padding', repeat('x', 2000)
+                    )::text AS descriptor
+                FROM generate_series(1, {int(instances)}) n;
+            CREATE TEMP TABLE versioned_flows AS
+                SELECT f AS id, v AS version, 'Flow ' || f AS name, now() - ((f + v) || ' hours')::interval AS created_at,
+                    repeat('x', 4000) AS flow
+                FROM generate_series(1, {int(flows)}) f, generate_series(1, {int(versions)}) v;
+            CREATE INDEX ON versioned_flows (id, version);
+            ANALYZE integration_instances;
+            ANALYZE versioned_flows;
+        """
+
+    def seed(self, **kwargs):
+        self.session.execute(self.seed_sql(**kwargs))
+
+    def explain(self, query):
+        statement = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {PsqlSession._strip_query(query)};"
+        result = json.loads("".join(self.session.iter_lines(statement)))[0]
+        plan = result["Plan"]
+        return {
+            "execution_ms": result.get("Execution Time", result.get("Execution Time (ms)", 0)),
+            "planning_ms": result.get("Planning Time", 0),
+            # Temp tables use local rather than shared buffers
+            "buffers": sum(plan.get(f"{kind} {op} Blocks", 0) for kind in ("Shared", "Local") for op in ("Hit", "Read")),
+            "temp_blocks": plan.get("Temp Read Blocks", 0) + plan.get("Temp Written Blocks", 0),
+        }
+
+    def measure(self, query):
+        """Median of each EXPLAIN metric over the configured number of runs"""
+        samples = [self.explain(query) for _ in range(self.runs)]
+        return {k: statistics.median(s[k] for s in samples) for k in samples[0]}
+
+    def compare(self, variants: dict):
+        """
+        :param variants: dict of {name: (old query, new query)}
+        :return: list of result dicts, one per variant
+        """
+        results = []
+        for name, (old_query, new_query) in variants.items():
+            old, new = self.measure(old_query), self.measure(new_query)
+            results.append({
+                "name": name, "old": old, "new": new,
+                "speedup": old["execution_ms"] / new["execution_ms"] if new["execution_ms"] else float("inf"),
+            })
+        return results
+
+    @staticmethod
+    def report(results):
+        lines = [f"{'Query':<40} {'old ms':>10} {'new ms':>10} {'speedup':>8} {'old bufs':>9} {'new bufs':>9} {'old tmp':>8} {'new tmp':>8}"]
+        for r in results:
+            lines.append(
+                f"{r['name']:<40} {r['old']['execution_ms']:>10.2f} {r['new']['execution_ms']:>10.2f} {r['speedup']:>7.2f}x "
+                f"{r['old']['buffers']:>9.0f} {r['new']['buffers']:>9.0f} {r['old']['temp_blocks']:>8.0f} {r['new']['temp_blocks']:>8.0f}")
+        return "\n".join(lines) + "\n"
+
+
+class BatchActivityCollector:
+    """
+    Track executing batches incrementally. Only batches newer than a stored batch ID watermark,
+    plus batches already being tracked, are fetched on each poll; the results are cached in a
+    JSON file so the BitBar menu can render them without ever waiting on the database.
+
+    Batch age is measured from when the collector first saw the batch executing.
+    """
+    # States after which a batch no longer needs to be tracked
+    finished_states = ("finished", "failed", "canceled", "cancelled", "completed", "error", "skipped")
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.state = Reusable.read_json_file(cache_file, default={}) or {}
+        self.state.setdefault("watermark", None)
+        # Batch ID (as a string) -> details for batches not yet finished
+        self.state.setdefault("tracked", {})
+
+    @property
+    def executing(self):
+        return {k: v for k, v in self.state["tracked"].items() if v.get("state") == "executing"}
+
+    def _query(self):
+        select = r"""select a.id, a.state, substring(a.stream_id from '(\d+)') as stream_id, b.name as stream_name from batches a left join streams b on substring(a.stream_id from '(\d+)') :: int = b.id"""
+        if self.state["watermark"] is None:
+            # First poll: every unfinished batch, so that ones still queued below the watermark are tracked by ID
+            # and seen when they start executing, plus the current high-water mark
+            finished = ", ".join(f"'{state}'" for state in self.finished_states)
+            return f"{select} where a.state not in ({finished}) or a.id = (select max(id) from batches)"
+        conditions = [f"a.id > {int(self.state['watermark'])}"]
+        if self.state["tracked"]:
+            conditions.append("a.id in ({})".format(", ".join(str(int(x)) for x in self.state["tracked"])))
+        return f"{select} where {' or '.join(conditions)}"
+
+    def poll(self, db: PsqlSession):
+        now = time.time()
+        seen = set()
+        for row in db.query_to_dicts(self._query()):
+            batch_id = row["id"]
+            seen.add(batch_id)
+            self.state["watermark"] = max(int(batch_id), int(self.state["watermark"] or 0))
+            if row["state"] in self.finished_states:
+                self.state["tracked"].pop(batch_id, None)
+                continue
+            previous = self.state["tracked"].get(batch_id, {})
+            started = previous.get("executing_since") if previous.get("state") == "executing" else None
+            self.state["tracked"][batch_id] = {
+                "state": row["state"],
+                "stream_id": row["stream_id"],
+                "stream_name": row["stream_name"] or f"Stream {row['stream_id']}",
+                "executing_since": started or (now if row["state"] == "executing" else None),
+            }
+        # Anything tracked which no longer exists (e.g. purged) is dropped
+        for batch_id in [k for k in self.state["tracked"] if k not in seen]:
+            self.state["tracked"].pop(batch_id)
+        self.state["updated_at"] = now
+        self.state.pop("error", None)
+
+    def save(self, error=None):
+        if error:
+            self.state["error"] = error
+            self.state["updated_at"] = time.time()
+        Reusable.write_json_file(self.cache_file, self.state)
+
+    def streams(self):
+        """Executing batches grouped by stream name, each sorted oldest first"""
+        grouped = {}
+        for batch_id, batch in self.executing.items():
+            grouped.setdefault(batch["stream_name"], []).append((batch_id, batch["executing_since"]))
+        return {k: sorted(v, key=lambda x: x[1]) for k, v in sorted(grouped.items())}
+
+
+class LoopbackManager:
+    """
+    Loopback aliases, read once per run from psutil.net_if_addrs (no ifconfig parsing).
+    Missing and stale aliases are worked out first, then all changes are applied in a single sudo call.
+    """
+    def __init__(self, interface="lo0"):
+        self.interface = interface
+        self.addresses = self.read_addresses()
+
+    def read_addresses(self):
+        return {a.address for a in psutil.net_if_addrs().get(self.interface, []) if a.family == socket.AF_INET}
+
+    @property
+    def aliases(self):
+        """Loopback aliases other than 127.0.0.1"""
+        return {a for a in self.addresses if a.startswith("127.") and a != "127.0.0.1"}
+
+    def plan(self, wanted=(), keep=None):
+        """
+        :param wanted: aliases which must exist
+        :param keep: aliases to keep; any other existing alias is stale. If None, nothing is stale.
+        :return: tuple of (missing aliases, stale aliases)
+        """
+        missing = sorted(set(wanted) - self.addresses)
+        stale = [] if keep is None else sorted(self.aliases - set(keep) - set(wanted))
+        return missing, stale
+
+    def apply(self, add=(), remove=()):
+        """Create and delete aliases in one privileged batch"""
+        commands = [f"ifconfig {shlex.quote(self.interface)} alias {shlex.quote(ip)} up" for ip in add]
+        commands += [f"ifconfig {shlex.quote(self.interface)} -alias {shlex.quote(ip)}" for ip in remove]
+        if not commands:
+            return
+        Reusable.do_prompt_for_sudo()
+        _ = Reusable.run_cli_command(["sudo", "sh", "-c", " && ".join(commands)])
+        self.addresses = (self.addresses | set(add)) - set(remove)
+
+    def ensure(self, wanted):
+        missing, _ = self.plan(wanted)
+        self.apply(add=missing)
+        return missing
+
+
+class PortRedirectAnchor:
+    """
+    Port redirects kept in a dedicated pf anchor. Active redirects are kept in a JSON state file, and the
+    anchor's complete rule set is rendered and loaded with a single pfctl call, so redirects can be added and
+    removed individually without reloading the main ruleset. The default macOS pf.conf already evaluates
+    anchors under "com.apple/*", so pf.conf itself doesn't need to change.
+    """
+    anchor = "com.apple/250.LogicHubBitBar"
+
+    # pfctl chatter which doesn't indicate a problem
+    ignored_messages = re.compile(r"already enabled|^pf enabled|ALTQ|Use of -f option|present in the main ruleset|^Token")
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        # Config name -> redirect parameters
+        self.redirects = Reusable.read_json_file(state_file, default={}) or {}
+
+    def save(self):
+        Reusable.write_json_file(self.state_file, self.redirects)
+
+    def add(self, config_name, source_address, source_port, target_address, target_port):
+        self.redirects[config_name] = dict(
+            source_address=source_address, source_port=str(source_port), target_address=target_address, target_port=str(target_port))
+
+    def remove(self, config_name):
+        return self.redirects.pop(config_name, None)
+
+    def render(self):
+        lines = []
+        for config_name, r in sorted(self.redirects.items()):
+            lines.append(f"# {config_name}")
+            lines.append(f"rdr pass inet proto tcp from any to {r['source_address']} port {r['source_port']} -> {r['target_address']} port {r['target_port']}")
+        return "\n".join(lines) + "\n"
+
+    def _pfctl(self, args, rules=None, anchor=True):
+        result = subprocess.run(
+            ["sudo", "pfctl"] + (["-a", self.anchor] if anchor else []) + args, input=rules,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=30)
+        errors = [_line for _line in result.stderr.splitlines() if _line.strip() and not self.ignored_messages.search(_line)]
+        # pfctl exits with 1 after loading the rules if pf was already enabled
+        if result.returncode != 0 and errors:
+            raise RuntimeError("\n".join(errors))
+
+    def _reset_main_ruleset_once(self):
+        """
+        Earlier versions loaded rdr rules straight into the main ruleset. Reload /etc/pf.conf once to clear any
+        left over from then; after that, only the anchor is ever changed.
+        """
+        marker_file = f"{self.state_file}.main_ruleset_reset"
+        if os.path.exists(marker_file):
+            return
+        self._pfctl(["-f", "/etc/pf.conf"], anchor=False)
+        with open(marker_file, "w") as f:
+            f.write(f"{datetime.utcnow().isoformat()}\n")
+
+    def load(self):
+        """Replace the anchor's rules with the full rule set, and make sure pf is enabled, in one pfctl call"""
+        Reusable.do_prompt_for_sudo()
+        self._reset_main_ruleset_once()
+        if self.redirects:
+            self._pfctl(["-ef", "-"], rules=self.render())
+        else:
+            # The anchor only holds rdr (translation) rules. "-F all" would also flush pf's global state table,
+            # dropping every connection on the machine, since -a only scopes rules, nat and tables.
+            self._pfctl(["-F", "nat"])
+        self.save()
+
+    def flush(self):
+        Reusable.do_prompt_for_sudo()
+        self._reset_main_ruleset_once()
+        self._pfctl(["-F", "nat"])
+        self.redirects = {}
+        self.save()
+
+
+class UserspaceForwarder:
+    """
+    Userspace TCP port forwarder on asyncio; an alternative to pf redirects which needs neither sudo nor pfctl.
+
+    Data is copied with sock_recv_into into pooled, preallocated buffers and written with sock_sendall, so
+    there is no allocation per read, and each direction only reads again once its previous chunk has been
+    fully sent to the other side (backpressure: a slow receiver slows the sender instead of filling memory).
+    """
+    def __init__(self, listen_address, listen_port, target_address, target_port, buffer_size=256 * 1024,
+                 max_pooled_buffers=64, connect_timeout=10, stats_file=None, stats_interval=5):
+        self.listen_address = listen_address
+        self.listen_port = int(listen_port)
+        self.target_address = target_address
+        self.target_port = int(target_port)
+        self.buffer_size = buffer_size
+        self.max_pooled_buffers = max_pooled_buffers
+        self.connect_timeout = connect_timeout
+        self.stats_file = stats_file
+        self.stats_interval = stats_interval
+        self.counters = dict(
+            connections_total=0, connections_active=0, connections_failed=0, bytes_to_target=0, bytes_from_target=0)
+        self._buffers = []
+        self._listener = None
+        self._tasks = set()
+
+    @property
+    def port(self):
+        """Port actually listened on (useful when listen_port is 0)"""
+        return self._listener.getsockname()[1] if self._listener else self.listen_port
+
+    async def start(self):
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.listen_address, self.listen_port))
+        self._listener.listen(512)
+        self._listener.setblocking(False)
+        self._tasks.add(asyncio.get_running_loop().create_task(self._accept_loop()))
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._listener:
+            self._listener.close()
+
+    async def _accept_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            client, _ = await loop.sock_accept(self._listener)
+            task = loop.create_task(self._handle(client))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, client):
+        loop = asyncio.get_running_loop()
+        target = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        for sock in (client, target):
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            await asyncio.wait_for(loop.sock_connect(target, (self.target_address, self.target_port)), self.connect_timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.counters["connections_failed"] += 1
+            client.close()
+            target.close()
+            return
+        self.counters["connections_total"] += 1
+        self.counters["connections_active"] += 1
+        try:
+            await asyncio.gather(self._pipe(client, target, "bytes_to_target"), self._pipe(target, client, "bytes_from_target"))
+        finally:
+            self.counters["connections_active"] -= 1
+            client.close()
+            target.close()
+
+    async def _pipe(self, source, destination, counter):
+        loop = asyncio.get_running_loop()
+        buffer = self._buffers.pop() if self._buffers else bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        try:
+            while True:
+                size = await loop.sock_recv_into(source, buffer)
+                if not size:
+                    break
+                await loop.sock_sendall(destination, view[:size])
+                self.counters[counter] += size
+        except OSError:
+            pass
+        finally:
+            view.release()
+            if len(self._buffers) < self.max_pooled_buffers:
+                self._buffers.append(buffer)
+            # Pass the end of the stream on (half-close), so the other direction can finish normally
+            try:
+                destination.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def stats(self):
+        return dict(
+            self.counters, pid=os.getpid(), listen=f"{self.listen_address}:{self.port}",
+            target=f"{self.target_address}:{self.target_port}", updated_at=time.time())
+
+    def _write_stats(self, error=None):
+        if self.stats_file:
+            Reusable.write_json_file(self.stats_file, dict(self.stats(), error=error))
+
+    async def _run(self):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await self.start()
+        except OSError as err:
+            self._write_stats(error=err.strerror or str(err))
+            return
+        while not stop.is_set():
+            self._write_stats()
+            try:
+                await asyncio.wait_for(stop.wait(), self.stats_interval)
+            except asyncio.TimeoutError:
+                pass
+        await self.stop()
+        self._write_stats()
+
+    def run_forever(self):
+        """Serve until SIGTERM/SIGINT, writing counters to stats_file every stats_interval seconds"""
+        asyncio.run(self._run())
+
+
+class ForwarderBenchmark:
+    """
+    Throughput and latency of a UserspaceForwarder against a local echo server, compared with connecting to
+    the echo server directly. Everything runs on one event loop, so absolute numbers are conservative; the
+    comparison between direct and forwarded is what matters.
+    """
+    def __init__(self, payload_mb=64, connections=8, pings=2000, chunk_size=64 * 1024):
+        self.payload_size = int(payload_mb * 1024 * 1024)
+        self.connections = connections
+        self.pings = pings
+        self.chunk = b"x" * chunk_size
+
+    @staticmethod
+    async def _echo(reader, writer):
+        try:
+            while True:
+                data = await reader.read(256 * 1024)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def _transfer(self, port, size):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        async def send():
+            remaining = size
+            while remaining > 0:
+                chunk = self.chunk[:remaining]
+                writer.write(chunk)
+                await writer.drain()
+                remaining -= len(chunk)
+
+        async def receive():
+            received = 0
+            while received < size:
+                data = await reader.read(256 * 1024)
+                if not data:
+                    raise ConnectionError("Connection closed before all data was echoed")
+                received += len(data)
+
+        await asyncio.gather(send(), receive())
+        writer.close()
+
+    async def _throughput(self, port):
+        """MB/s echoed back, with the payload split across concurrent connections"""
+        start = time.perf_counter()
+        per_connection = self.payload_size // self.connections
+        await asyncio.gather(*(self._transfer(port, per_connection) for _ in range(self.connections)))
+        return per_connection * self.connections / (1024 * 1024) / (time.perf_counter() - start)
+
+    async def _latency(self, port):
+        """Round trip times (ms) of small messages on one connection"""
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        message, times = b"p" * 64, []
+        for _ in range(self.pings):
+            start = time.perf_counter()
+            writer.write(message)
+            await reader.readexactly(len(message))
+            times.append((time.perf_counter() - start) * 1000)
+        writer.close()
+        return sorted(times)
+
+    async def _run(self):
+        echo_server = await asyncio.start_server(self._echo, "127.0.0.1", 0)
+        echo_port = echo_server.sockets[0].getsockname()[1]
+        forwarder = UserspaceForwarder("127.0.0.1", 0, "127.0.0.1", echo_port)
+        await forwarder.start()
+        results = {}
+        for name, port in (("direct", echo_port), ("forwarded", forwarder.port)):
+            throughput = await self._throughput(port)
+            latencies = await self._latency(port)
+            results[name] = dict(
+                throughput_mb_s=throughput, latency_p50_ms=Reusable.percentile(latencies, 50),
+                latency_p99_ms=Reusable.percentile(latencies, 99))
+        results["forwarded"]["counters"] = dict(forwarder.counters)
+        await forwarder.stop()
+        echo_server.close()
+        await echo_server.wait_closed()
+        return results
+
+    def run(self):
+        return asyncio.run(self._run())
+
+    def report(self, results):
+        lines = [
+            f"Payload: {self.payload_size / 1024 / 1024:.0f} MB over {self.connections} connections; {self.pings} pings\n",
+            f"{'':<12} {'MB/s':>10} {'p50 ms':>10} {'p99 ms':>10}",
+        ]
+        for name in ("direct", "forwarded"):
+            r = results[name]
+            lines.append(f"{name:<12} {r['throughput_mb_s']:>10.1f} {r['latency_p50_ms']:>10.3f} {r['latency_p99_ms']:>10.3f}")
+        counters = results["forwarded"]["counters"]
+        lines.append(
+            f"\nForwarder counters: {counters['connections_total']} connections, "
+            f"{counters['bytes_to_target']} bytes to target, {counters['bytes_from_target']} bytes from target")
+        return "\n".join(lines) + "\n"
+
+
+class TunnelHealthMonitor:
+    """
+    Probe tunnel endpoints concurrently (asyncio TCP connects with a timeout), and track restart attempts
+    with exponential backoff. Results are cached in a JSON file so the menu never waits on the network.
+
+    A successful probe shows that the local end of the tunnel is listening; ssh accepts local connections
+    even when the remote side is unreachable, so this does not guarantee that the remote service is up.
+    """
+    def __init__(self, cache_file, timeout=2.0, backoff_base=30, backoff_max=900):
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.state = Reusable.read_json_file(cache_file, default={}) or {}
+        # "host:port" -> latest probe result
+        self.state.setdefault("endpoints", {})
+        # "host:port" -> restart attempts since the endpoint was last seen up
+        self.state.setdefault("restarts", {})
+
+    @staticmethod
+    async def _probe_endpoint(host, port, timeout):
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+        except asyncio.TimeoutError:
+            return {"up": False, "latency_ms": None, "error": f"Timed out after {timeout}s"}
+        except OSError as err:
+            return {"up": False, "latency_ms": None, "error": err.strerror or str(err)}
+        latency_ms = (time.perf_counter() - start) * 1000
+        writer.close()
+        return {"up": True, "latency_ms": round(latency_ms, 2), "error": None}
+
+    async def _probe_all(self, endpoints):
+        results = await asyncio.gather(*(self._probe_endpoint(host, port, self.timeout) for host, port in endpoints))
+        return dict(zip(endpoints, results))
+
+    def probe(self, endpoints):
+        """
+        Probe all endpoints at once; total time is bounded by the timeout rather than the number of endpoints
+
+        :param endpoints: iterable of (host, port)
+        :return: dict of {"host:port": probe result}
+        """
+        endpoints = list(dict.fromkeys((host, str(port)) for host, port in endpoints))
+        results = asyncio.run(self._probe_all(endpoints)) if endpoints else {}
+        now = time.time()
+        self.state["endpoints"] = {}
+        for (host, port), result in results.items():
+            key = f"{host}:{port}"
+            result["checked_at"] = now
+            self.state["endpoints"][key] = result
+            if result["up"]:
+                self.state["restarts"].pop(key, None)
+        self.state["updated_at"] = now
+        return self.state["endpoints"]
+
+    def is_down(self, key):
+        return key in self.state["endpoints"] and not self.state["endpoints"][key]["up"]
+
+    def restart_due(self, key, now=None):
+        restart = self.state["restarts"].get(key)
+        return not restart or (now or time.time()) >= restart["next_attempt"]
+
+    def record_restart(self, key, error=None):
+        """Record a restart attempt; the next one waits twice as long (up to backoff_max) until the endpoint is seen up"""
+        attempts = self.state["restarts"].get(key, {}).get("attempts", 0) + 1
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        self.state["restarts"][key] = {"attempts": attempts, "next_attempt": time.time() + delay, "last_error": error}
+
+    def status_label(self, key, expected_up=False):
+        """Short status for menu labels: latency if up, "down" only for tunnels which are supposed to be running"""
+        result = self.state["endpoints"].get(key)
+        if not result:
+            return ""
+        if result["up"]:
+            return f"● {result['latency_ms']:.0f} ms"
+        if not expected_up:
+            return ""
+        restart = self.state["restarts"].get(key)
+        if restart:
+            return f"○ down, retry in {Reusable.format_duration(max(restart['next_attempt'] - time.time(), 0))}"
+        return "○ down"
+
+    def save(self):
+        Reusable.write_json_file(self.cache_file, self.state)
+
+
+class TunnelRegistry:
+    """
+    Registry of SSH tunnels started by this plugin (PID, endpoints and config name), kept in a
+    JSON state file so that tunnels can be found without scanning every process on the host.
+    Tunnels not in the registry (e.g. started manually) are found with a psutil process scan.
+    """
+    # ssh options which take a value, for finding the destination among the remaining arguments
+    ssh_options_with_values = set("BbcDEeFIiJLlmOoPpQRSWw")
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.tunnels = Reusable.read_json_file(state_file, default={}) or {}
+
+    def save(self):
+        Reusable.write_json_file(self.state_file, self.tunnels)
+
+    @staticmethod
+    def make_key(local_address, local_port):
+        return f"{local_address}:{local_port}"
+
+    def add(self, pid, config_name, local_address, local_port, remote_address, remote_port, ssh_server, **extra):
+        key = self.make_key(local_address, local_port)
+        self.tunnels[key] = dict(
+            pid=pid, config_name=config_name, local_address=local_address, local_port=str(local_port),
+            remote_address=remote_address, remote_port=str(remote_port), ssh_server=ssh_server, started=time.time(),
+            create_time=self.process_create_time(pid), **extra)
+        return self.tunnels[key]
+
+    def add_tunnel(self, pid, tunnel, **extra):
+        """Register a tunnel built by Actions._build_ssh_tunnel"""
+        return self.add(pid, **{k: v for k, v in tunnel.items() if k not in ("privileged", "command", "ssh_options")}, **extra)
+
+    def remove(self, key):
+        return self.tunnels.pop(key, None)
+
+    @staticmethod
+    def _matches(tunnel, loopback_ip=None, loopback_port=None):
+        return (not loopback_ip or tunnel["local_address"] == loopback_ip) and \
+               (not loopback_port or str(tunnel["local_port"]) == str(loopback_port))
+
+    @staticmethod
+    def process_create_time(pid):
+        try:
+            return psutil.Process(pid).create_time() if pid else None
+        except psutil.Error:
+            return None
+
+    @staticmethod
+    def process_name(pid):
+        try:
+            return psutil.Process(pid).name()
+        except psutil.Error:
+            return None
+
+    @staticmethod
+    def process_cmdline(proc):
+        """Command line of a process; for root-owned processes (sudo tunnels) on macOS it can only be read from ps"""
+        try:
+            return proc.cmdline()
+        except psutil.AccessDenied:
+            ps_result = subprocess.run(["ps", "-o", "command=", "-p", str(proc.pid)], capture_output=True, universal_newlines=True)
+            return shlex.split(ps_result.stdout.strip())
+
+    @classmethod
+    def is_tunnel_process(cls, tunnel):
+        """
+        Whether a registered PID still belongs to the tunnel, rather than to an unrelated process which reused the PID:
+        it must be ssh, started when the tunnel was registered, and have the tunnel's forward on its command line
+        (or, for a forward over a shared connection, the connection's control socket)
+        """
+        if not tunnel.get("pid"):
+            return False
+        try:
+            proc = psutil.Process(tunnel["pid"])
+            if proc.name() != "ssh":
+                return False
+            if tunnel.get("create_time") is not None and abs(proc.create_time() - tunnel["create_time"]) > 1:
+                return False
+            cmdline = cls.process_cmdline(proc)
+        except psutil.Error:
+            return False
+        if tunnel.get("control_path"):
+            return tunnel["control_path"] in cmdline
+        parsed = cls.parse_ssh_cmdline(cmdline)
+        forward = (tunnel["local_address"], str(tunnel["local_port"]), tunnel["remote_address"], str(tunnel["remote_port"]))
+        return bool(parsed) and forward in parsed["forwards"]
+
+    def find(self, loopback_ip=None, loopback_port=None):
+        """Registered tunnels matching the given local endpoint whose process is still running (O(matches), no process scan)"""
+        found = {}
+        for key, tunnel in list(self.tunnels.items()):
+            if not self._matches(tunnel, loopback_ip, loopback_port):
+                continue
+            if self.is_tunnel_process(tunnel):
+                found[key] = tunnel
+            else:
+                # Tunnel process is gone (and its PID may since have been reused)
+                self.remove(key)
+        return found
+
+    @classmethod
+    def parse_ssh_cmdline(cls, cmdline):
+        """
+        Extract local forwards and the destination from an ssh command line (as a list of arguments)
+
+        :return: dict with "forwards" (list of (local_address, local_port, remote_address, remote_port)) and "ssh_server"
+        """
+        if not cmdline or os.path.basename(cmdline[0]) != "ssh":
+            return None
+        forwards, destination = [], None
+        args = iter(cmdline[1:])
+        for arg in args:
+            if arg.startswith("-") and len(arg) > 1:
+                option = arg[1:]
+                # Options can be combined (e.g. -NfL spec); only the last one can take a value
+                for n, flag in enumerate(option):
+                    if flag in cls.ssh_options_with_values:
+                        value = option[n + 1:] or next(args, "")
+                        if flag == "L":
+                            parts = value.split(":")
+                            if len(parts) == 3:
+                                parts.insert(0, "localhost")
+                            if len(parts) == 4:
+                                forwards.append(tuple(parts))
+                        break
+            elif destination is None:
+                destination = arg
+        if not forwards:
+            return None
+        return {"forwards": forwards, "ssh_server": destination}
+
+    @classmethod
+    def discover(cls, loopback_ip=None, loopback_port=None):
+        """
+        Find running ssh processes with matching local forwards using psutil (no text parsing of ps output).
+        Root-owned processes (tunnels started with sudo) can't be inspected directly on macOS, so their
+        command lines are fetched from ps in a single call, for just those PIDs.
+
+        :return: dict of {pid: parsed ssh command line}
+        """
+        candidates, denied = {}, []
+        for proc in psutil.process_iter(["pid", "name", "cmdline"]):
+            if proc.info["name"] != "ssh":
+                continue
+            if proc.info["cmdline"] is None:
+                denied.append(proc.info["pid"])
+            else:
+                candidates[proc.info["pid"]] = proc.info["cmdline"]
+        if denied:
+            ps_result = subprocess.run(
+                ["ps", "-o", "pid=,command=", "-p", ",".join(str(p) for p in denied)],
+                capture_output=True, universal_newlines=True)
+            for line in ps_result.stdout.splitlines():
+                pid, _, command = line.strip().partition(" ")
+                if pid.isdigit():
+                    candidates[int(pid)] = shlex.split(command)
+
+        found = {}
+        for pid, cmdline in candidates.items():
+            parsed = cls.parse_ssh_cmdline(cmdline)
+            if not parsed:
+                continue
+            for local_address, local_port, _, _ in parsed["forwards"]:
+                if (not loopback_ip or local_address == loopback_ip) and (not loopback_port or local_port == str(loopback_port)):
+                    found[pid] = parsed
+                    break
+        return found
+
+    @staticmethod
+    def terminate(pids):
+        """Kill all of the given ssh PIDs with a single privileged call; anything which is no longer ssh is left alone"""
+        pids = [pid for pid in pids if TunnelRegistry.process_name(pid) == "ssh"]
+        if not pids:
+            return
+        Reusable.do_prompt_for_sudo()
+        _ = Reusable.run_cli_command(["sudo", "kill", "-9"] + [str(p) for p in sorted(pids)])
+
+
+class SshControlMaster:
+    """
+    Shared SSH connection (ControlMaster) to one SSH server. Tunnels are added and removed over it with
+    "ssh -O forward" / "ssh -O cancel", so only the first tunnel to a server pays for the SSH handshake.
+    """
+    def __init__(self, control_dir, destination, port=22, ssh_options=None, control_path=None):
+        self.destination = destination
+        self.port = str(port or 22)
+        self.ssh_options = shlex.split(ssh_options) if isinstance(ssh_options, str) else list(ssh_options or [])
+        # Socket paths are limited to ~100 characters, so use a short digest rather than the destination itself
+        digest = hashlib.sha1(f"{destination}:{self.port}".encode("utf-8")).hexdigest()[:12]
+        self.control_path = control_path or os.path.join(control_dir, f"cm-{digest}.sock")
+
+    def _control(self, *args, timeout=30):
+        result = subprocess.run(
+            ["ssh", "-S", self.control_path, "-p", self.port] + list(args) + [self.destination],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=timeout)
+        return result.returncode == 0, (result.stderr or result.stdout).strip()
+
+    def check(self):
+        """:return: PID of the running master, or None"""
+        if not os.path.exists(self.control_path):
+            return None
+        ok, message = self._control("-O", "check")
+        pid = re.findall(r"pid=(\d+)", message)
+        return int(pid[0]) if ok and pid else None
+
+    def start(self, interactive=False, timeout=60):
+        """
+        Open the master connection in the background. Non-interactive starts never prompt, and (since ssh -f
+        keeps stdout/stderr open after forking) send stderr to a temp file rather than a pipe.
+
+        :return: tuple of (PID or None, error message)
+        """
+        command = ["ssh"] + self.ssh_options + [
+            "-M", "-S", self.control_path, "-o", "ControlPersist=yes", "-N", "-f", "-p", self.port, self.destination]
+        if interactive:
+            subprocess.run(command, timeout=timeout)
+            error = ""
+        else:
+            command[1:1] = ["-o", "BatchMode=yes"]
+            with tempfile.TemporaryFile(mode="w+") as stderr_file:
+                try:
+                    subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr_file, timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    return None, f"Timed out after {timeout} seconds"
+                stderr_file.seek(0)
+                error = " ".join(_line.strip() for _line in stderr_file if _line.strip() and not _line.startswith("Warning: Permanently added"))
+        pid = self.check()
+        return pid, "" if pid else (error or "SSH master connection failed to start")
+
+    def forward(self, spec):
+        """Add a local forward (local_address:local_port:remote_address:remote_port) over the master connection"""
+        return self._control("-O", "forward", "-L", spec)
+
+    def cancel(self, spec):
+        return self._control("-O", "cancel", "-L", spec)
+
+    def exit(self):
+        ok, message = self._control("-O", "exit")
+        if os.path.exists(self.control_path):
+            os.remove(self.control_path)
+        return ok, message
+
+    @staticmethod
+    def forward_spec(tunnel):
+        return f"{tunnel['local_address']}:{tunnel['local_port']}:{tunnel['remote_address']}:{tunnel['remote_port']}"
 
 
 # ToDo Finish building the Icons class and switch everything over to using it
@@ -365,6 +2373,42 @@ class ConfigMain:
     # default Jira prefix (project name)
     jira_default_prefix: str
 
+    # Maximum size (in characters) of each statement generated by the inline table actions
+    inline_table_max_statement_size: int
+
+    # Command used by "run" actions to start psql. Default: psql within the postgres container
+    db_psql_command: str
+
+    # Optional SSH destination (such as user@host) on which db_psql_command is run. If empty, it runs locally
+    db_ssh_host: str
+
+    # Show executing batches in the status bar, polled in the background via db_psql_command
+    batch_monitor_enabled: bool
+
+    # Minimum number of seconds between background polls for executing batches
+    batch_monitor_interval: int
+
+    # Share one SSH connection (ControlMaster) per SSH server between all tunnels which use it
+    ssh_control_master: bool
+
+    # Probe tunnel endpoints in the background, show their status in the menu, and restart tunnels which went down
+    tunnel_monitor_enabled: bool
+
+    # Minimum number of seconds between background tunnel probes
+    tunnel_monitor_interval: int
+
+    # Keep a headless browser warm in the background for screenshot actions
+    browser_pool_enabled: bool
+
+    # Seconds without a screenshot request after which the background browser is shut down
+    browser_pool_idle_timeout: int
+
+    # Number of headless browsers used in parallel by the batch screenshot actions
+    screenshot_batch_workers: int
+
+    # Page load timeout (seconds) for each item of a batch screenshot
+    screenshot_batch_timeout: int
+
 
 @dataclass_json
 @dataclass
@@ -425,6 +2469,9 @@ class Config:
         self.dir_supporting_scripts = os.path.join(self.dir_internal_tools, "scripts")
         self.image_file_path = os.path.join(self.dir_internal_tools, 'supporting_files/images')
 
+        # Local state kept between runs (history databases, caches, etc.)
+        self.dir_plugin_data = os.path.join(self.dir_user_home, ".bitbar_logichub")
+
         logos_by_os_theme = {
             "Dark": {
                 "small": "bitbar_status_small.png",
@@ -453,19 +2500,47 @@ class Config:
             status_bar_text_color=kwargs.get("status_bar_text_color", "black"),
             clipboard_update_notifications=Reusable.convert_boolean(kwargs.get("clipboard_update_notifications", False)),
             debug_output_enabled=Reusable.convert_boolean(kwargs.get("debug_output_enabled", False)),
-            jira_default_prefix=kwargs.get("jira_default_prefix", "LHUB")
+            jira_default_prefix=kwargs.get("jira_default_prefix", "LHUB"),
+            inline_table_max_statement_size=int(kwargs.get("inline_table_max_statement_size", 500000)),
+            db_psql_command=kwargs.get("db_psql_command", PsqlSession.default_command),
+            db_ssh_host=kwargs.get("db_ssh_host", ""),
+            batch_monitor_enabled=Reusable.convert_boolean(kwargs.get("batch_monitor_enabled", False)),
+            batch_monitor_interval=int(kwargs.get("batch_monitor_interval", 60)),
+            ssh_control_master=Reusable.convert_boolean(kwargs.get("ssh_control_master", True)),
+            tunnel_monitor_enabled=Reusable.convert_boolean(kwargs.get("tunnel_monitor_enabled", False)),
+            tunnel_monitor_interval=int(kwargs.get("tunnel_monitor_interval", 30)),
+            browser_pool_enabled=Reusable.convert_boolean(kwargs.get("browser_pool_enabled", True)),
+            browser_pool_idle_timeout=int(kwargs.get("browser_pool_idle_timeout", 600)),
+            screenshot_batch_workers=int(kwargs.get("screenshot_batch_workers", 4)),
+            screenshot_batch_timeout=int(kwargs.get("screenshot_batch_timeout", 30)),
         )
 
     def get_config_menu_networking_params(self, **kwargs):
         self.menu_networking = ConfigMenuNetworking(kwargs)
 
+    def plugin_data_path(self, file_name):
+        """Path to a file in the plugin's local data directory, which is created if needed"""
+        os.makedirs(self.dir_plugin_data, exist_ok=True)
+        return os.path.join(self.dir_plugin_data, file_name)
+
 
 class Actions:
     # Static items
     loopback_interface = None
 
+    query_descriptors_and_docker_images = """select id, modified, substring(descriptor from '"image" *: *"([^"]*?)') as docker_image from integration_descriptors order by id;"""
+    query_currently_running_streams = r"""select b.name as "Stream Name", a.id as "Batch ID", substring(a.stream_id from '"(.+)"') as "Stream ID", a.id as "Batch ID", b.flow as "Flow ID" from batches a left join streams b on substring(a.stream_id from '(\d+)') :: int = b.id where state = 'executing' order by "Stream ID", "Batch ID";"""
+    # Latest and first version of each flow via lateral index lookups on (id, version), instead of an aggregate plus two self-joins
+    query_summarize_latest_flows = """select l.name as "Current Name", a.id as "Flow ID", l.version as "Current Version", l.created_at as "Last Modified", f.created_at as "Original Create Date" from (select distinct id from versioned_flows) a cross join lateral (select name, version, created_at from versioned_flows v where v.id = a.id order by version desc limit 1) l cross join lateral (select created_at from versioned_flows v where v.id = a.id order by version limit 1) f order by "Current Name";"""
+    query_summarize_latest_flows_lite = """select l.name, a.id, l.version as max_version from (select distinct id from versioned_flows) a cross join lateral (select name, version from versioned_flows v where v.id = a.id order by version desc limit 1) l;"""
+    # Previous versions, kept for benchmarking against the ones above
+    query_summarize_latest_flows_legacy = """select b.name as "Current Name", a.id as "Flow ID", b.version as "Current Version", b.created_at as "Last Modified", c.created_at as "Original Create Date" from (select id, min(version) as min_version, max(version) as max_version from versioned_flows group by id) a left join versioned_flows b on a.id = b.id and a.max_version = b.version left join versioned_flows c on a.id = c.id and a.min_version = c.version order by "Current Name";"""
+    query_summarize_latest_flows_lite_legacy = """select b.name, a.id, a.max_version from (select id, min(version) as min_version, max(version) as max_version from versioned_flows group by id) a left join versioned_flows b on a.id = b.id and a.max_version = b.version;"""
+    query_users_pending_password_reset = r"""select username, failed_attempts, ROUND(EXTRACT(epoch FROM current_date - password_modified_at)/3600/24) as days_pending from users where password_needs_reset = true;"""
+
     # Defaults
     ssh_tunnel_configs = []
+    ssh_tunnel_group_configs = []
     port_redirect_configs = []
 
     def __init__(self, config):
@@ -485,15 +2560,33 @@ class Actions:
 
         self.config = config
 
+        self.batch_activity = None
+        if self.config.main.batch_monitor_enabled:
+            self.batch_activity = BatchActivityCollector(self.config.plugin_data_path("batch_activity.json"))
+
+        self.tunnel_health = None
+        if self.config.main.tunnel_monitor_enabled:
+            self.tunnel_health = TunnelHealthMonitor(self.config.plugin_data_path("tunnel_health.json"))
+
         self.set_status_bar_display()
         self.loopback_interface = self.config.default_loopback_interface
+        self._loopback = None
 
         # dict to store all of the actions
         self.action_list = {}
 
+        # Actions which are run in the background by the plugin itself, and never shown in the menu
+        self.background_actions = {
+            "_collect_batch_activity": self.background_collect_batch_activity,
+            "_probe_tunnels": self.background_probe_tunnels,
+            "_browser_pool": self.background_browser_pool,
+        }
+
         # ------------ Menu Section: LogicHub ------------ #
 
         self.add_menu_section("LogicHub | image={} size=20 color=blue".format(self.image_to_base64_string("bitbar_menu_logichub.ico")))
+        if self.batch_activity:
+            self.add_batch_activity_menu()
         self.print_in_bitbar_menu("LQL & Web UI")
         self.make_action("(Beta) Pretty Print SQL", self.logichub_pretty_print_sql)
         self.make_action("(Beta) Pretty Print SQL options", action=None, alternate=True)
@@ -523,6 +2616,8 @@ class Actions:
         self.make_action("SQL Start from spaced strings (join, left columns only)", self.logichub_tabs_to_columns_left_join, alternate=True)
         self.make_action("SQL Start from spaced strings (join with right columns)", self.logichub_sql_start_from_tabs_join_right)
         self.make_action("SQL Start from spaced strings (join, right columns only)", self.logichub_tabs_to_columns_right_join, alternate=True)
+        self.make_action("Inline table from pasted rows (TSV/CSV)", self.logichub_inline_table_from_rows)
+        self.make_action("VALUES list from pasted rows (TSV/CSV)", self.logichub_values_list_from_rows, alternate=True)
         self.make_action("Operator Start: autoJoinTables", self.logichub_operator_start_autoJoinTables)
         self.make_action("Operator Start: forceFail", self.logichub_operator_start_forceFail)
         self.make_action("Operator Start: jsonToColumns", self.logichub_operator_start_jsonToColumns)
@@ -552,16 +2647,29 @@ class Actions:
 
         self.make_action("Runtime Stats Sort JSON", self.logichub_runtime_stats_to_json)
         self.make_action("Runtime Stats to CSV", self.logichub_runtime_stats_to_csv)
+        self.make_action("Runtime Stats Critical Path (uses saved flow export)", self.logichub_runtime_stats_critical_path)
+        self.make_action("Save flow export JSON from clipboard (for critical path)", self.logichub_save_flow_export, alternate=True)
+        self.make_action("Runtime Stats Percentiles (from directory or NDJSON path in clipboard)", self.logichub_runtime_stats_aggregate)
+        self.make_action("Runtime Stats History: p95 for node name in clipboard (last 7 days)", self.logichub_runtime_stats_history_node_p95)
+        self.make_action("Runtime Stats History: nodes 2x slower since flow version in clipboard", self.logichub_runtime_stats_history_regressions)
+
+        self.add_menu_divider_line(menu_depth=1)
+        self.make_action("pg_dump backup (path in clipboard; optional table names on following lines)", None, text_color="blue")
+        self.make_action("pg_dump backup: List tables", self.logichub_pg_dump_list_tables)
+        self.make_action("pg_dump backup: Export tables to CSV", self.logichub_pg_dump_export_tables)
+        self.make_action("pg_dump backup: Export tables to NDJSON", self.logichub_pg_dump_export_tables_json, alternate=True)
 
         self.print_in_bitbar_menu("Shell: Host")
         self.make_action("Add myself to docker group", self.shell_lh_host_fix_add_self_to_docker_group)
         self.make_action("Own Instance Version", self.logichub_shell_own_instance_version)
         self.make_action("Path to service container data", self.shell_lh_host_path_to_service_container_volume)
         self.make_action("Recent UI user activity", self.logichub_check_recent_user_activity)
+        self.make_action("Recent UI user activity (shell, zgrep per user)", self.logichub_check_recent_user_activity_shell, alternate=True)
         self.make_action("Stop and Start All Services", self.logichub_stop_and_start_services_in_one_line)
 
         self.print_in_bitbar_menu("Shell: Service Container")
         self.make_action("List Edited Descriptors", self.lh_service_shell_list_edited_descriptors)
+        self.make_action("List Edited Descriptors (hash manifest vs. shipped baseline; run on host)", self.lh_service_shell_list_edited_descriptors_by_hash, alternate=True)
 
         self.print_in_bitbar_menu("Docker")
         self.make_action("service bash", self.docker_service_bash)
@@ -572,30 +2680,40 @@ class Actions:
         self.make_action("Integrations", None, text_color="blue")
 
         self.make_action("List Descriptors w/ Docker Images", self.db_postgres_descriptors_and_docker_images)
+        self.make_action("Run: List Descriptors w/ Docker Images (CSV)", self.db_postgres_descriptors_and_docker_images_run, alternate=True)
 
         self.make_action("List Instances w/ Docker Images", self.db_postgres_instances_and_docker_images)
         self.make_action("List Instances w/ Docker Images (extended)", self.db_postgres_instances_and_docker_images_extended, alternate=True)
+        self.make_action("Run: List Instances w/ Docker Images (CSV)", self.db_postgres_instances_and_docker_images_run)
 
         self.make_action("List Instances w/ Docker Images, exclude image in clipboard", self.db_postgres_instances_and_docker_images_exclude_image)
         self.make_action("List Instances w/ Docker Images (extended), exclude image in clipboard", self.db_postgres_instances_and_docker_images_extended_exclude_image, alternate=True)
+        self.make_action("Run: List Instances w/ Docker Images, exclude image in clipboard (CSV)", self.db_postgres_instances_and_docker_images_exclude_image_run)
 
         self.add_menu_divider_line(menu_depth=1)
         self.make_action("Streams and Batches", None, text_color="blue")
 
         self.make_action("List executing streams/batches", self.db_postgres_currently_running_streams)
+        self.make_action("Run: List executing streams/batches (CSV)", self.db_postgres_currently_running_streams_run, alternate=True)
 
         self.add_menu_divider_line(menu_depth=1)
         self.make_action("Flows", None, text_color="blue")
 
         self.make_action("Summarize Flows (latest versions)", self.db_postgres_summarize_latest_flows)
         self.make_action("Summarize Flows (Lite)", self.db_postgres_summarize_latest_flows_lite, alternate=True)
+        self.make_action("Run: Summarize Flows (CSV)", self.db_postgres_summarize_latest_flows_run)
 
         self.add_menu_divider_line(menu_depth=1)
         self.make_action("Users", None, text_color="blue")
 
         self.make_action("List users with pending password reset", self.db_postgres_users_pending_password_reset)
+        self.make_action("Run: List users with pending password reset (CSV)", self.db_postgres_users_pending_password_reset_run, alternate=True)
 
-        # ToDo Update the actions above to give each an alternate version which runs without having to go into psql first
+        self.add_menu_divider_line(menu_depth=1)
+        self.make_action("Run SQL from clipboard (CSV)", self.db_postgres_run_clipboard_query_csv)
+        self.make_action("Run SQL from clipboard (JSON to clipboard)", self.db_postgres_run_clipboard_query_json, alternate=True)
+        self.make_action("Benchmark query versions (EXPLAIN ANALYZE, seeded temp tables)", self.db_postgres_benchmark_queries_seeded)
+        self.make_action("Benchmark query versions (EXPLAIN ANALYZE, live tables)", self.db_postgres_benchmark_queries_live, alternate=True)
 
         self.print_in_bitbar_menu("Integrations")
         self.make_action("integrationsFiles path: LogicHub host", self.clipboard_integrationsFiles_path_logichub_host)
@@ -612,8 +2730,12 @@ class Actions:
 
         self.print_in_bitbar_menu("LogicHub Upgrades")
         self.make_action("Upgrade Prep: Visual inspection", self.logichub_upgrade_prep_verifications)
+        self.make_action("Upgrade Prep: Visual inspection, single-exec fact collector", self.logichub_upgrade_prep_verifications_python)
         self.make_action("Upgrade Prep: Backups (run as logichub/centos!)", self.logichub_upgrade_prep_backups)
         self.make_action("Upgrade Prep: Backups Lite (skip logs and LH backup script)", self.logichub_upgrade_prep_backups_lite, alternate=True)
+        self.make_action("Upgrade Prep: Backups, streaming Python pipeline (run as logichub/centos!)", self.logichub_upgrade_prep_backups_python)
+        self.make_action("Upgrade Prep: Backups Lite, streaming Python pipeline", self.logichub_upgrade_prep_backups_python_lite, alternate=True)
+        self.make_action("Upgrade Prep: Backups, deduplicated store (incremental)", self.logichub_upgrade_prep_backups_python_store)
 
         self.add_menu_divider_line(menu_depth=1)
 
@@ -652,6 +2774,8 @@ class Actions:
         if not chrome_driver_error:
             self.make_action("Generate screenshot", self.action_html_to_screenshot)
             self.make_action("Generate screenshot (low res)", self.action_html_to_screenshot_low_res, alternate=True)
+            self.make_action("Batch screenshots (URLs, files or folder from clipboard)", self.action_batch_screenshots, terminal=True)
+            self.make_action("Batch screenshots (full page)", self.action_batch_screenshots_full_page, alternate=True, terminal=True)
         else:
             self.make_action("Screenshot unavailable ({})".format(chrome_driver_error), None)
 
@@ -701,17 +2825,41 @@ class Actions:
         self.print_in_bitbar_menu("Reset")
         self.make_action("Terminate SSH tunnels", self.action_terminate_tunnels, terminal=True)
         self.make_action("Terminate Local Port Redirection", self.action_terminate_port_redirection, terminal=True)
+        self.make_action("Terminate Loopback Aliases", self.action_terminate_loopback_aliases, terminal=True)
         self.make_action("Terminate All", self.action_terminate_all, terminal=True)
 
         self.print_in_bitbar_menu("Port Redirection")
         # If custom redirect configs are defined in logichub_tools.ini, then add actions for each
+        active_redirects = self._open_port_redirects().redirects if self.port_redirect_configs else {}
         for _config in self.port_redirect_configs:
-            self.make_action(_config[0], self.port_redirect_custom, terminal=True, action_id=_config[1])
+            _config_name = re.sub('^port_redirect_custom_', '', _config[1])
+            _status = "   ● active" if _config_name in active_redirects else ""
+            if self._is_userspace_redirect(self.config.menu_networking.configs[_config_name]):
+                _stats = self._userspace_forward_status(_config_name)
+                if _stats is not None:
+                    _bytes = _stats.get("bytes_to_target", 0) + _stats.get("bytes_from_target", 0)
+                    _status = f"   ● {_stats.get('connections_active', 0)}/{_stats.get('connections_total', 0)} conns, {_bytes / 1024 / 1024:.1f} MB"
+            self.make_action(f"{_config[0]}{_status}", self.port_redirect_custom, terminal=True, action_id=_config[1])
+            self.make_action(f"Remove {_config[0]}", self.port_redirect_remove, terminal=True, action_id=f"port_redirect_remove_{_config_name}", alternate=True)
+        if len(self.port_redirect_configs) > 1:
+            self.make_action("Enable All Redirects", self.port_redirect_all, terminal=True)
+        self.make_action("Benchmark Userspace Forwarder", self.port_redirect_benchmark_userspace, terminal=True)
 
         self.print_in_bitbar_menu("SSH Tunnels (custom)")
         # If custom ssh configs are defined in logichub_tools.ini, then add actions for each
+        registered_endpoints = set(self._open_tunnel_registry().tunnels) if self.tunnel_health else set()
         for _config in self.ssh_tunnel_configs:
-            self.make_action(_config[0], self.ssh_tunnel_custom, terminal=True, action_id=_config[1])
+            _label = _config[0]
+            if self.tunnel_health:
+                _endpoint = self._tunnel_endpoint(self.config.menu_networking.configs[re.sub('^ssh_tunnel_custom_', '', _config[1])])
+                _status = self.tunnel_health.status_label(_endpoint, expected_up=_endpoint in registered_endpoints)
+                _label = f"{_label}   {_status}" if _status else _label
+            self.make_action(_label, self.ssh_tunnel_custom, terminal=True, action_id=_config[1])
+
+        if self.ssh_tunnel_group_configs:
+            self.print_in_bitbar_menu("SSH Tunnel Groups (custom)")
+            for _config in self.ssh_tunnel_group_configs:
+                self.make_action(_config[0], self.ssh_tunnel_group, terminal=True, action_id=_config[1])
 
         self.print_in_bitbar_menu(f"---")
         self.print_in_bitbar_menu(f"Parent: {self.parent}")
@@ -813,11 +2961,118 @@ class Actions:
                 status_bar_label += f" image={logo}"
             if self.config.main.status_bar_style in ["text", "both"]:
                 status_bar_label += f" color={self.config.main.status_bar_text_color}"
+        if self.batch_activity:
+            status_bar_label = f"{self.batch_activity_label()} {status_bar_label}"
         self.status = status_bar_label
 
         # Set status bar text and/or logo
         self.print_in_bitbar_menu(self.status)
 
+    def batch_activity_label(self):
+        executing = self.batch_activity.executing
+        if self.batch_activity.state.get("error"):
+            return "⚠︎"
+        if not executing:
+            return ""
+        oldest = min(b["executing_since"] for b in executing.values())
+        return f"▶{len(executing)} {Reusable.format_duration(time.time() - oldest)}"
+
+    def add_batch_activity_menu(self):
+        state = self.batch_activity.state
+        updated = state.get("updated_at")
+        updated_str = f"updated {Reusable.format_duration(time.time() - updated)} ago" if updated else "not yet updated"
+        self.print_in_bitbar_menu(f"Executing Batches ({len(self.batch_activity.executing)}, {updated_str})")
+        if state.get("error"):
+            self.make_action(f"Last poll failed: {state['error']}", None, text_color="red")
+        for stream_name, batches in self.batch_activity.streams().items():
+            self.make_action(f"{stream_name} ({len(batches)})", None)
+            for batch_id, since in batches:
+                self.make_action(f"Batch {batch_id}: {Reusable.format_duration(time.time() - since)}", None, menu_depth=2)
+
+    def spawn_background_action(self, action_id, lock_name):
+        """
+        Start a detached copy of this plugin to run a background action, unless one is already running.
+        Used so that slow work (DB polling, network probes, etc.) never blocks the menu.
+        """
+        lock_file = self.config.plugin_data_path(f"{lock_name}.pid")
+        existing = Reusable.read_json_file(lock_file)
+        if existing and self._is_background_action_process(existing.get("pid", 0), action_id):
+            return
+        process = subprocess.Popen(
+            [sys.executable, os.path.realpath(self.script_name), action_id],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        Reusable.write_json_file(lock_file, {"pid": process.pid, "started": time.time()})
+
+    def _is_background_action_process(self, pid, action_id):
+        """Whether a PID from a lock file is still this plugin running the background action, rather than a reused PID"""
+        try:
+            args = psutil.Process(pid).cmdline()[1:]
+        except (psutil.Error, ValueError):
+            return False
+        script_path = os.path.realpath(self.script_name)
+        return action_id in args and any(os.path.realpath(arg) == script_path for arg in args)
+
+    @staticmethod
+    def _tunnel_endpoint(config_dict):
+        """Local "address:port" of an ssh tunnel config (same key format as the tunnel registry)"""
+        local_port = config_dict.get("local_port") or config_dict.get("remote_port")
+        return TunnelRegistry.make_key((config_dict.get("local_address") or "").strip(), local_port)
+
+    def background_probe_tunnels(self):
+        """Probe all configured and registered tunnel endpoints, then restart registered tunnels which are down"""
+        monitor = TunnelHealthMonitor(self.config.plugin_data_path("tunnel_health.json"))
+        registry = self._open_tunnel_registry()
+        ssh_configs = {
+            _var: _config for _var, _config in self.config.menu_networking.configs.items()
+            if isinstance(_config, dict) and _config.get("type") == "ssh"
+        } if self.config.menu_networking else {}
+
+        endpoints = {self._tunnel_endpoint(_config) for _config in ssh_configs.values()} | set(registry.tunnels)
+        monitor.probe(endpoint.rsplit(":", 1) for endpoint in endpoints)
+
+        # Only tunnels which are still in the registry (started, and not terminated since) are restarted. Probing takes
+        # a while, during which tunnels can be started or terminated from the menu, so the registry is read again
+        # before each restart and before saving, rather than saving the copy loaded above over any of those changes.
+        configs_by_name = {_config.get("name", _var): _config for _var, _config in ssh_configs.items()}
+        restarted = {}
+        for key, registered in list(registry.tunnels.items()):
+            if not monitor.is_down(key) or not monitor.restart_due(key) or registered["config_name"] not in configs_by_name:
+                continue
+            if key not in self._open_tunnel_registry().tunnels:
+                continue
+            try:
+                tunnel = self._build_ssh_tunnel(dict(configs_by_name[registered["config_name"]], name=registered["config_name"]))
+            except (AssertionError, ValueError) as err:
+                monitor.record_restart(key, str(err))
+                continue
+            if self.config.main.ssh_control_master and not tunnel["privileged"]:
+                master = self._ssh_control_master(tunnel)
+                success, message, _ = self._start_multiplexed_tunnel(tunnel, master, threading.Lock())
+                pid, extra = master.check(), {"control_path": master.control_path}
+            else:
+                success, message, _ = self._start_ssh_tunnel_process(tunnel)
+                pid, extra = next(iter(TunnelRegistry.discover(tunnel["local_address"], tunnel["local_port"])), None), {}
+            monitor.record_restart(key, None if success else message)
+            if success:
+                restarted[key] = (pid, tunnel, extra)
+        if restarted:
+            registry = self._open_tunnel_registry()
+            for key, (pid, tunnel, extra) in restarted.items():
+                if key in registry.tunnels:
+                    registry.add_tunnel(pid, tunnel, **extra)
+            registry.save()
+        monitor.save()
+
+    def background_collect_batch_activity(self):
+        collector = BatchActivityCollector(self.config.plugin_data_path("batch_activity.json"))
+        try:
+            with self._open_psql_session() as db:
+                collector.poll(db)
+        except (RuntimeError, OSError, ValueError) as err:
+            collector.save(error=str(err).splitlines()[0] if str(err) else type(err).__name__)
+        else:
+            collector.save()
+
     def make_action(self, name, action, action_id=None, menu_depth=1, alternate=False, terminal=False, text_color=None):
         menu_name = name
         if menu_depth:
@@ -877,6 +3132,22 @@ class Actions:
             output = f.read()
         self.write_clipboard(output)
 
+    def copy_python_script_to_clipboard(self, file_name, args=None):
+        """
+        Copy a supporting Python script to the clipboard, wrapped in a heredoc
+        so that it can be pasted directly into a terminal and run with python3.
+
+        :param file_name: Name of the script within the supporting scripts dir
+        :param args: (optional) Command line arguments to pass to the script
+        :return:
+        """
+        file_path = os.path.join(self.config.dir_supporting_scripts, file_name)
+        if not os.path.isfile(file_path):
+            self.display_notification_error("Invalid path to supporting script")
+        with open(file_path, "r") as f:
+            output = f.read()
+        self.write_clipboard(f"python3 - {args or ''} <<'LHUB_SCRIPT_EOF'\n{output.rstrip()}\nLHUB_SCRIPT_EOF\n")
+
     def _clipboard_to_temp_file(self, file_ext):
         _input = self.read_clipboard()
         return Reusable.write_text_to_temp_file(_input, file_ext, file_ext + "_text")
@@ -1067,6 +3338,50 @@ class Actions:
         _columns_formatted = "R.{}".format(", R.".join(_columns))
         self.write_clipboard(f'SELECT {_columns_formatted}\nFROM xxxx L\nLEFT JOIN xxxx R\nON L.xxxx = R.xxxx')
 
+    def _rows_to_inline_table(self, style):
+        """
+        Convert a pasted spreadsheet (or the path to a TSV/CSV file) into inline table statements.
+        A single statement goes straight to the clipboard; if the data has to be split into multiple
+        statements, they are streamed to a temp file which is then opened instead.
+        """
+        _input = self.read_clipboard()
+        if not _input:
+            self.display_notification_error("Clipboard is empty")
+        if "\n" not in _input and os.path.isfile(os.path.expanduser(_input)):
+            table = InlineTable(file_path=os.path.expanduser(_input), max_statement_size=self.config.main.inline_table_max_statement_size)
+        else:
+            table = InlineTable(text=_input, max_statement_size=self.config.main.inline_table_max_statement_size)
+        try:
+            table.analyze()
+        except ValueError as err:
+            self.display_notification_error(str(err))
+
+        first_statement, output_file, statement_count = None, None, 0
+        for statement in table.iter_statements(style=style):
+            statement_count += 1
+            if statement_count == 1:
+                first_statement = statement
+                continue
+            if not output_file:
+                output_file = open(Reusable.generate_temp_file_path("sql", prefix="inline_table"), "w")
+                output_file.write(f"{first_statement}\n\n")
+            output_file.write(f"{statement}\n\n")
+
+        if not statement_count:
+            self.display_notification_error("No data rows found")
+        if not output_file:
+            self.write_clipboard(first_statement)
+            return
+        output_file.close()
+        _ = subprocess.run(["open", output_file.name], capture_output=True, universal_newlines=True)
+        self.display_notification(f"Output split into {statement_count} statements")
+
+    def logichub_inline_table_from_rows(self):
+        self._rows_to_inline_table(style="lql")
+
+    def logichub_values_list_from_rows(self):
+        self._rows_to_inline_table(style="values")
+
     def logichub_operator_start_autoJoinTables(self):
         _input = self.read_clipboard()
         if ' ' in _input:
@@ -1337,8 +3652,21 @@ class Actions:
             return
         _stats = dict(Reusable.sort_dict_by_values(_stats, reverse=True))
         _input["runtimeStats"] = _stats
+        self._record_runtime_stats_history(_input)
         return _input
 
+    def _open_runtime_stats_history(self):
+        return RuntimeStatsHistory(self.config.plugin_data_path("runtime_stats_history.sqlite"))
+
+    def _record_runtime_stats_history(self, batch_stats):
+        # History is a convenience; never let a problem with it block the clipboard action itself
+        try:
+            history = self._open_runtime_stats_history()
+            history.record_batch(batch_stats)
+            history.close()
+        except (sqlite3.Error, OSError, ValueError, KeyError) as err:
+            log.debug(f"Failed to record runtimeStats history: {repr(err)}")
+
     def logichub_runtime_stats_to_json(self):
         _stats = self._logichub_runtime_stats_sort_by_longest()
         if not _stats:
@@ -1371,6 +3699,125 @@ class Actions:
         _ = subprocess.run(["open", csv_file], capture_output=True, universal_newlines=True)
         self.display_notification(f"Total processing time: {total_time}")
 
+    def logichub_runtime_stats_aggregate(self):
+        """
+        Aggregate runtimeStats from many batches (a directory of batch JSON files, or an
+        NDJSON file with one batch per line) and open a CSV of per-node percentiles,
+        ranked by the share of total runtime each node accounts for
+        """
+        _path = self.read_clipboard()
+        aggregator = RuntimeStatsAggregator()
+        try:
+            aggregator.add_path(_path)
+        except (FileNotFoundError, ValueError) as err:
+            self.display_notification_error(str(err))
+        if not aggregator.batch_count:
+            self.display_notification_error("No batches with runtimeStats found")
+
+        csv_file = aggregator.write_csv(Reusable.generate_temp_file_path("csv", prefix="runtime_stats_aggregate_"))
+        _ = subprocess.run(["open", csv_file], capture_output=True, universal_newlines=True)
+        self.display_notification(f"Aggregated {aggregator.batch_count} batches ({aggregator.skipped_records} skipped)")
+
+    def _pg_dump_index_from_clipboard(self):
+        """ Index the pg_dump backup whose path is on the first line of the clipboard; any further words are table names """
+        lines = self.read_clipboard().strip().splitlines() or [""]
+        tables = re.split(r"[\s,]+", " ".join(lines[1:]).strip()) if lines[1:] else []
+        start = time.time()
+        try:
+            dump = PgDumpIndex(lines[0].strip(), cache_file=self.config.plugin_data_path("pg_dump_index_cache.json"))
+        except (FileNotFoundError, ValueError) as err:
+            self.display_notification_error(str(err))
+        if not dump.tables:
+            self.display_notification_error("No COPY data blocks found in the dump")
+        print(f"Indexed {len(dump.tables)} tables in {Reusable.format_duration(time.time() - start)}" + (" (cached)" if dump.from_cache else ""))
+        return dump, [t for t in tables if t] or [t for t in PgDumpIndex.default_tables if t in dump.tables]
+
+    def logichub_pg_dump_list_tables(self):
+        """ List the tables in a pg_dump backup with their data sizes, from the byte offset index """
+        dump, _ = self._pg_dump_index_from_clipboard()
+        csv_file = dump.write_table_list_csv(Reusable.generate_temp_file_path("csv", prefix="pg_dump_tables_"))
+        _ = subprocess.run(["open", csv_file], capture_output=True, universal_newlines=True)
+        self.display_notification(f"{len(dump.tables)} tables in dump")
+
+    def logichub_pg_dump_export_tables(self, file_format="csv"):
+        """ Stream selected tables out of a pg_dump backup into one CSV (or NDJSON) file per table """
+        dump, tables = self._pg_dump_index_from_clipboard()
+        output_dir = os.path.join(tempfile.gettempdir(), f"pg_dump_export_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')}")
+        start = time.time()
+        try:
+            row_counts = dump.export(tables, output_dir, file_format=file_format)
+        except ValueError as err:
+            self.display_notification_error(str(err))
+        for table, count in row_counts.items():
+            print(f"    {table:<40} {count:>10,} rows")
+        print(f"\nExported {len(row_counts)} tables in {Reusable.format_duration(time.time() - start)} to:\n    {output_dir}\n")
+        _ = subprocess.run(["open", output_dir], capture_output=True, universal_newlines=True)
+        self.display_notification(f"Exported {sum(row_counts.values())} rows from {len(row_counts)} tables")
+
+    def logichub_pg_dump_export_tables_json(self):
+        self.logichub_pg_dump_export_tables(file_format="json")
+
+    def logichub_save_flow_export(self):
+        """ Save the flow export in the clipboard for use with runtimeStats critical path analysis """
+        flow_export = self._json_notify_and_exit_when_invalid()
+        try:
+            node_count = len(FlowCriticalPath(flow_export, {}).dependencies)
+        except ValueError as err:
+            self.display_notification_error(str(err))
+        with open(self.config.plugin_data_path("flow_export.json"), "w") as f:
+            json.dump(flow_export, f)
+        self.display_notification(f"Flow export saved ({node_count} nodes)")
+
+    def logichub_runtime_stats_critical_path(self):
+        """ Critical path analysis of the runtimeStats in the clipboard, using the saved flow export """
+        _stats = self._logichub_runtime_stats_sort_by_longest()
+        if not _stats:
+            return
+        flow_export_path = self.config.plugin_data_path("flow_export.json")
+        if not os.path.isfile(flow_export_path):
+            self.display_notification_error("No saved flow export; copy the flow export JSON and save it first")
+        with open(flow_export_path, "r") as f:
+            flow_export = json.load(f)
+        try:
+            analysis = FlowCriticalPath(flow_export, _stats["runtimeStats"])
+        except ValueError as err:
+            self.display_notification_error(str(err))
+        self.write_clipboard(analysis.report(execution_time_ms=_stats.get("executionTimeMs")))
+        length, _ = analysis.critical_path()
+        self.display_notification(f"Critical path: {length} (virtual total: {sum(analysis.weights.values())})")
+
+    def logichub_runtime_stats_history_node_p95(self):
+        """ Runtime Stats History: p95 over the last 7 days for the node name in the clipboard """
+        node = self.read_clipboard()
+        if not node:
+            self.display_notification_error("No node name in clipboard")
+        history = self._open_runtime_stats_history()
+        p95, sample_count = history.node_percentile(node, pct=95, days=7)
+        history.close()
+        if not sample_count:
+            self.display_notification_error(f"No history found for node {node} in the last 7 days")
+        self.display_notification(f"{node}: p95 {p95:.0f} ms over {sample_count} batches (last 7 days)")
+
+    def logichub_runtime_stats_history_regressions(self):
+        """ Runtime Stats History: nodes at least 2x slower (median) since the flow version in the clipboard """
+        version = self.read_clipboard()
+        if not re.match(r"^\d+$", version):
+            self.display_notification_error(f"Invalid flow version ({version})")
+        history = self._open_runtime_stats_history()
+        results = history.regressions(since_version=int(version), factor=2.0)
+        history.close()
+        if not results:
+            self.display_notification(f"No nodes are 2x slower since version {version}")
+            return
+
+        csv_file = Reusable.generate_temp_file_path("csv", prefix="runtime_stats_regressions_")
+        with open(csv_file, "w") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        _ = subprocess.run(["open", csv_file], capture_output=True, universal_newlines=True)
+        self.display_notification(f"{len(results)} node(s) at least 2x slower since version {version}")
+
     ############################################################################
     # LogicHub -> Shell: Host
     def shell_lh_host_fix_add_self_to_docker_group(self):
@@ -1380,6 +3827,14 @@ class Actions:
         self.write_clipboard(f'/var/lib/docker/volumes/logichub_data/_data/service/')
 
     def logichub_check_recent_user_activity(self):
+        """
+        Recent UI user activity, from a single pass over the service logs
+
+        :return:
+        """
+        self.copy_python_script_to_clipboard("upgrade_prep-verify.py", "--user-activity")
+
+    def logichub_check_recent_user_activity_shell(self):
         self.write_clipboard(r"""check_recent_user_activity() {
     # New consolidated list of all users who have logged in during the current and previous log files
     previous_service_log="$(find /var/log/logichub/service -name "service.log.2*gz"| sort | tail -n1)"
@@ -1434,6 +3889,14 @@ check_recent_user_activity
     def lh_service_shell_list_edited_descriptors(self):
         self.write_clipboard("""ls -l /opt/docker/resources/integrations |grep -P "\.json" | grep -v "$(ls -l /opt/docker/resources/integrations |grep -P '\.json$' | awk '{print $6" "$7" "$8}'|sort|uniq -c|sed -E 's/^ *//'|sort -nr|head -n1|grep -Po ' \K.*')\"""")
 
+    def lh_service_shell_list_edited_descriptors_by_hash(self):
+        """
+        List Edited Descriptors (hash manifest vs. shipped baseline)
+
+        :return:
+        """
+        self.copy_python_script_to_clipboard("upgrade_prep-verify.py", "--descriptors-only")
+
     ############################################################################
     # LogicHub -> Docker
 
@@ -1447,15 +3910,32 @@ check_recent_user_activity
     # LogicHub -> DB: Postgres
 
     def db_postgres_descriptors_and_docker_images(self):
-        self.write_clipboard("""select id, modified, substring(descriptor from '"image" *: *"([^"]*?)') as docker_image from integration_descriptors order by id;""")
+        self.write_clipboard(self.query_descriptors_and_docker_images)
+
+    def _build_query_instances_and_docker_images(self, extended=False, exclude=False, docker_image=None):
+        """
+        Parse each descriptor once (as jsonb, via a lateral subquery) and extract all fields from
+        that, rather than re-parsing the descriptor text for every column
+
+        :param docker_image: Image to exclude when exclude=True (read from the clipboard if not provided)
+        """
+        extended_fields = "" if not extended \
+            else """i.integration_id, substring(d.image from ':([^:]+)$') as "Docker tag", """
+        query_string = f"""select d.name as "Integration Name", i.label, i.id, d.version as "Integration Version", {extended_fields}d.image as "Full Docker Image" from integration_instances i cross join lateral (select j->>'name' as name, j->>'version' as version, j#>>'{{runtimeEnvironment,descriptor,image}}' as image from (select i.descriptor::jsonb as j) x) d"""
+
+        if exclude:
+            docker_image = (docker_image or self.read_clipboard()).replace("'", "''")
+            query_string += f""" where d.image not like '{docker_image}'"""
+        return f"{query_string} order by i.integration_id, i.label;"
 
-    def _build_query_instances_and_docker_images(self, extended=False, exclude=False):
+    def _build_query_instances_and_docker_images_legacy(self, extended=False, exclude=False, docker_image=None):
+        """ Previous version of _build_query_instances_and_docker_images, kept for benchmarking """
         extended_fields = "" if not extended \
             else """integration_id, substring(cast(descriptor::json->'runtimeEnvironment'->'descriptor'->'image' as varchar) from ':([^:]+?)"$') as "Docker tag", """
         query_string = f"""select substring(cast(descriptor::json->'name' as varchar) from '"(.+)"') as "Integration Name", label, id, substring(cast(descriptor::json->'version' as varchar) from '"(.+)"') as "Integration Version", {extended_fields}substring(cast(descriptor::json->'runtimeEnvironment'->'descriptor'->'image' as varchar) from '"(.+)"') as "Full Docker Image" from integration_instances order by integration_id, label"""
 
         if exclude:
-            docker_image = self.read_clipboard()
+            docker_image = docker_image or self.read_clipboard()
             return f"""select * from ({query_string}) a where "Full Docker Image" not like '{docker_image}';"""
         else:
             return f"{query_string};"
@@ -1474,27 +3954,105 @@ check_recent_user_activity
 
     def db_postgres_currently_running_streams(self):
         """ List executing streams/batches """
-        self.write_clipboard(
-            r"""select b.name as "Stream Name", a.id as "Batch ID", substring(a.stream_id from '"(.+)"') as "Stream ID", a.id as "Batch ID", b.flow as "Flow ID" from batches a left join streams b on substring(a.stream_id from '(\d+)') :: int = b.id where state = 'executing' order by "Stream ID", "Batch ID";"""
-        )
+        self.write_clipboard(self.query_currently_running_streams)
 
     def db_postgres_summarize_latest_flows(self):
         """ Summarize Flows (latest versions) """
-        self.write_clipboard(
-            """select b.name as "Current Name", a.id as "Flow ID", b.version as "Current Version", b.created_at as "Last Modified", c.created_at as "Original Create Date" from (select id, min(version) as min_version, max(version) as max_version from versioned_flows group by id) a left join versioned_flows b on a.id = b.id and a.max_version = b.version left join versioned_flows c on a.id = c.id and a.min_version = c.version order by "Current Name";"""
-        )
+        self.write_clipboard(self.query_summarize_latest_flows)
 
     def db_postgres_summarize_latest_flows_lite(self):
         """ Summarize Flows (Lite) """
-        self.write_clipboard(
-            """select b.name, a.id, a.max_version from (select id, min(version) as min_version, max(version) as max_version from versioned_flows group by id) a left join versioned_flows b on a.id = b.id and a.max_version = b.version;"""
-        )
+        self.write_clipboard(self.query_summarize_latest_flows_lite)
 
     def db_postgres_users_pending_password_reset(self):
         """ List users with pending password reset """
-        self.write_clipboard(
-            r"""select username, failed_attempts, ROUND(EXTRACT(epoch FROM current_date - password_modified_at)/3600/24) as days_pending from users where password_needs_reset = true;"""
-        )
+        self.write_clipboard(self.query_users_pending_password_reset)
+
+    # Run queries directly (via a psql session) instead of copying them
+
+    def _open_psql_session(self):
+        return PsqlSession(psql_command=self.config.main.db_psql_command, ssh_host=self.config.main.db_ssh_host)
+
+    def _run_postgres_queries_to_csv(self, queries: dict):
+        """
+        Run one or more queries over a single psql session, streaming each result to a CSV file, then open the files
+
+        :param queries: dict of {file name prefix: query}
+        """
+        csv_files = []
+        try:
+            with self._open_psql_session() as db:
+                for name, query in queries.items():
+                    csv_file = Reusable.generate_temp_file_path("csv", prefix=f"db_{name}")
+                    row_count = db.query_to_csv(query, csv_file)
+                    log.debug(f"{name}: {row_count} rows written to {csv_file}")
+                    csv_files.append(csv_file)
+        except RuntimeError as err:
+            self.display_notification_error(str(err))
+        for csv_file in csv_files:
+            _ = subprocess.run(["open", csv_file], capture_output=True, universal_newlines=True)
+
+    def db_postgres_descriptors_and_docker_images_run(self):
+        self._run_postgres_queries_to_csv({"descriptors": self.query_descriptors_and_docker_images})
+
+    def db_postgres_instances_and_docker_images_run(self):
+        self._run_postgres_queries_to_csv({"instances": self._build_query_instances_and_docker_images(extended=True)})
+
+    def db_postgres_instances_and_docker_images_exclude_image_run(self):
+        self._run_postgres_queries_to_csv({"instances": self._build_query_instances_and_docker_images(extended=True, exclude=True)})
+
+    def db_postgres_currently_running_streams_run(self):
+        self._run_postgres_queries_to_csv({"executing_batches": self.query_currently_running_streams})
+
+    def db_postgres_summarize_latest_flows_run(self):
+        self._run_postgres_queries_to_csv({"flows": self.query_summarize_latest_flows})
+
+    def db_postgres_users_pending_password_reset_run(self):
+        self._run_postgres_queries_to_csv({"users_pending_reset": self.query_users_pending_password_reset})
+
+    def _db_postgres_benchmark_queries(self, seed=True):
+        """
+        Compare the legacy and optimized versions of the integration instance and flow summary
+        queries with EXPLAIN (ANALYZE, BUFFERS), and copy a report to the clipboard
+        """
+        image = "lhub-managed-integrations.logichub.integration1:1.1"
+        variants = {
+            "instances": (self._build_query_instances_and_docker_images_legacy(), self._build_query_instances_and_docker_images()),
+            "instances (extended)": (self._build_query_instances_and_docker_images_legacy(extended=True), self._build_query_instances_and_docker_images(extended=True)),
+            "instances (exclude image)": (
+                self._build_query_instances_and_docker_images_legacy(extended=True, exclude=True, docker_image=image),
+                self._build_query_instances_and_docker_images(extended=True, exclude=True, docker_image=image)),
+            "flows summary": (self.query_summarize_latest_flows_legacy, self.query_summarize_latest_flows),
+            "flows summary (lite)": (self.query_summarize_latest_flows_lite_legacy, self.query_summarize_latest_flows_lite),
+        }
+        try:
+            with self._open_psql_session() as db:
+                benchmark = QueryBenchmark(db)
+                if seed:
+                    benchmark.seed()
+                report = benchmark.report(benchmark.compare(variants))
+        except RuntimeError as err:
+            self.display_notification_error(str(err))
+        self.write_clipboard(f"{'Seeded temp tables' if seed else 'Live tables'}, median of {benchmark.runs} runs:\n\n{report}")
+
+    def db_postgres_benchmark_queries_seeded(self):
+        self._db_postgres_benchmark_queries(seed=True)
+
+    def db_postgres_benchmark_queries_live(self):
+        self._db_postgres_benchmark_queries(seed=False)
+
+    def db_postgres_run_clipboard_query_csv(self):
+        """ Run the SQL query in the clipboard and open the results as CSV """
+        self._run_postgres_queries_to_csv({"query": self.read_clipboard()})
+
+    def db_postgres_run_clipboard_query_json(self):
+        """ Run the SQL query in the clipboard and copy the results as JSON """
+        try:
+            with self._open_psql_session() as db:
+                results = db.query_to_dicts(self.read_clipboard())
+        except RuntimeError as err:
+            self.display_notification_error(str(err))
+        self.write_clipboard(json.dumps(results, indent=2))
 
     ############################################################################
     # LogicHub -> Integrations
@@ -1528,6 +4086,14 @@ check_recent_user_activity
         """
         self.copy_file_contents_to_clipboard(self.config.dir_supporting_scripts, "upgrade_prep-verify.sh")
 
+    def logichub_upgrade_prep_verifications_python(self):
+        """
+        Upgrade Prep: Visual inspection, single-exec fact collector
+
+        :return:
+        """
+        self.copy_python_script_to_clipboard("upgrade_prep-verify.py")
+
     def logichub_upgrade_prep_backups(self):
         """
         Upgrade Prep: Backups
@@ -1552,6 +4118,30 @@ check_recent_user_activity
         output = output.replace('run_backups "$@"', 'run_backups --no-logs --no-lh-backup')
         self.write_clipboard(output)
 
+    def logichub_upgrade_prep_backups_python(self):
+        """
+        Upgrade Prep: Backups, streaming Python pipeline
+
+        :return:
+        """
+        self.copy_python_script_to_clipboard("upgrade_prep-backups.py")
+
+    def logichub_upgrade_prep_backups_python_lite(self):
+        """
+        Upgrade Prep: Backups Lite, streaming Python pipeline
+
+        :return:
+        """
+        self.copy_python_script_to_clipboard("upgrade_prep-backups.py", "--no-logs --no-lh-backup")
+
+    def logichub_upgrade_prep_backups_python_store(self):
+        """
+        Upgrade Prep: Backups, deduplicated store (incremental)
+
+        :return:
+        """
+        self.copy_python_script_to_clipboard("upgrade_prep-backups.py", "--store")
+
     def logichub_upgrade_command_from_clipboard(self):
         """
         Upgrade Command (from milestone version in clipboard)
@@ -1602,47 +4192,96 @@ check_recent_user_activity
                     if self.config.menu_networking.configs[_var].get("type") == "ssh":
                         self.ssh_tunnel_configs.append((self.config.menu_networking.configs[_var].get("name", _var), f"ssh_tunnel_custom_{_var}"))
                     elif self.config.menu_networking.configs[_var].get("type") == "redirect":
-                        self.port_redirect_configs.append((self.config.menu_networking.configs[_var].get("name"), f"port_redirect_custom_{_var}"))
+                        self.port_redirect_configs.append((self.config.menu_networking.configs[_var].get("name", _var), f"port_redirect_custom_{_var}"))
+                    elif self.config.menu_networking.configs[_var].get("type") == "group":
+                        self.ssh_tunnel_group_configs.append((self.config.menu_networking.configs[_var].get("name", _var), f"ssh_tunnel_group_{_var}"))
 
     ############################################################################
     # Networking -> Reset
 
-    def do_terminate_tunnels(self, loopback_ip=None, loopback_port=None):
-        """Terminate SSH tunnels"""
+    def _open_tunnel_registry(self):
+        return TunnelRegistry(self.config.plugin_data_path("ssh_tunnels.json"))
 
-        # Get PID for all open SSH tunnels
-        _cmd_result = Reusable.run_cli_command("ps -ef")
-        pid_pattern = re.compile(r"^\s*\d+\s+(\d+)")
-        specific_loopback = (loopback_ip.strip() if loopback_ip else "") + ":"
-        if specific_loopback and loopback_port:
-            specific_loopback += f"{loopback_port}:"
-        tunnel_PIDs = {
-            int(pid_pattern.findall(_line)[0]): _line
-            for _line in _cmd_result.stdout.split('\n')
-            if 'ssh' in _line and '-L' in _line and pid_pattern.match(_line) and specific_loopback in _line
+    @property
+    def loopback(self):
+        """Loopback alias manager, created on first use so interface addresses are read once per run"""
+        if self._loopback is None:
+            self._loopback = LoopbackManager(self.loopback_interface)
+        return self._loopback
+
+    def _ssh_control_master(self, tunnel):
+        os.makedirs(self.config.dir_plugin_data, exist_ok=True)
+        return SshControlMaster(self.config.dir_plugin_data, tunnel["ssh_server"], tunnel.get("ssh_port"), tunnel.get("ssh_options"))
+
+    def _cancel_multiplexed_tunnels(self, registry, tunnels, close_idle_masters=True):
+        """Cancel registered forwards over shared SSH connections, and close any connection with no forwards left"""
+        masters = {}
+        for key, tunnel in tunnels.items():
+            master = self._ssh_control_master(tunnel)
+            print(f"Cancelling {tunnel['local_address']}:{tunnel['local_port']} --> {tunnel['remote_address']}:{tunnel['remote_port']} via {tunnel['ssh_server']} (shared connection)")
+            _ = master.cancel(SshControlMaster.forward_spec(tunnel))
+            registry.remove(key)
+            masters[master.control_path] = master
+        if close_idle_masters:
+            in_use = {t.get("control_path") for t in registry.tunnels.values()}
+            for control_path, master in masters.items():
+                if control_path not in in_use:
+                    print(f"Closing shared SSH connection to {master.destination}")
+                    _ = master.exit()
+
+    def do_terminate_tunnels(self, loopback_ip=None, loopback_port=None, close_idle_masters=True):
+        """Terminate SSH tunnels"""
+        loopback_ip = loopback_ip.strip() if loopback_ip else None
+        registry = self._open_tunnel_registry()
+
+        # Check the registry first; only scan processes if a specific tunnel isn't registered, or if terminating everything
+        found = registry.find(loopback_ip, loopback_port)
+        multiplexed = {key: t for key, t in found.items() if t.get("control_path")}
+        tunnels = {
+            t["pid"]: (f"{t['local_address']}:{t['local_port']}", f"{t['remote_address']}:{t['remote_port']}", t["ssh_server"])
+            for t in found.values() if not t.get("control_path")
         }
+        if not found or not loopback_ip:
+            for pid, parsed in TunnelRegistry.discover(loopback_ip, loopback_port).items():
+                local_address, local_port, remote_address, remote_port = parsed["forwards"][0]
+                tunnels[pid] = (f"{local_address}:{local_port}", f"{remote_address}:{remote_port}", parsed["ssh_server"])
 
-        # Check for an existing SSH tunnel. If none is found, abort, otherwise kill each process found.
-        if not tunnel_PIDs:
+        # Check for an existing SSH tunnel. If none is found, abort, otherwise kill all processes found at once.
+        if not tunnels and not multiplexed:
             print("No existing SSH tunnels found")
             self.display_notification("No existing SSH tunnels found")
         else:
-            # Validate sudo session
-            Reusable.do_prompt_for_sudo()
-            for PID in tunnel_PIDs:
-                tunnel = tunnel_PIDs[PID]
-                local_host_info, remote_host_info = re.findall(r"[^\s:]+:\d+(?=:|\s)", tunnel)[0:2]
-                _tmp_ssh_server = re.findall(r'-f +(\S+)', tunnel)[0]
-                print(f"Killing {local_host_info} --> {remote_host_info} via {_tmp_ssh_server} (PID {PID})")
-                _ = Reusable.run_cli_command(f'sudo kill -9 {PID}')
+            if multiplexed:
+                self._cancel_multiplexed_tunnels(registry, multiplexed, close_idle_masters)
+            if tunnels:
+                for pid, (local_host_info, remote_host_info, ssh_server) in tunnels.items():
+                    print(f"Killing {local_host_info} --> {remote_host_info} via {ssh_server} (PID {pid})")
+                TunnelRegistry.terminate(tunnels.keys())
+                for key, tunnel in list(registry.tunnels.items()):
+                    if tunnel.get("pid") in tunnels:
+                        registry.remove(key)
             self.display_notification("Tunnels terminated")
 
+        if not loopback_ip and close_idle_masters:
+            # Also close shared connections which are no longer in the registry
+            for control_path in Path(self.config.dir_plugin_data).glob("cm-*.sock"):
+                _ = SshControlMaster(self.config.dir_plugin_data, "localhost", control_path=str(control_path)).exit()
+        registry.save()
+
     def action_terminate_tunnels(self):
         self.do_terminate_tunnels()
 
+    def _open_port_redirects(self):
+        return PortRedirectAnchor(self.config.plugin_data_path("pf_redirects.json"))
+
     def do_terminate_port_redirection(self):
         print("Resetting port forwarding/redirection...")
-        Reusable.run_cli_command('sudo pfctl -f /etc/pf.conf')
+        for lock_file in Path(self.config.dir_plugin_data).glob("forward_*.pid"):
+            self.do_stop_userspace_forward(re.sub(r"^forward_|\.pid$", "", lock_file.name))
+        try:
+            self._open_port_redirects().flush()
+        except RuntimeError as err:
+            self.display_notification_error(str(err), print_stderr=True)
         output_msg = "Port redirection terminated"
         print(output_msg)
         self.display_notification(output_msg)
@@ -1651,33 +4290,18 @@ check_recent_user_activity
         Reusable.do_prompt_for_sudo()
         self.do_terminate_port_redirection()
 
-    # ToDo Finish this or find an alternate way of helping with managing loopback aliases
-    # Don't enable the following until this script is updated to take startup scripts into account
     def do_terminate_loopback_aliases(self):
-        """
-        from the old bash version:
-            echo
-            # When ready, add the following action to the bottom section:
-            #echo "Terminate Loopback Aliases | bash='$0' param1=action_terminate_loopback_aliases terminal=true"
-            #
-            #    # Validate sudo session
-            #    do_prompt_for_sudo
-            #
-            #    loopback_aliases=$(ifconfig -a | pcregrep -o 'inet \K127(?:\.\d+){3}' | pcregrep -v '127.0.0.1$' | sort -u)
-            #    if [[ -z ${loopback_aliases} ]]; then
-            #        echo "No loopback aliases found"
-            #    else
-            #        for loopback_alias in ${loopback_aliases}; do
-            #            echo "Deleting loopback IP ${loopback_alias}"
-            #            sudo ifconfig ${loopback_interface} ${loopback_alias} delete
-            #        done
-            #        display_notification "Loopback aliases terminated"
-            #    fi
-        """
-        print("Feature not yet enabled")
-        pass
+        """Delete all loopback aliases other than 127.0.0.1, in a single privileged call"""
+        _, stale = self.loopback.plan(keep=["127.0.0.1"])
+        if not stale:
+            print("No loopback aliases found")
+            self.display_notification("No loopback aliases found")
+            return
+        for loopback_alias in stale:
+            print(f"Deleting loopback IP {loopback_alias}")
+        self.loopback.apply(remove=stale)
+        self.display_notification("Loopback aliases terminated")
 
-    # ToDo Add an action for this function once it's operational
     def action_terminate_loopback_aliases(self):
         self.do_terminate_loopback_aliases()
 
@@ -1700,77 +4324,203 @@ check_recent_user_activity
     ############################################################################
     # Networking -> Port Redirects
 
-    def do_execute_port_redirect(self, source_address, source_port, target_address, target_port):
-        self.do_verify_loopback_address(source_address)
-        log.debug(f"Making alias to redirect {source_address}:{source_port} --> {target_address}:{target_port}")
+    def do_execute_port_redirect(self, redirects):
+        """
+        Add port redirects to the plugin's pf anchor, and load it with a single pfctl call however many are added
 
-        _command = f'echo "rdr pass inet proto tcp from any to {source_address} port {source_port} -> {target_address} port {target_port}" | sudo -p "sudo password: " pfctl -ef -'
-        print()
-        _ = Reusable.run_shell_command_with_pipes(_command)
-        result = f"Port Redirection Enabled:\n\n{source_address}:{source_port} --> {target_address}:{target_port}"
+        :param redirects: dict of {config name: (source_address, source_port, target_address, target_port)}
+        """
+        self.do_verify_loopback_address([r[0] for r in redirects.values()])
+        anchor = self._open_port_redirects()
+        for config_name, (source_address, source_port, target_address, target_port) in redirects.items():
+            log.debug(f"Making alias to redirect {source_address}:{source_port} --> {target_address}:{target_port}")
+            anchor.add(config_name, source_address, source_port, target_address, target_port)
+        try:
+            anchor.load()
+        except RuntimeError as err:
+            self.display_notification_error(str(err), print_stderr=True)
+        result = "Port Redirection Enabled:\n\n" + "\n".join(
+            f"{source_address}:{source_port} --> {target_address}:{target_port}"
+            for source_address, source_port, target_address, target_port in redirects.values())
         print(f"\n{result}\n")
         self.display_notification(result)
 
-    def port_redirect_custom(self):
+    def _get_port_redirect_config(self, config_name):
         def get_var(var_name):
             var = (config_dict.get(var_name) or "").strip()
             if not var:
-                self.display_notification_error(f"variable {var_name} not found in redirect config", print_stderr=True)
+                self.display_notification_error(f"variable {var_name} not found in redirect config [{config_name}]", print_stderr=True)
             return var
 
-        # """ Custom port redirection based on entries in logichub_tools.ini """
-        config_name = re.sub('^port_redirect_custom_', '', sys.argv[1])
         config_dict = self.config.menu_networking.configs.get(config_name)
         if not config_dict:
             self.display_notification_error(f"Port redirect config [{config_name}] not found", print_stderr=True)
+        return config_dict, (get_var('source_address'), get_var('source_port'), get_var('target_address'), get_var('target_port'))
 
-        source_address = get_var('source_address')
-        source_port = get_var('source_port')
-        target_address = get_var('target_address')
-        target_port = get_var('target_port')
-        optional_exit_message = config_dict.get("optional_exit_message")
+    ############################################################################
+    # Networking -> Port Redirects (userspace)
 
-        Reusable.do_prompt_for_sudo()
-        print(f"\nSetting up redirection for config \"{config_dict['name']}\"...\n")
+    @staticmethod
+    def _is_userspace_redirect(config_dict):
+        return (config_dict.get("mode") or "pf").strip().lower() == "userspace"
+
+    def _userspace_forward_status(self, config_name):
+        """Stats of a running userspace forwarder, or None if it isn't running"""
+        lock = Reusable.read_json_file(self.config.plugin_data_path(f"forward_{config_name}.pid"))
+        if not lock or not self._is_background_action_process(lock.get("pid", 0), f"_userspace_forward_{config_name}"):
+            return None
+        return Reusable.read_json_file(self.config.plugin_data_path(f"forward_{config_name}.json"), default={}) or {}
+
+    def do_start_userspace_forward(self, config_name, redirect, wait=3):
+        """Start a userspace forwarder for a redirect config as a detached background process"""
+        source_address, source_port, target_address, target_port = redirect
+        # Only macOS needs aliases; on Linux all of 127.0.0.0/8 is already local
+        if sys.platform == "darwin":
+            self.do_verify_loopback_address(source_address)
+        if self._userspace_forward_status(config_name) is not None:
+            print(f"Userspace forward for {config_name} is already running")
+            return True
+        stats_file = self.config.plugin_data_path(f"forward_{config_name}.json")
+        if os.path.exists(stats_file):
+            os.remove(stats_file)
+        self.spawn_background_action(f"_userspace_forward_{config_name}", lock_name=f"forward_{config_name}")
+
+        # Wait for the forwarder to report that it's listening (or why it couldn't)
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            stats = Reusable.read_json_file(stats_file)
+            if stats:
+                if stats.get("error"):
+                    print(f"Userspace forward for {config_name} failed: {stats['error']}")
+                    return False
+                print(f"Userspace forward listening: {stats['listen']} --> {stats['target']} (PID {stats['pid']})")
+                return True
+            time.sleep(0.1)
+        print(f"Userspace forward for {config_name} did not report in time; check {stats_file}")
+        return False
+
+    def do_stop_userspace_forward(self, config_name):
+        lock_file = self.config.plugin_data_path(f"forward_{config_name}.pid")
+        lock = Reusable.read_json_file(lock_file)
+        # Only signal the PID if it is still the forwarder for this config (PIDs are reused once a process exits)
+        if lock and self._is_background_action_process(lock.get("pid", 0), f"_userspace_forward_{config_name}"):
+            print(f"Stopping userspace forward {config_name} (PID {lock['pid']})")
+            os.kill(lock["pid"], signal.SIGTERM)
+        if os.path.exists(lock_file):
+            os.remove(lock_file)
+
+    def background_userspace_forward(self, config_name):
+        _, (source_address, source_port, target_address, target_port) = self._get_port_redirect_config(config_name)
+        forwarder = UserspaceForwarder(
+            source_address, source_port, target_address, target_port,
+            stats_file=self.config.plugin_data_path(f"forward_{config_name}.json"))
+        forwarder.run_forever()
+
+    def port_redirect_benchmark_userspace(self):
+        """ Benchmark the userspace forwarder against a local echo server """
+        print("Benchmarking userspace forwarder against a local echo server...\n")
+        benchmark = ForwarderBenchmark()
+        print(benchmark.report(benchmark.run()))
+
+    ############################################################################
+    # Networking -> Port Redirects (custom)
+
+    def port_redirect_custom(self):
+        # """ Custom port redirection based on entries in logichub_tools.ini """
+        config_name = re.sub('^port_redirect_custom_', '', sys.argv[1])
+        config_dict, redirect = self._get_port_redirect_config(config_name)
+        optional_exit_message = config_dict.get("optional_exit_message")
 
-        self.do_execute_port_redirect(source_address, source_port, target_address, target_port)
+        if self._is_userspace_redirect(config_dict):
+            print(f"\nSetting up userspace redirection for config \"{config_dict.get('name', config_name)}\"...\n")
+            if not self.do_start_userspace_forward(config_name, redirect):
+                self.display_notification_error(f"Userspace forward for {config_name} failed to start")
+        else:
+            Reusable.do_prompt_for_sudo()
+            print(f"\nSetting up redirection for config \"{config_dict.get('name', config_name)}\"...\n")
+            self.do_execute_port_redirect({config_name: redirect})
 
         print("Done. You may close the terminal.\n")
         if optional_exit_message:
             print(optional_exit_message.replace("\\n", "\n").replace("\\t", "\t"))
 
+    def port_redirect_all(self):
+        """ Enable every custom port redirect from logichub_tools.ini at once """
+        redirects, userspace_redirects = {}, {}
+        for _config in self.port_redirect_configs:
+            config_name = re.sub('^port_redirect_custom_', '', _config[1])
+            config_dict, redirect = self._get_port_redirect_config(config_name)
+            if self._is_userspace_redirect(config_dict):
+                userspace_redirects[config_name] = redirect
+            else:
+                redirects[config_name] = redirect
+        print(f"\nSetting up {len(redirects) + len(userspace_redirects)} redirects...\n")
+        if redirects:
+            Reusable.do_prompt_for_sudo()
+            self.do_execute_port_redirect(redirects)
+        for config_name, redirect in userspace_redirects.items():
+            self.do_start_userspace_forward(config_name, redirect)
+        print("Done. You may close the terminal.\n")
+
+    def port_redirect_remove(self):
+        """ Remove a single custom port redirect, leaving any others in place """
+        config_name = re.sub('^port_redirect_remove_', '', sys.argv[1])
+        if self._userspace_forward_status(config_name) is not None:
+            self.do_stop_userspace_forward(config_name)
+            self.display_notification(f"Port redirect {config_name} removed")
+            return
+        anchor = self._open_port_redirects()
+        if not anchor.remove(config_name):
+            self.display_notification_error(f"Port redirect [{config_name}] is not active", print_stderr=True)
+        try:
+            anchor.load()
+        except RuntimeError as err:
+            self.display_notification_error(str(err), print_stderr=True)
+        self.display_notification(f"Port redirect {config_name} removed")
+
     ############################################################################
     # Networking -> SSH Tunnels
 
-    def do_verify_loopback_address(self, loopback_ip, allow_all_loopback_ips=False):
-        assert loopback_ip, "No loopback address provided"
-        assert re.match(r"^127\..*", loopback_ip), f"Invalid loopback address ({loopback_ip})"
-        if not allow_all_loopback_ips:
-            assert loopback_ip != "127.0.0.1", "Custom loopback IP is required. As a precaution, this script requires a loopback IP other than 127.0.0.1"
+    @staticmethod
+    def _validate_loopback_addresses(loopback_ip, allow_all_loopback_ips=False):
+        """
+        :param loopback_ip: loopback address, or list of addresses
+        :return: list of trimmed addresses; raises AssertionError if any of them is not a usable loopback address
+        """
+        loopback_ips = [loopback_ip] if isinstance(loopback_ip, str) or not loopback_ip else list(loopback_ip)
+        for loopback_ip in loopback_ips:
+            assert loopback_ip, "No loopback address provided"
+            assert re.match(r"^127\..*", loopback_ip), f"Invalid loopback address ({loopback_ip})"
+            if not allow_all_loopback_ips:
+                assert loopback_ip != "127.0.0.1", "Custom loopback IP is required. As a precaution, this script requires a loopback IP other than 127.0.0.1"
 
         # Trim input, just in case
-        loopback_ip = loopback_ip.strip()
-        interfaces_output = Reusable.run_cli_command("ifconfig -a")
+        return [loopback_ip.strip() for loopback_ip in loopback_ips]
+
+    def do_verify_loopback_address(self, loopback_ip, allow_all_loopback_ips=False):
+        """
+        :param loopback_ip: loopback address, or list of addresses (any which are missing are created in one batch)
+        """
+        loopback_ips = self._validate_loopback_addresses(loopback_ip, allow_all_loopback_ips)
 
-        # Make sure loopback alias exists; create if needed.
-        if re.findall(rf"\b{loopback_ip}\b", interfaces_output.stdout):
-            log.debug(f"Existing loopback alias {loopback_ip} found")
+        # Make sure loopback aliases exist; create if needed.
+        created = self.loopback.ensure(loopback_ips)
+        if created:
+            log.debug(f"Loopback aliases not found; created {', '.join(created)}")
         else:
-            log.debug(f"Loopback alias {loopback_ip} not found; creating")
-            # Validate sudo session
-            Reusable.do_prompt_for_sudo()
-            _ = Reusable.run_cli_command(f"sudo ifconfig {self.loopback_interface} alias ${loopback_ip}")
+            log.debug(f"Existing loopback aliases found: {', '.join(loopback_ips)}")
 
     def do_verify_ssh_tunnel_available(self, loopback_ip, loopback_port):
         print(f"Checking for existing tunnels {loopback_ip}:{loopback_port}...")
-        self.do_terminate_tunnels(loopback_ip, loopback_port)
+        # Shared connections are kept open, since a new tunnel is about to be added
+        self.do_terminate_tunnels(loopback_ip, loopback_port, close_idle_masters=False)
 
-    def do_execute_ssh_tunnel(self, config_dict):
+    def _build_ssh_tunnel(self, config_dict):
         """
-        Execute an SSH tunnel based on a custom tunnel config from logichub_tools.ini
+        Validate a custom tunnel config from logichub_tools.ini and build its SSH command
 
         :param config_dict: dict containing SSH tunnel parameters
-        :return:
+        :return: dict of tunnel parameters, including the SSH command to run
         """
         ssh_config_name = config_dict.get("name")
         remote_address = config_dict.get("remote_ip")
@@ -1800,12 +4550,6 @@ check_recent_user_activity
         assert ssh_server_port != 22 or not re.match(r'^127\..*', ssh_server_address), \
             "Error: SSH server is a loopback IP, and the port is left at 22. This will create a tunnel to your own machine and won't work!"
 
-        # Sanitize loopback address input, and verify that the address actually exists
-        self.do_verify_loopback_address(local_address)
-
-        # Kill existing tunnel if one is up already
-        self.do_verify_ssh_tunnel_available(local_address, local_port)
-
         # Set default options (which includes skipping known_hosts)
         default_ssh_options = f"-i {ssh_key} -o StrictHostKeyChecking=no"
 
@@ -1817,16 +4561,59 @@ check_recent_user_activity
             # If options were provided but no key was included, append the SSH key to use
             ssh_options = f"-i {ssh_key} {ssh_options}"
 
+        return dict(
+            config_name=ssh_config_name, local_address=local_address.strip(), local_port=str(local_port),
+            remote_address=remote_address, remote_port=str(remote_port), ssh_server=f"{ssh_user}@{ssh_server_address}",
+            ssh_port=str(ssh_server_port), ssh_options=ssh_options, privileged=int(local_port) <= 1023,
+            command=f"ssh {ssh_options} -Y -L {local_address}:{local_port}:{remote_address}:{remote_port} -N -f {ssh_user}@{ssh_server_address} -p {ssh_server_port}"
+        )
+
+    def do_execute_ssh_tunnel(self, config_dict):
+        """
+        Execute an SSH tunnel based on a custom tunnel config from logichub_tools.ini
+
+        :param config_dict: dict containing SSH tunnel parameters
+        :return:
+        """
+        tunnel = self._build_ssh_tunnel(config_dict)
+        local_address, local_port = tunnel["local_address"], tunnel["local_port"]
+
+        # Sanitize loopback address input, and verify that the address actually exists
+        self.do_verify_loopback_address(local_address)
+
+        # Kill existing tunnel if one is up already
+        self.do_verify_ssh_tunnel_available(local_address, local_port)
+
         # Initiate reverse SSH tunnel
-        print(f"Redirecting for {ssh_config_name}\n")
+        print(f"Redirecting for {tunnel['config_name']}\n")
         print(f"From Local:\n\t{local_address}:{local_port}\n")
-        print(f"To Remote:\n\t{remote_address}:{remote_port}\n\n")
+        print(f"To Remote:\n\t{tunnel['remote_address']}:{tunnel['remote_port']}\n\n")
+
+        # Unprivileged ports go over a shared connection to the SSH server (opened by the first tunnel which needs it)
+        if self.config.main.ssh_control_master and not tunnel["privileged"]:
+            master = self._ssh_control_master(tunnel)
+            master_pid = master.check()
+            if master_pid:
+                print(f"Reusing shared SSH connection to {tunnel['ssh_server']} (PID {master_pid})\n")
+            else:
+                print(f"Opening shared SSH connection to {tunnel['ssh_server']}\n")
+                master_pid, error = master.start(interactive=True)
+                if not master_pid:
+                    self.display_notification_error(f"Unable to connect to {tunnel['ssh_server']}: {error}", print_stderr=True)
+            success, message = master.forward(SshControlMaster.forward_spec(tunnel))
+            if not success:
+                self.display_notification_error(f"Unable to add tunnel: {message}", print_stderr=True)
+            registry = self._open_tunnel_registry()
+            registry.add_tunnel(master_pid, tunnel, control_path=master.control_path)
+            registry.save()
+            print(f"\nSSH tunnel complete\n\n")
+            return
 
         # Define the SSH command
         #   * must use sudo in case the local port is below 1024
-        ssh_command = f"ssh {ssh_options} -Y -L {local_address}:{local_port}:{remote_address}:{remote_port} -N -f {ssh_user}@{ssh_server_address} -p {ssh_server_port}"
+        ssh_command = tunnel["command"]
 
-        if int(local_port) <= 1023:
+        if tunnel["privileged"]:
             # Validate sudo session
             Reusable.do_prompt_for_sudo()
             ssh_command = f"sudo {ssh_command}"
@@ -1837,6 +4624,12 @@ check_recent_user_activity
         # Bash version for reference: eval "${ssh_command}"
         _ = Reusable.run_cli_command(ssh_command, capture_output=False, timeout=60)
 
+        # ssh forks into the background (-f), so look up the PID of the tunnel process which is left running
+        registry = self._open_tunnel_registry()
+        tunnel_pids = list(TunnelRegistry.discover(local_address, local_port))
+        registry.add_tunnel(tunnel_pids[0] if tunnel_pids else None, tunnel)
+        registry.save()
+
         print(f"\nSSH tunnel complete\n\n")
 
     def ssh_tunnel_custom(self):
@@ -1847,6 +4640,163 @@ check_recent_user_activity
         tunnel_config = self.config.menu_networking.configs[config_name]
         self.do_execute_ssh_tunnel(tunnel_config)
 
+    @staticmethod
+    def _start_ssh_tunnel_process(tunnel, timeout=60):
+        """
+        Run the SSH command for one tunnel of a group, without a terminal.
+        ssh -f keeps stdout/stderr open after forking, so stderr goes to a temp file rather than a pipe.
+
+        :return: tuple of (success, message, seconds elapsed)
+        """
+        command = shlex.split(tunnel["command"])
+        # Never prompt (prompts from parallel tunnels would collide), and fail if the port can't be bound
+        command[1:1] = ["-o", "BatchMode=yes", "-o", "ExitOnForwardFailure=yes"]
+        if tunnel["privileged"]:
+            command = ["sudo", "-n"] + command
+        start = time.time()
+        with tempfile.TemporaryFile(mode="w+") as stderr_file:
+            try:
+                result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr_file, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                return False, f"Timed out after {timeout} seconds", time.time() - start
+            stderr_file.seek(0)
+            error = " ".join(_line.strip() for _line in stderr_file if _line.strip() and not _line.startswith("Warning: Permanently added"))
+        if result.returncode != 0:
+            return False, error or f"ssh exited with code {result.returncode}", time.time() - start
+        return True, error, time.time() - start
+
+    @staticmethod
+    def _start_multiplexed_tunnel(tunnel, master, master_lock):
+        """
+        Add one tunnel of a group over a shared SSH connection, opening the connection first if needed.
+        The lock makes tunnels to the same server wait for a single connection rather than each opening one.
+
+        :return: tuple of (success, message, seconds elapsed)
+        """
+        start = time.time()
+        with master_lock:
+            if not master.check():
+                master_pid, error = master.start()
+                if not master_pid:
+                    return False, error, time.time() - start
+        success, message = master.forward(SshControlMaster.forward_spec(tunnel))
+        return success, "" if success else message, time.time() - start
+
+    def do_execute_ssh_tunnel_group(self, group_name, config_names):
+        """
+        Bring up several SSH tunnels concurrently. Loopback aliases, existing tunnels and sudo are
+        all handled once for the whole group, then the SSH commands run in a thread pool.
+        """
+        configs = self.config.menu_networking.configs
+        tunnels, failures = [], {}
+        for config_name in config_names:
+            if not isinstance(configs.get(config_name), dict) or configs[config_name].get("type") != "ssh":
+                failures[config_name] = "SSH tunnel config not found"
+                continue
+            try:
+                tunnel = self._build_ssh_tunnel(dict(configs[config_name], name=configs[config_name].get("name", config_name)))
+                # Same checks as a single tunnel gets, before any alias is planned for this address
+                self._validate_loopback_addresses(tunnel["local_address"])
+                tunnels.append(tunnel)
+            except (AssertionError, ValueError) as err:
+                failures[config_name] = str(err)
+
+        # Loopback aliases for the whole group
+        missing_aliases, _ = self.loopback.plan({t["local_address"] for t in tunnels})
+
+        # Existing tunnels on any of the group's endpoints: one process scan, plus forwards over shared connections
+        registry = self._open_tunnel_registry()
+        endpoints = {(t["local_address"], t["local_port"]) for t in tunnels}
+        existing_pids = {
+            pid for pid, parsed in TunnelRegistry.discover().items()
+            if any((f[0], f[1]) in endpoints for f in parsed["forwards"])
+        }
+        existing_multiplexed = {
+            key: t for key, t in registry.find().items()
+            if t.get("control_path") and (t["local_address"], t["local_port"]) in endpoints
+        }
+        if existing_multiplexed:
+            self._cancel_multiplexed_tunnels(registry, existing_multiplexed, close_idle_masters=False)
+
+        # A single sudo prompt covers everything which needs it
+        if missing_aliases or existing_pids or any(t["privileged"] for t in tunnels):
+            Reusable.do_prompt_for_sudo()
+        if missing_aliases:
+            print(f"Creating loopback aliases: {', '.join(missing_aliases)}")
+            self.loopback.apply(add=missing_aliases)
+        if existing_pids:
+            print(f"Terminating {len(existing_pids)} existing tunnel(s) on the same local ports")
+            TunnelRegistry.terminate(existing_pids)
+
+        # Unprivileged ports go over one shared connection per SSH server
+        masters = {}
+        if self.config.main.ssh_control_master:
+            for t in tunnels:
+                if not t["privileged"]:
+                    masters[t["config_name"]] = self._ssh_control_master(t)
+        master_locks = {m.control_path: threading.Lock() for m in masters.values()}
+
+        def start_tunnel(t):
+            master = masters.get(t["config_name"])
+            if master:
+                return self._start_multiplexed_tunnel(t, master, master_locks[master.control_path])
+            return self._start_ssh_tunnel_process(t)
+
+        print(f"\nStarting {len(tunnels)} tunnel(s) for group \"{group_name}\"...\n")
+        results = {}
+        if tunnels:
+            with ThreadPoolExecutor(max_workers=min(len(tunnels), 16)) as executor:
+                futures = {executor.submit(start_tunnel, t): t["config_name"] for t in tunnels}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    success, message, elapsed = results[futures[future]]
+                    print(f"    {'OK' if success else 'FAILED'}: {futures[future]} ({elapsed:.1f}s)")
+
+        # Register the tunnels which came up: one process scan to find all of their PIDs
+        running = {}
+        for pid, parsed in TunnelRegistry.discover().items():
+            for f in parsed["forwards"]:
+                running[(f[0], f[1])] = pid
+        master_pids = {m.control_path: m.check() for m in masters.values()}
+        for t in tunnels:
+            if not results.get(t["config_name"], (False,))[0]:
+                continue
+            master = masters.get(t["config_name"])
+            if master:
+                registry.add_tunnel(master_pids[master.control_path], t, control_path=master.control_path)
+            else:
+                registry.add_tunnel(running.get((t["local_address"], t["local_port"])), t)
+        registry.save()
+
+        # Summary
+        print(f"\n{'Tunnel':<30} {'Local':<22} {'Remote':<28} Result")
+        for t in tunnels:
+            success, message, elapsed = results[t["config_name"]]
+            status = f"OK ({elapsed:.1f}s)" if success else f"FAILED: {message}"
+            print(f"{t['config_name']:<30} {t['local_address'] + ':' + t['local_port']:<22} {t['remote_address'] + ':' + t['remote_port']:<28} {status}")
+        for config_name, message in failures.items():
+            print(f"{config_name:<30} {'':<22} {'':<28} FAILED: {message}")
+
+        failed_count = len(failures) + sum(1 for r in results.values() if not r[0])
+        if failed_count:
+            self.display_notification(f"{len(config_names) - failed_count} of {len(config_names)} tunnels started; {failed_count} failed")
+        else:
+            self.display_notification(f"All {len(config_names)} tunnels started")
+
+    def ssh_tunnel_group(self):
+        """ Bring up a group of custom SSH tunnels (type = group in logichub_tools.ini) concurrently """
+        group_name = re.sub('^ssh_tunnel_group_', '', sys.argv[1])
+        group_config = self.config.menu_networking.configs.get(group_name)
+        if not group_config:
+            self.display_notification_error(f"SSH tunnel group [{group_name}] not found", print_stderr=True)
+        config_names = group_config.get("tunnels") or []
+        if isinstance(config_names, str):
+            config_names = [config_names]
+        config_names = [c.strip() for c in config_names if c.strip()]
+        if not config_names:
+            self.display_notification_error(f"SSH tunnel group [{group_name}] has no tunnels", print_stderr=True)
+        self.do_execute_ssh_tunnel_group(group_config.get("name", group_name), config_names)
+
     ############################################################################
     # Section:
     #   TECH
@@ -2039,19 +4989,105 @@ check_recent_user_activity
         html_file = self._clipboard_to_temp_file(file_ext="html")
         _ = subprocess.run(["open", html_file])
 
+    def _browser_pool_client(self, wait=30):
+        """
+        Client for the warm browser pool, which is started in the background if it isn't already running.
+        If the pool fails to start (e.g. Chrome or chromedriver is broken), it isn't tried again until a backoff
+        has passed (5 minutes, doubling up to an hour), so screenshots go straight to a new browser meanwhile.
+        """
+        client = BrowserPoolClient(self.config.plugin_data_path("browser_pool.sock"))
+        if client.available():
+            return client
+        failure_file = self.config.plugin_data_path("browser_pool_failure.json")
+        failure = Reusable.read_json_file(failure_file, default={}) or {}
+        if time.time() < failure.get("retry_at", 0):
+            log.debug(f"Browser pool skipped until {datetime.fromtimestamp(failure['retry_at'])}: {failure.get('error')}")
+            return None
+        self.spawn_background_action("_browser_pool", lock_name="browser_pool")
+        lock = Reusable.read_json_file(self.config.plugin_data_path("browser_pool.pid"), default={}) or {}
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            if client.available():
+                if os.path.exists(failure_file):
+                    os.remove(failure_file)
+                return client
+            if not self._is_background_action_process(lock.get("pid", 0), "_browser_pool"):
+                # The pool exited without ever listening
+                break
+            time.sleep(0.2)
+        failure = Reusable.read_json_file(failure_file, default={}) or failure
+        attempts = failure.get("attempts", 0) + 1
+        Reusable.write_json_file(failure_file, {
+            "attempts": attempts,
+            "error": failure.get("error") or "Browser pool did not start in time",
+            "retry_at": time.time() + min(300 * 2 ** (attempts - 1), 3600),
+        })
+        return None
+
+    def background_browser_pool(self):
+        try:
+            BrowserPoolServer(
+                self.config.plugin_data_path("browser_pool.sock"),
+                idle_timeout=self.config.main.browser_pool_idle_timeout,
+                page_load_timeout=self.config.main.screenshot_batch_timeout,
+            ).serve()
+        except Exception as err:
+            # Reported by _browser_pool_client, which backs off before starting the pool again
+            failure_file = self.config.plugin_data_path("browser_pool_failure.json")
+            failure = Reusable.read_json_file(failure_file, default={}) or {}
+            Reusable.write_json_file(failure_file, dict(failure, error=f"{type(err).__name__}: {err}"))
+            raise
+
+    def do_generate_screenshot(self, url, save_path=None, window_size=None):
+        """Screenshot a URL with the warm browser pool if enabled, otherwise (or if the pool fails) with a new browser"""
+        if not save_path:
+            save_path = Reusable.generate_temp_file_path("png", prefix="screenshot")
+        elif os.path.isdir(save_path):
+            save_path = os.path.join(save_path, Reusable.generate_temp_file_path("png", prefix="screenshot", name_only=True))
+        if self.config.main.browser_pool_enabled:
+            client = self._browser_pool_client()
+            if client:
+                try:
+                    return client.screenshot(url, save_path, window_size)
+                except (OSError, RuntimeError) as err:
+                    log.debug(f"Browser pool screenshot failed; falling back to a new browser. Error: {err}")
+        chrome = Browser(window_size=window_size.replace("x", ",") if window_size else None)
+        try:
+            return chrome.generate_screenshot_file(url=url, save_path=save_path)
+        finally:
+            chrome.driver.quit()
+
     def action_html_to_screenshot(self, output_path=None, window_size=None):
         """ HTML in clipboard to screenshot """
         html_file = self._clipboard_to_temp_file(file_ext="html")
-        chrome = Browser(download_dir=output_path, window_size=window_size)
         html_file_url = Path(html_file).as_uri()
-        target_path = chrome.generate_screenshot_file(url=html_file_url, save_path=output_path)
-        chrome.driver.quit()
+        target_path = self.do_generate_screenshot(html_file_url, save_path=output_path, window_size=window_size)
         _ = subprocess.run(["open", target_path], capture_output=True, universal_newlines=True)
 
     def action_html_to_screenshot_low_res(self):
         """ HTML in clipboard to screenshot (low res version) """
         self.action_html_to_screenshot(window_size="800x600")
 
+    def action_batch_screenshots(self, full_page=False):
+        """ Screenshot every URL/HTML file listed in the clipboard (or in a list file or folder named there) """
+        urls = BatchScreenshotter.resolve_items(self.read_clipboard())
+        if not urls:
+            self.display_notification_error("No URLs, HTML files or folder found in the clipboard")
+        output_dir = os.path.join(tempfile.gettempdir(), f"screenshots_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')}")
+        batch = BatchScreenshotter(
+            workers=self.config.main.screenshot_batch_workers, timeout=self.config.main.screenshot_batch_timeout, full_page=full_page)
+        print(f"Capturing {len(urls)} screenshots with {min(batch.workers, len(urls))} browsers...\n")
+        start = time.time()
+        results = batch.run(urls, output_dir, progress=lambda r: print(
+            f"    [{r['index']:>3}] {'OK' if r['status'] == 'ok' else 'FAILED'} {r['seconds']:>6.2f}s {r['url']}" + (f"\n          {r['error']}" if r['error'] else "")))
+        failed = sum(1 for r in results if r["status"] != "ok")
+        print(f"\n{len(results) - failed} of {len(results)} captured in {Reusable.format_duration(time.time() - start)}; results and manifest.json in:\n    {output_dir}\n")
+        _ = subprocess.run(["open", output_dir], capture_output=True, universal_newlines=True)
+        self.display_notification(f"{len(results) - failed} of {len(results)} screenshots captured" + (f"; {failed} failed" if failed else ""))
+
+    def action_batch_screenshots_full_page(self):
+        self.action_batch_screenshots(full_page=True)
+
     ############################################################################
     # TECH -> Link Makers
 
@@ -2248,6 +5284,17 @@ check_recent_user_activity
     def execute_bitbar(self, action):
         if not action:
             self.print_bitbar_menu_output()
+            if self.batch_activity and time.time() - self.batch_activity.state.get("updated_at", 0) >= self.config.main.batch_monitor_interval:
+                self.spawn_background_action("_collect_batch_activity", lock_name="batch_activity")
+            if self.tunnel_health and self.ssh_tunnel_configs and \
+                    time.time() - self.tunnel_health.state.get("updated_at", 0) >= self.config.main.tunnel_monitor_interval:
+                self.spawn_background_action("_probe_tunnels", lock_name="tunnel_health")
+            return
+        if action in self.background_actions:
+            self.background_actions[action]()
+            return
+        if action.startswith("_userspace_forward_"):
+            self.background_userspace_forward(re.sub("^_userspace_forward_", "", action))
             return
         if action not in self.action_list:
             raise Exception("Not a valid action")
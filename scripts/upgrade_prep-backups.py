@@ -0,0 +1,993 @@
+#!/usr/bin/env python3
+
+"""
+Upgrade Prep - backups (Python pipeline)
+
+A script designed to work by pasting directly into a terminal (see the
+"LogicHub Upgrades" menu) in addition to running as a script. It takes the same
+due-diligence backups as upgrade_prep-backups.sh, but:
+
+- each service container source is streamed with "docker exec service tar cf -"
+  straight into its own compressed member of the local backup directory, so
+  nothing is compressed twice or staged in temp dirs inside the container
+- all sources (plus the log bundle) are compressed concurrently, each one cut
+  into blocks that a shared process pool compresses in parallel (standard
+  concatenated gzip members, readable by stock gunzip/tar)
+- the DB is dumped alongside them with a parallel directory-format pg_dump,
+  timed per table, and the users/integration summaries are extracted from that
+  same dump instead of being queried separately
+- every stage prints progress and timing, with a summary at the end
+- with --store, the service container sources go into a deduplicated,
+  content-addressed chunk store instead, so repeated runs only add changed
+  content plus a small manifest; --restore rebuilds any snapshot's archives
+
+Requires only the python3 standard library (3.6+).
+"""
+
+import argparse
+import collections
+import contextlib
+import datetime
+import getpass
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+
+CHUNK_SIZE = 1024 * 1024
+BLOCK_SIZE = 4 * 1024 * 1024
+STORE_CHUNK_SIZE = 1024 * 1024
+DEFAULT_STORE = "~/upgrade_backup_store"
+ALLOWED_USERS = ("centos", "logichub", "ubuntu")
+SERVICE_CONTAINER = "service"
+POSTGRES_CONTAINER = "postgres"
+INTEGRATIONS_DIR = "/opt/docker/resources/integrations"
+DB_SUMMARY_TABLES = ("users", "integration_instances", "integration_descriptors")
+# Written by upgrade_prep-verify.py: hash diff of the descriptors against the image's shipped copies
+MANIFEST_CACHE_DIR = "~/.lhub_upgrade_prep/descriptors"
+
+# (member name, directory for "tar -C", entry to archive)
+SERVICE_SOURCES = [
+    ("logichub_backup_data_service", "/opt/docker/data/", "service"),
+    ("logichub_backup_root", "/", "root"),
+    ("logichub_backup_opt_docker_conf", "/opt/docker/", "conf"),
+    ("logichub_backup_opt_docker_resources", "/opt/docker/", "resources"),
+]
+USER_STEPS_SOURCE = ("logichub_backup_opt_docker_custom_modules", "/opt/docker/data/service/", "user-steps")
+
+COLORS = {"red": "31", "blue": "34", "gray": "90"}
+
+
+def print_color(text="", color=None, bold=False, header=False):
+    if header:
+        text = "\n***** {}\n".format(text)
+    if sys.stdout.isatty() and (color or bold):
+        codes = ["1"] if bold else []
+        if color:
+            codes.append(COLORS[color])
+        text = "\033[{}m{}\033[0m".format(";".join(codes), text)
+    print(text, flush=True)
+
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024:
+            return "{:.1f} {}".format(num_bytes, unit) if unit != "B" else "{} B".format(num_bytes)
+        num_bytes /= 1024.0
+    return "{:.1f} TB".format(num_bytes)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return "{:d}m {:04.1f}s".format(int(minutes), seconds) if minutes else "{:.1f}s".format(seconds)
+
+
+def docker_exec(container, *args):
+    """docker exec command without a TTY, so output can be streamed byte-for-byte"""
+    return ["docker", "exec", container] + list(args)
+
+
+def check_output(command):
+    return subprocess.check_output(command, stdin=subprocess.DEVNULL, universal_newlines=True)
+
+
+class StageTimer:
+    """Prints a header per stage and keeps elapsed times for the final summary"""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        print_color(name, color="blue", bold=True, header=True)
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            self.stages.append((name, elapsed))
+            print_color("{} finished in {}".format(name, format_duration(elapsed)), color="gray")
+
+    def skip(self, name):
+        print_color(name, color="blue", bold=True, header=True)
+        print_color("Skip requested...", color="gray")
+
+    def print_summary(self):
+        print_color("Timing", color="blue", bold=True, header=True)
+        width = max([len(name) for name, _ in self.stages] or [0])
+        for name, elapsed in self.stages:
+            print("    {}  {:>10}".format(name.ljust(width), format_duration(elapsed)))
+        print("    {}  {:>10}".format("Total".ljust(width), format_duration(sum(e for _, e in self.stages))))
+
+
+def compress_block(data, compresslevel):
+    return gzip.compress(data, compresslevel)
+
+
+class ParallelGzipWriter:
+    """
+    Block-parallel gzip writer. Input is cut into fixed-size blocks which are
+    compressed independently in a process pool and written in order as
+    concatenated gzip members; gunzip, tar and Python's gzip module all read
+    these as one stream. At most max_pending blocks are in flight per writer.
+    """
+
+    def __init__(self, path, pool, max_pending, compresslevel=6, block_size=BLOCK_SIZE):
+        self._file = open(path, "wb")
+        self._pool = pool
+        self._max_pending = max_pending
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._members = 0
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _submit(self, block):
+        self._pending.append(self._pool.apply_async(compress_block, (block, self.compresslevel)))
+        while len(self._pending) > self._max_pending or self._pending and self._pending[0].ready():
+            self._write_member(self._pending.popleft().get())
+
+    def _write_member(self, member):
+        self._file.write(member)
+        self._members += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._buffer or not self._members and not self._pending:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._pending:
+                self._write_member(self._pending.popleft().get())
+        finally:
+            self._file.close()
+
+
+class Compressor:
+    """Opens gzip outputs, using one shared process pool for all of them unless workers is 0"""
+
+    def __init__(self, compresslevel=6, workers=1, block_size=BLOCK_SIZE):
+        self.compresslevel = compresslevel
+        self.workers = workers
+        self.block_size = block_size
+        self.pool = None
+
+    def __enter__(self):
+        if self.workers > 0:
+            # fork explicitly: the script may be running from stdin, which spawn/forkserver can't re-import
+            self.pool = multiprocessing.get_context("fork").Pool(self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.pool:
+            if exc_type:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def open(self, path):
+        if not self.pool:
+            return gzip.open(path, "wb", compresslevel=self.compresslevel)
+        return ParallelGzipWriter(path, self.pool, self.workers * 2, self.compresslevel, self.block_size)
+
+
+class CountingReader:
+    """Wraps a stream and adds every byte read to a StreamSource's bytes_in"""
+
+    def __init__(self, stream, source):
+        self._stream = stream
+        self._source = source
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._source.bytes_in += len(data)
+        return data
+
+
+class ChunkReader:
+    """File-like view over a list of stored chunks, used to rebuild tar members"""
+
+    def __init__(self, store, digests):
+        self._store = store
+        self._digests = list(digests)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while self._digests and (size < 0 or len(self._buffer) < size):
+            self._buffer += self._store.get(self._digests.pop(0))
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class ChunkStore:
+    """
+    Content-addressed backup store. File contents are split into fixed-size
+    chunks keyed by their sha256 and kept gzip-compressed under
+    chunks/<first 2 hex>/<sha256>, so a chunk is written once no matter how many
+    files or runs contain it. Each run writes one small gzipped JSON manifest to
+    snapshots/, listing every tar entry's metadata and chunk hashes per source.
+    """
+
+    def __init__(self, root, compresslevel=6, chunk_size=STORE_CHUNK_SIZE):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.chunk_dir = os.path.join(self.root, "chunks")
+        self.snapshot_dir = os.path.join(self.root, "snapshots")
+        self.compresslevel = compresslevel
+        self.chunk_size = chunk_size
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._known = set()
+        for entry in os.scandir(self.chunk_dir):
+            if entry.is_dir():
+                self._known.update(os.listdir(entry.path))
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def put(self, data, stats):
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = digest in self._known
+            self._known.add(digest)
+        if known:
+            stats["reused_bytes"] += len(data)
+            return digest
+        path = self.chunk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = gzip.compress(data, self.compresslevel)
+        temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(temp_path, "wb") as f:
+            f.write(compressed)
+        os.rename(temp_path, path)
+        stats["new_chunks"] += 1
+        stats["new_bytes"] += len(data)
+        stats["stored_bytes"] += len(compressed)
+        return digest
+
+    def get(self, digest):
+        with open(self.chunk_path(digest), "rb") as f:
+            data = gzip.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError("Chunk {} is corrupt".format(digest))
+        return data
+
+    def add_tar_stream(self, stream, stats):
+        """Store every entry of an uncompressed tar stream; returns the entries for the manifest"""
+        entries = []
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                entry = {
+                    "name": member.name, "type": member.type.decode(), "mode": member.mode,
+                    "uid": member.uid, "gid": member.gid, "uname": member.uname, "gname": member.gname,
+                    "mtime": member.mtime, "linkname": member.linkname, "size": member.size, "chunks": [],
+                }
+                if member.isreg():
+                    f = tar.extractfile(member)
+                    for data in iter(lambda: f.read(self.chunk_size), b""):
+                        entry["chunks"].append(self.put(data, stats))
+                entries.append(entry)
+        # Drain the end-of-archive padding so the producer never blocks on a full pipe
+        while stream.read(CHUNK_SIZE):
+            pass
+        return entries
+
+    def write_tar(self, entries, fileobj):
+        with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for entry in entries:
+                member = tarfile.TarInfo(entry["name"])
+                member.type = entry["type"].encode()
+                for attr in ("mode", "uid", "gid", "uname", "gname", "mtime", "linkname", "size"):
+                    setattr(member, attr, entry[attr])
+                tar.addfile(member, ChunkReader(self, entry["chunks"]) if member.isreg() else None)
+
+    def save_snapshot(self, name, sources, stats):
+        path = os.path.join(self.snapshot_dir, name + ".json.gz")
+        snapshot = {
+            "name": name, "created": datetime.datetime.now().isoformat(), "hostname": socket.gethostname(),
+            "sources": sources, "stats": dict(stats),
+        }
+        with gzip.open(path, "wt") as f:
+            json.dump(snapshot, f)
+        return path
+
+    def load_snapshot(self, name):
+        path = name if os.path.isfile(name) else os.path.join(self.snapshot_dir, name + ".json.gz")
+        with gzip.open(path, "rt") as f:
+            return json.load(f)
+
+    def snapshots(self):
+        return sorted(f[:-len(".json.gz")] for f in os.listdir(self.snapshot_dir) if f.endswith(".json.gz"))
+
+
+class StreamSource:
+    """Stream one command's stdout into a compressed file, counting bytes as it goes"""
+
+    def __init__(self, name, command, output_path, compressor):
+        self.name = name
+        self.command = command
+        self.output_path = output_path
+        self.destination = output_path
+        self.compressor = compressor
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.elapsed = None
+        self.error = None
+        self.warning = None
+        self._thread = None
+
+    def run(self):
+        start = time.time()
+        try:
+            with tempfile.TemporaryFile() as err:
+                proc = subprocess.Popen(self.command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=err)
+                try:
+                    self.consume(proc.stdout)
+                finally:
+                    proc.stdout.close()
+                return_code = proc.wait()
+                err.seek(0)
+                stderr = err.read().decode("utf-8", "replace").strip()
+            # tar exits with 1 when files changed while being read; the archive is still usable
+            if return_code == 1 and "tar" in self.command:
+                self.warning = stderr.splitlines()[-1] if stderr else "exit code 1"
+            elif return_code:
+                self.error = stderr or "exit code {}".format(return_code)
+        except (OSError, subprocess.SubprocessError, tarfile.TarError) as e:
+            self.error = str(e)
+        self.bytes_out = self.output_size()
+        self.elapsed = time.time() - start
+
+    def consume(self, stream):
+        with self.compressor.open(self.output_path) as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                self.bytes_in += len(chunk)
+
+    def output_size(self):
+        return os.path.getsize(self.output_path) if os.path.exists(self.output_path) else 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def status(self):
+        if self.is_alive():
+            return "{} {}".format(self.name, format_size(self.bytes_in))
+        return "{} done".format(self.name)
+
+
+class StoreSource(StreamSource):
+    """Stream a tar command's stdout into a ChunkStore; only content the store lacks is compressed and written"""
+
+    def __init__(self, name, command, store):
+        super().__init__(name, command, None, None)
+        self.store = store
+        self.destination = "{} (store: {})".format(name, store.root)
+        self.entries = []
+        self.stats = collections.Counter()
+
+    def consume(self, stream):
+        self.entries = self.store.add_tar_stream(CountingReader(stream, self), self.stats)
+
+    def output_size(self):
+        """Only newly stored (compressed) bytes; content already in the store costs nothing"""
+        return self.stats["stored_bytes"]
+
+
+def decode_copy_field(value):
+    """Decode one field of COPY ... FROM stdin text format; \\N is NULL"""
+    if value == r"\N":
+        return None
+    if "\\" not in value:
+        return value
+    escapes = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\"}
+    return re.sub(r"\\(.)", lambda m: escapes.get(m.group(1), m.group(1)), value)
+
+
+def iter_copy_blocks(lines):
+    """Yield (table, columns, rows) for every COPY ... FROM stdin block in SQL dump output"""
+    copy_pattern = re.compile(r"^COPY (\S+) \((.*)\) FROM stdin;$")
+    table = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if table is None:
+            match = copy_pattern.match(line)
+            if match:
+                table = match.group(1).split(".", 1)[-1].strip('"')
+                columns = [column.strip().strip('"') for column in match.group(2).split(",")]
+                rows = []
+        elif line == "\\.":
+            yield table, columns, rows
+            table = None
+        else:
+            rows.append([decode_copy_field(value) for value in line.split("\t")])
+
+
+def format_psql_table(columns, rows):
+    """Aligned output in the same layout as psql's default table format"""
+    rows = [["" if value is None else value for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(columns)]
+    lines = [" " + " | ".join(column.center(width) for column, width in zip(columns, widths)).rstrip(),
+             "-" + "-+-".join("-" * width for width in widths) + "-"]
+    for row in rows:
+        lines.append(" " + " | ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+    lines.append("({} row{})".format(len(rows), "" if len(rows) == 1 else "s"))
+    return "\n".join(lines) + "\n"
+
+
+class PostgresDumpSource(StreamSource):
+    """
+    Parallel directory-format pg_dump inside the postgres container, streamed out
+    with a non-TTY tar. Per-table timings come from pg_dump's verbose output, and
+    the summary tables are extracted from the finished dump with pg_restore
+    rather than queried from the live DB.
+
+    The dump is staged in the container (by default in /tmp, i.e. its writable
+    layer) until it has been copied out, so check_space() is run before starting.
+    """
+
+    start_pattern = re.compile(r'dumping contents of table "(?:[^"]*\.)?([^"]+)"')
+    finish_pattern = re.compile(r"finished item \d+ TABLE DATA (\S+)")
+
+    # Table data only (including TOAST, excluding indexes); an upper bound for the compressed dump
+    size_query = ("select coalesce(sum(pg_table_size(c.oid)), 0) from pg_class c "
+                  "join pg_namespace n on n.oid = c.relnamespace "
+                  "where c.relkind in ('r', 'm') and n.nspname not in ('pg_catalog', 'information_schema')")
+
+    def __init__(self, name, output_dir, jobs, summary_dir, summary_tables=DB_SUMMARY_TABLES, staging_dir="/tmp"):
+        super().__init__(name, None, output_dir, None)
+        self.jobs = jobs
+        self.summary_dir = summary_dir
+        self.summary_tables = summary_tables
+        self.container_dir = os.path.join(staging_dir, os.path.basename(output_dir))
+        self.phase = "starting"
+        self.table_started = {}
+        self.table_times = {}
+
+    def run(self):
+        start = time.time()
+        try:
+            self.dump()
+            self.phase = "copying"
+            self.copy_out()
+            self.phase = "extracting summaries"
+            self.extract_summaries()
+        except (OSError, subprocess.SubprocessError, tarfile.TarError, RuntimeError) as e:
+            self.error = str(e)
+        finally:
+            subprocess.call(docker_exec(POSTGRES_CONTAINER, "rm", "-rf", self.container_dir), stdin=subprocess.DEVNULL)
+        self.bytes_out = self.output_size()
+        self.elapsed = time.time() - start
+
+    @classmethod
+    def check_space(cls, staging_dir, host_dir):
+        """
+        Raise RuntimeError if the dump might not fit where it is staged in the container, or on the host,
+        where it is copied out and then bundled into the final tar (so it needs room for two copies).
+        The estimate is the DB's table size; the check is skipped if the size or free space can't be read.
+        """
+        if subprocess.call(docker_exec(POSTGRES_CONTAINER, "test", "-d", staging_dir), stdin=subprocess.DEVNULL):
+            raise RuntimeError("Staging directory {} not found in the {} container".format(staging_dir, POSTGRES_CONTAINER))
+        try:
+            estimate = int(check_output(docker_exec(
+                POSTGRES_CONTAINER, "psql", "--username", "daemon", "-d", "lh", "-Atc", cls.size_query)).strip())
+            df_fields = check_output(docker_exec(POSTGRES_CONTAINER, "df", "-Pk", staging_dir)).splitlines()[-1].split()
+            container_free = int(df_fields[3]) * 1024
+        except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+            return None
+        host_free = shutil.disk_usage(host_dir).free
+        problems = []
+        if container_free < estimate:
+            problems.append("{}:{} has {} free".format(POSTGRES_CONTAINER, staging_dir, format_size(container_free)))
+        if host_free < 2 * estimate:
+            problems.append("{} has {} free (needs {} for the dump and the final bundle)".format(
+                host_dir, format_size(host_free), format_size(2 * estimate)))
+        if problems:
+            raise RuntimeError("The database dump may need up to {}, but {}. Free up space, or use --db-staging-dir "
+                               "to stage the dump on a volume mounted into the postgres container".format(
+                                   format_size(estimate), "; ".join(problems)))
+        return estimate, container_free, host_free
+
+    def _finish_table(self, table, now):
+        if table in self.table_started:
+            self.table_times[table] = now - self.table_started.pop(table)
+
+    def dump(self):
+        self.phase = "dumping"
+        proc = subprocess.Popen(
+            docker_exec(POSTGRES_CONTAINER, "pg_dump", "--username", "daemon", "-d", "lh", "--format=directory",
+                        "--jobs={}".format(self.jobs), "--verbose", "--file={}".format(self.container_dir)),
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        messages = []
+        for line in proc.stderr:
+            now = time.time()
+            match = self.start_pattern.search(line)
+            if match:
+                # Without --jobs pg_dump dumps one table at a time and never reports "finished item"
+                if self.jobs == 1:
+                    for table in list(self.table_started):
+                        self._finish_table(table, now)
+                self.table_started[match.group(1)] = now
+                continue
+            match = self.finish_pattern.search(line)
+            if match:
+                self._finish_table(match.group(1), now)
+                continue
+            messages.append(line.strip())
+        if proc.wait():
+            errors = [message for message in messages if "error" in message.lower()] or messages[-3:]
+            raise RuntimeError("pg_dump failed: {}".format(" / ".join(errors)))
+        for table in list(self.table_started):
+            self._finish_table(table, time.time())
+
+    def copy_out(self):
+        proc = subprocess.Popen(
+            docker_exec(POSTGRES_CONTAINER, "tar", "cf", "-", "-C", os.path.dirname(self.container_dir),
+                        os.path.basename(self.container_dir)),
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        stream = CountingReader(proc.stdout, self)
+        # Table data files are already gzip-compressed by pg_dump, so they are extracted as-is
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            tar.extractall(os.path.dirname(self.output_path))
+        while stream.read(CHUNK_SIZE):
+            pass
+        if proc.wait():
+            raise RuntimeError("Copying the dump out of the {} container failed".format(POSTGRES_CONTAINER))
+
+    def extract_summaries(self):
+        command = ["pg_restore", "--data-only", "--file=-"]
+        for table in self.summary_tables:
+            command.append("--table={}".format(table))
+        proc = subprocess.Popen(docker_exec(POSTGRES_CONTAINER, *(command + [self.container_dir])),
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, universal_newlines=True)
+        found = set()
+        for table, columns, rows in iter_copy_blocks(proc.stdout):
+            if table in self.summary_tables:
+                found.add(table)
+                with open(os.path.join(self.summary_dir, "db-{}.txt".format(table)), "w") as f:
+                    f.write(format_psql_table(columns, rows))
+        if proc.wait():
+            raise RuntimeError("pg_restore could not read the summary tables from the dump")
+        missing = set(self.summary_tables) - found
+        if missing:
+            self.warning = "not in dump: {}".format(", ".join(sorted(missing)))
+
+    def output_size(self):
+        total = 0
+        for parent, _, files in os.walk(self.output_path):
+            total += sum(os.path.getsize(os.path.join(parent, f)) for f in files)
+        return total
+
+    def status(self):
+        if not self.is_alive():
+            return "{} done".format(self.name)
+        if self.phase == "dumping":
+            return "{} dumping ({} tables done, {} in progress)".format(
+                self.name, len(self.table_times), len(self.table_started))
+        if self.phase == "copying":
+            return "{} copying {}".format(self.name, format_size(self.bytes_in))
+        return "{} {}".format(self.name, self.phase)
+
+    def print_table_timings(self, limit=15):
+        if not self.table_times:
+            return
+        print_color("\nSlowest tables ({} dumped with {} job(s)):".format(len(self.table_times), self.jobs), bold=True)
+        slowest = sorted(self.table_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+        width = max(len(table) for table, _ in slowest)
+        for table, elapsed in slowest:
+            print("    {}  {:>10}".format(table.ljust(width), format_duration(elapsed)))
+
+
+def run_concurrently(sources, progress_interval):
+    """Start all sources at once and print one progress line per interval until they finish"""
+    start = time.time()
+    for source in sources:
+        print_color("Streaming: {}".format(source.destination), bold=True)
+        source.start()
+    while any(source.is_alive() for source in sources):
+        deadline = time.time() + progress_interval
+        for source in sources:
+            source.join(timeout=max(0, deadline - time.time()))
+        if any(source.is_alive() for source in sources):
+            print_color("    [{}] {}".format(
+                format_duration(time.time() - start), ", ".join(source.status() for source in sources)), color="gray")
+    print()
+    width = max(len(source.name) for source in sources)
+    for source in sources:
+        line = "    {}  {:>10} -> {:>10}  {:>10}".format(
+            source.name.ljust(width), format_size(source.bytes_in), format_size(source.bytes_out),
+            format_duration(source.elapsed or 0))
+        if source.error:
+            print_color("{}  ERROR: {}".format(line, source.error), color="red")
+        elif source.warning:
+            print_color("{}  warning: {}".format(line, source.warning), color="gray")
+        else:
+            print(line)
+    return [source for source in sources if source.error]
+
+
+class BackupRunner:
+    def __init__(self, args):
+        self.args = args
+        self.timer = StageTimer()
+        self.current_user = getpass.getuser()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.new_dir = "upgrade_backups_{}".format(timestamp)
+        self.new_dir_full = os.path.join(os.getcwd(), self.new_dir)
+
+    def path(self, *parts):
+        return os.path.join(self.new_dir_full, *parts)
+
+    def write_command_output(self, file_name, command):
+        file_path = self.path(file_name)
+        print_color("Generating: {}".format(file_name), bold=True)
+        with open(file_path, "wb") as f:
+            subprocess.call(command, stdin=subprocess.DEVNULL, stdout=f)
+        print("    {}".format(format_size(os.path.getsize(file_path))))
+
+    def stage_host_files(self):
+        print_color("Creating new backup directory: {}".format(self.new_dir_full), bold=True)
+        os.mkdir(self.new_dir_full)
+        print_color("Backing up: InstallerSettings.conf", bold=True)
+        subprocess.call(["sudo", "cp", "-p", "/opt/logichub/InstallerSettings.conf", self.new_dir_full + "/"])
+        print_color("Checking for requests_ca_bundle certs...", bold=True)
+        os.mkdir(self.path("certs"))
+        subprocess.call([
+            "sudo", "find", "/opt/logichub/certs/", "(", "-name", "*.crt", "-o", "-name", "*.pem", ")",
+            "-print", "-exec", "cp", "-p", "{}", self.path("certs"), ";"])
+
+    def stage_lh_backup(self):
+        print_color("Generating a backup...", bold=True)
+        subprocess.call(["sudo", "/opt/logichub/scripts/backup.sh"])
+        new_backup = check_output(["sudo", "ls", "-tr", "/opt/logichub/backups/"]).split()
+        if new_backup:
+            print_color("New backup: /opt/logichub/backups/{}".format(new_backup[-1]), bold=True)
+
+    def user_steps_defined(self):
+        try:
+            dynamic_conf = check_output(docker_exec(
+                SERVICE_CONTAINER, "cat", "/opt/docker/data/service/conf/dynamic.conf"))
+        except subprocess.CalledProcessError:
+            return False
+        return bool(re.search(r"lhub\.steps\.userdefined\.dir\s*=\s*\S", dynamic_conf))
+
+    def stream_sources(self, compressor, store=None):
+        sources = []
+        service_sources = list(SERVICE_SOURCES)
+        if self.user_steps_defined():
+            service_sources.append(USER_STEPS_SOURCE)
+        else:
+            print_color("lhub.steps.userdefined.dir not defined in dynamic.conf; skipping...", color="gray")
+        for name, parent, entry in service_sources:
+            command = docker_exec(SERVICE_CONTAINER, "tar", "cf", "-", "-C", parent, entry + "/")
+            if store:
+                sources.append(StoreSource(name, command, store))
+            else:
+                sources.append(StreamSource(name, command, self.path(name + ".tar.gz"), compressor))
+        if not self.args.no_logs:
+            sources.append(StreamSource(
+                "logs", ["sudo", "tar", "cf", "-", "-C", "/var/log", "--exclude=logichub/threaddumps", "logichub"],
+                self.new_dir_full + "_logs.tar.gz", compressor))
+        db_dump = PostgresDumpSource(
+            "db_dump", self.path("logichub_backup_data_dump"), self.args.db_jobs, self.new_dir_full,
+            staging_dir=self.args.db_staging_dir)
+        sources.append(db_dump)
+        failed = run_concurrently(sources, self.args.progress_interval)
+        db_dump.print_table_timings()
+        if store:
+            self.save_store_snapshot(store, [source for source in sources if isinstance(source, StoreSource)])
+        return failed
+
+    def save_store_snapshot(self, store, sources):
+        stats = collections.Counter()
+        for source in sources:
+            stats.update(source.stats)
+        snapshot_path = store.save_snapshot(
+            self.new_dir, {source.name: source.entries for source in sources if not source.error}, stats)
+        total = stats["new_bytes"] + stats["reused_bytes"]
+        print_color("\nStore snapshot: {} ({})".format(snapshot_path, format_size(os.path.getsize(snapshot_path))), bold=True)
+        print("    {} of {} was new ({} chunk(s), {} written); {} deduplicated".format(
+            format_size(stats["new_bytes"]), format_size(total), stats["new_chunks"],
+            format_size(stats["stored_bytes"]), format_size(stats["reused_bytes"])))
+        restore_command = "python3 upgrade_prep-backups.py --store {} --restore {}".format(store.root, self.new_dir)
+        with open(self.path("logichub_backup_store_snapshot.txt"), "w") as f:
+            f.write("Snapshot: {}\nRestore with: {}\n".format(snapshot_path, restore_command))
+        print("    Restore with: {}".format(restore_command))
+
+    @staticmethod
+    def descriptor_mtimes():
+        """Modification time of each descriptor in the service container"""
+        listing = check_output(docker_exec(
+            SERVICE_CONTAINER, "find", INTEGRATIONS_DIR, "-maxdepth", "1", "-name", "*.json", "-printf", r"%T@\t%f\n"))
+        return {name: float(mtime) for mtime, name in (line.split("\t", 1) for line in listing.splitlines() if "\t" in line)}
+
+    def manifest_descriptor_names(self):
+        """
+        Modified/added descriptors from the verify script's hash diff for the running service image, if any,
+        plus any descriptor changed since the diff was made (which the diff can't know about)
+        """
+        try:
+            image = check_output(["docker", "inspect", "--format", "{{.Config.Image}}", SERVICE_CONTAINER]).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        diff_file = os.path.join(
+            os.path.expanduser(MANIFEST_CACHE_DIR), re.sub(r"[^\w.-]+", "_", image), "diff.json")
+        if not os.path.isfile(diff_file):
+            return None
+        with open(diff_file) as f:
+            diff = json.load(f)
+        if not diff.get("baseline_count"):
+            return None
+        try:
+            mtimes = self.descriptor_mtimes()
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            return None
+        print_color("Using descriptor hash diff: {}".format(diff_file), color="gray")
+        names = {entry["name"] for entry in diff["modified"] + diff["added"]}
+        # A minute of slack, since files hashed just before the diff was saved may have changed meanwhile
+        diff_time = os.path.getmtime(diff_file) - 60
+        changed = {name for name, mtime in mtimes.items() if mtime >= diff_time} - names
+        if changed:
+            print_color("    plus {} descriptor(s) changed since the diff was made".format(len(changed)), color="gray")
+        # Descriptors deleted since the diff was made would only make tar fail
+        return sorted((names | changed) & set(mtimes))
+
+    def custom_descriptor_names(self):
+        """
+        Hash diff from upgrade_prep-verify.py when available, otherwise the shell
+        script's heuristic: anything not sharing the oldest file's timestamp was edited
+        """
+        names = self.manifest_descriptor_names()
+        if names is not None:
+            return names
+        listing = check_output(docker_exec(
+            SERVICE_CONTAINER, "find", INTEGRATIONS_DIR, "-maxdepth", "1", "-name", "*.json",
+            "-printf", r"%TY-%Tm-%Td %TH:%TM\t%f\n"))
+        entries = [line.split("\t", 1) for line in listing.splitlines() if "\t" in line]
+        if not entries:
+            return []
+        oldest = min(timestamp for timestamp, _ in entries)
+        return sorted(name for timestamp, name in entries if timestamp != oldest)
+
+    def stage_service_metadata(self):
+        self.write_command_output(
+            "logichub_backup_installed_python_modules.txt", docker_exec(SERVICE_CONTAINER, "pip", "list"))
+        self.write_command_output(
+            "logichub_backup_service_root_bash_history.txt",
+            docker_exec(SERVICE_CONTAINER, "cat", "/root/.bash_history"))
+
+        print_color("Backing up custom descriptors", bold=True)
+        descriptor_dir = self.path("descriptors")
+        os.mkdir(descriptor_dir)
+        names = self.custom_descriptor_names()
+        if names:
+            proc = subprocess.Popen(
+                docker_exec(SERVICE_CONTAINER, "tar", "cf", "-", "-C", INTEGRATIONS_DIR, *names),
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+            with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+                tar.extractall(descriptor_dir)
+            proc.wait()
+        print("    {} custom descriptor(s)".format(len(names)))
+
+    def stage_final(self):
+        subprocess.call(["sudo", "chown", "-R", "{0}:{0}".format(self.current_user), self.new_dir_full])
+        archive = self.new_dir_full + ".tar"
+        # Members are already compressed, so the bundle is a plain tar rather than another gzip pass
+        print_color("Bundling all files: {}".format(archive), bold=True)
+        with tarfile.open(archive, "w") as tar:
+            tar.add(self.new_dir_full, arcname=self.new_dir)
+        print_color("\nFinal backup file: {} ({})".format(archive, format_size(os.path.getsize(archive))), bold=True)
+        if self.args.delete_dir:
+            print_color("Deleting temp directory:\n\t{}".format(self.new_dir_full), bold=True)
+            shutil.rmtree(self.new_dir_full)
+
+    def run(self):
+        if self.current_user not in ALLOWED_USERS:
+            print_color("Current user ({}) is not centos, ubuntu, or logichub.\nsu to one of those users and try again.\n"
+                        .format(self.current_user), color="red")
+            return 1
+
+        try:
+            space = PostgresDumpSource.check_space(self.args.db_staging_dir, os.getcwd())
+        except RuntimeError as e:
+            print_color("ERROR: {}".format(e), color="red")
+            return 1
+        if space:
+            print_color("Database dump estimate: up to {} ({} free in {}:{}, {} free on the host)".format(
+                format_size(space[0]), format_size(space[1]), POSTGRES_CONTAINER, self.args.db_staging_dir,
+                format_size(space[2])), color="gray")
+        else:
+            print_color("Could not estimate the database dump size; skipping the free space check", color="gray")
+
+        with self.timer.stage("Host Files"):
+            self.stage_host_files()
+
+        if self.args.no_lh_backup:
+            self.timer.skip("LogicHub Backup Script")
+        else:
+            with self.timer.stage("LogicHub Backup Script"):
+                self.stage_lh_backup()
+
+        with self.timer.stage("Service Container, Logs and Postgres (concurrent)"):
+            print_color("Compressing with {} worker process(es)".format(self.args.workers), color="gray")
+            store = ChunkStore(self.args.store, self.args.compresslevel) if self.args.store else None
+            with Compressor(self.args.compresslevel, self.args.workers) as compressor:
+                failed = self.stream_sources(compressor, store)
+
+        with self.timer.stage("Service Container Metadata"):
+            self.stage_service_metadata()
+
+        with self.timer.stage("Final Stage"):
+            self.stage_final()
+
+        self.timer.print_summary()
+        if failed:
+            print_color("\nERROR: {} source(s) failed: {}".format(
+                len(failed), ", ".join(source.name for source in failed)), color="red")
+            return 1
+        return 0
+
+
+def restore_snapshot(store_path, snapshot_name, compresslevel, workers):
+    """Rebuild each source of a store snapshot as the <source>.tar.gz a normal run would have produced"""
+    store = ChunkStore(store_path, compresslevel)
+    snapshot = store.load_snapshot(snapshot_name)
+    output_dir = os.path.join(os.getcwd(), "{}_restored".format(snapshot["name"]))
+    os.makedirs(output_dir, exist_ok=True)
+    timer = StageTimer()
+    with timer.stage("Restore {}".format(snapshot["name"])), Compressor(compresslevel, workers) as compressor:
+        for name, entries in sorted(snapshot["sources"].items()):
+            output_path = os.path.join(output_dir, name + ".tar.gz")
+            start = time.time()
+            with compressor.open(output_path) as out:
+                store.write_tar(entries, out)
+            print("    {}  {} entries, {:>10}  {:>10}".format(
+                output_path, len(entries), format_size(os.path.getsize(output_path)),
+                format_duration(time.time() - start)))
+    return 0
+
+
+def list_snapshots(store_path):
+    store = ChunkStore(store_path)
+    for name in store.snapshots():
+        snapshot = store.load_snapshot(name)
+        stats = snapshot.get("stats", {})
+        print("{}  {}  new: {:>10}  deduplicated: {:>10}".format(
+            name, snapshot.get("hostname", ""), format_size(stats.get("new_bytes", 0)),
+            format_size(stats.get("reused_bytes", 0))))
+    return 0
+
+
+def iter_input(path):
+    """Raw bytes of a file, or of a directory as an uncompressed tar stream"""
+    if os.path.isdir(path):
+        path = os.path.abspath(path)
+        proc = subprocess.Popen(["tar", "cf", "-", "-C", os.path.dirname(path), os.path.basename(path)],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        for chunk in iter(lambda: proc.stdout.read(CHUNK_SIZE), b""):
+            yield chunk
+        proc.wait()
+    else:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+
+
+def benchmark_compression(path, compresslevel, max_workers):
+    """Compress path with the gzip module in-process, then with 1..max_workers pool workers, and compare throughput"""
+    worker_counts = sorted({1, max_workers} | {2 ** i for i in range(1, 8) if 2 ** i < max_workers})
+    print_color("Compression benchmark: {} (level {})".format(path, compresslevel), color="blue", bold=True, header=True)
+    print("    {:<16} {:>10} {:>12} {:>10} {:>8}".format("mode", "time", "MB/s", "ratio", "speedup"))
+    baseline = None
+    for workers in [0] + worker_counts:
+        bytes_in = 0
+        start = time.time()
+        with Compressor(compresslevel, workers) as compressor, tempfile.NamedTemporaryFile() as tmp:
+            with compressor.open(tmp.name) as out:
+                for chunk in iter_input(path):
+                    out.write(chunk)
+                    bytes_in += len(chunk)
+            bytes_out = os.path.getsize(tmp.name)
+        elapsed = time.time() - start
+        baseline = baseline or elapsed
+        print("    {:<16} {:>10} {:>12.1f} {:>10.3f} {:>7.2f}x".format(
+            "gzip module" if not workers else "{} worker(s)".format(workers), format_duration(elapsed),
+            bytes_in / 1024.0 / 1024.0 / max(elapsed, 1e-9), bytes_out / float(max(bytes_in, 1)), baseline / elapsed))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade Prep - backups (Python pipeline)")
+    parser.add_argument("--no-logs", action="store_true", help="Skip the log bundle")
+    parser.add_argument("--no-lh-backup", action="store_true", help="Skip LogicHub's built-in backup script")
+    parser.add_argument("--delete-dir", action="store_true", help="Delete the backup directory after bundling it")
+    parser.add_argument("--compresslevel", type=int, default=6, choices=range(1, 10), metavar="1-9",
+                        help="gzip compression level (default: 6)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Compression worker processes shared by all sources; 0 compresses in-process "
+                             "with the gzip module (default: CPU count)")
+    parser.add_argument("--db-jobs", type=int, default=4, help="Parallel pg_dump jobs (default: 4)")
+    parser.add_argument("--db-staging-dir", default="/tmp", metavar="DIR",
+                        help="Directory in the postgres container where the dump is written before it is copied "
+                             "out; use a mounted volume to keep it out of the container's writable layer "
+                             "(default: /tmp)")
+    parser.add_argument("--progress-interval", type=float, default=5, help="Seconds between progress lines")
+    parser.add_argument("--benchmark-compression", metavar="PATH",
+                        help="Only benchmark compression scaling on a file or directory, then exit")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE, metavar="DIR",
+                        help="Put service container sources in a deduplicated chunk store (default: {})".format(
+                            DEFAULT_STORE))
+    parser.add_argument("--restore", metavar="SNAPSHOT",
+                        help="Rebuild a store snapshot's archives into ./<SNAPSHOT>_restored, then exit")
+    parser.add_argument("--list-snapshots", action="store_true", help="List the store's snapshots, then exit")
+    args = parser.parse_args(argv)
+    if args.restore or args.list_snapshots:
+        store_path = args.store or DEFAULT_STORE
+        if args.list_snapshots:
+            return list_snapshots(store_path)
+        return restore_snapshot(store_path, args.restore, args.compresslevel, args.workers)
+    if args.benchmark_compression:
+        return benchmark_compression(args.benchmark_compression, args.compresslevel, max(args.workers, 1))
+    return BackupRunner(args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,826 @@
+#!/usr/bin/env python3
+
+"""
+Upgrade Prep - Verifications (Python fact collector)
+
+A script designed to work by pasting directly into a terminal (see the
+"LogicHub Upgrades" menu) in addition to running as a script. It performs the
+same review as upgrade_prep-verify.sh, but instead of one "docker exec" per
+check it:
+
+- runs a single collector inside the service container (one "docker exec -i")
+  that gathers every fact in one pass and returns one JSON document
+- runs a single psql call for the DB facts
+- renders the same checks from the combined JSON, and saves it so that a later
+  run can be compared against it with --compare
+- scans the service logs for user activity in one pass, and incrementally:
+  per-file checkpoints mean repeated runs only read newly appended log data
+- finds edited descriptors by hash instead of by file date: descriptors are
+  hashed incrementally (only files whose size or mtime changed since the last
+  run), and compared with a baseline hashed once per version from the service
+  image's own copy of /opt/docker/resources/integrations
+
+Requires only the python3 standard library (3.6+) on the host; the collector
+runs with whichever python the service container provides.
+"""
+
+import argparse
+import collections
+import datetime
+import hashlib
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+
+SERVICE_CONTAINER = "service"
+POSTGRES_CONTAINER = "postgres"
+SERVICE_LOG_DIR = "/var/log/logichub/service"
+MANIFEST_CACHE_DIR = "~/.lhub_upgrade_prep/descriptors"
+LOG_CHECKPOINT_FILE = "~/.lhub_upgrade_prep/log_checkpoints.json"
+
+# Runs inside the service container (or its image), so it sticks to what both python2 and python3 can run
+COLLECTOR_COMMON = r'''
+import hashlib, json, os, re, sys, time
+
+PREVIOUS_DESCRIPTORS = {}
+
+DATA_DIR = "/opt/docker/data/service"
+CONF_DIR = "/opt/docker/conf"
+RESOURCES_DIR = "/opt/docker/resources"
+INTEGRATIONS_DIR = "/opt/docker/resources/integrations"
+HEAPDUMPS_DIR = DATA_DIR + "/heapdumps"
+PIP_REQUIREMENTS = DATA_DIR + "/scripts/pip-requirements.txt"
+
+
+def read_text(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", "replace")
+    except (IOError, OSError):
+        return None
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_facts(path, with_hash=False):
+    st = os.lstat(path)
+    facts = {"size": st.st_size, "mtime": int(st.st_mtime)}
+    if with_hash:
+        facts["sha256"] = sha256(path)
+    return facts
+
+
+def disk_usage(path):
+    """Allocated bytes like du, counting each inode once"""
+    seen = set()
+    total = 0
+    for parent, dirs, files in os.walk(path):
+        for name in [parent] + [os.path.join(parent, n) for n in dirs + files]:
+            try:
+                st = os.lstat(name)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_blocks * 512
+    return total
+
+
+def ensure_dir(path):
+    if os.path.isdir(path):
+        return False
+    os.makedirs(path)
+    return True
+
+
+facts = {"collected_at": int(time.time())}
+'''
+
+COLLECTOR_DESCRIPTORS = r'''
+facts["descriptors"] = {}
+facts["descriptors_rehashed"] = 0
+for name in os.listdir(INTEGRATIONS_DIR) if os.path.isdir(INTEGRATIONS_DIR) else []:
+    if not name.endswith(".json"):
+        continue
+    path = os.path.join(INTEGRATIONS_DIR, name)
+    current = file_facts(path)
+    previous = PREVIOUS_DESCRIPTORS.get(name) or {}
+    if previous.get("size") == current["size"] and previous.get("mtime") == current["mtime"]:
+        current.update(sha256=previous["sha256"], image=previous.get("image"))
+    else:
+        with open(path, "rb") as f:
+            content = f.read()
+        match = re.search(br'"image"\s*:\s*"([^"]+)"', content)
+        current.update(sha256=hashlib.sha256(content).hexdigest(),
+                       image=match.group(1).decode("utf-8", "replace") if match else None)
+        facts["descriptors_rehashed"] += 1
+    facts["descriptors"][name] = current
+'''
+
+COLLECTOR_SERVICE = r'''
+pip_requirements = []
+for parent, dirs, files in os.walk(DATA_DIR):
+    if "pip-requirements.txt" in files:
+        pip_requirements.append(os.path.join(parent, "pip-requirements.txt"))
+created = False
+if not pip_requirements:
+    ensure_dir(os.path.dirname(PIP_REQUIREMENTS))
+    open(PIP_REQUIREMENTS, "a").close()
+    created = True
+facts["pip_requirements"] = {
+    "paths": sorted(pip_requirements), "created": created, "content": read_text(PIP_REQUIREMENTS) or ""}
+
+history = (read_text("/root/.bash_history") or "").splitlines()
+facts["bash_history"] = {
+    "lines": len(history),
+    "pip_commands": [line for line in history if re.search(r"^pip (?!list)|pip +install", line)],
+    "conf_mentions": [line for line in history if "dynamic.conf" not in line and re.search(r"\S+\.conf", line)],
+}
+
+facts["conf_files"] = {}
+for parent, dirs, files in os.walk(CONF_DIR):
+    for name in files:
+        path = os.path.join(parent, name)
+        facts["conf_files"][os.path.relpath(path, CONF_DIR)] = file_facts(path, with_hash=True)
+
+facts["heapdumps_created"] = ensure_dir(HEAPDUMPS_DIR)
+facts["disk_usage"] = dict((path, disk_usage(path)) for path in (DATA_DIR, HEAPDUMPS_DIR, RESOURCES_DIR))
+
+dynamic_conf = read_text(DATA_DIR + "/conf/dynamic.conf") or ""
+match = re.search(r"^\s*lhub\.steps\.userdefined\.dir\s*=\s*(.*?)\s*$", dynamic_conf, re.M)
+facts["dynamic_conf"] = {"content": dynamic_conf, "userdefined_steps_dir": match.group(1) if match else None}
+'''
+
+COLLECTOR_OUTPUT = r'''
+sys.stdout.write(json.dumps(facts, sort_keys=True))
+'''
+
+POSTGRES_QUERY = r"""
+select json_build_object(
+    'scripts', (
+        select coalesce(json_agg(json_build_object('kind', kind, 'name', name) order by kind, name), '[]')
+        from scripts where kind != '"KindPython"'),
+    'integration_instances', (
+        select coalesce(json_agg(json_build_object(
+            'integration_name', d.name, 'label', i.label, 'id', i.id, 'integration_id', i.integration_id,
+            'docker_tag', substring(d.image from ':([^:]+)$'), 'image', d.image
+        ) order by i.integration_id, i.label), '[]')
+        from integration_instances i
+        cross join lateral (
+            select j->>'name' as name, j#>>'{runtimeEnvironment,descriptor,image}' as image
+            from (select i.descriptor::jsonb as j) x) d)
+)
+"""
+
+
+def docker_exec(container, *args, interactive=False):
+    """docker exec command without a TTY; -i only when the command reads stdin"""
+    return ["docker", "exec"] + (["-i"] if interactive else []) + [container] + list(args)
+
+
+def check_output(command, **kwargs):
+    return subprocess.check_output(command, universal_newlines=True, **kwargs)
+
+
+def command_output(command):
+    """stdout of a host command, even if it fails, the same way the shell script would show it"""
+    return subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+
+def format_size(num_bytes):
+    for unit in ("B", "K", "M", "G"):
+        if abs(num_bytes) < 1024:
+            return "{:.1f}{}".format(num_bytes, unit) if unit != "B" else "{}B".format(num_bytes)
+        num_bytes /= 1024.0
+    return "{:.1f}T".format(num_bytes)
+
+
+def minute(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def not_most_common_mtime(files):
+    """Same heuristic as the shell script: files that don't share the most common mtime were edited"""
+    if not files:
+        return []
+    most_common, _ = collections.Counter(minute(f["mtime"]) for f in files.values()).most_common(1)[0]
+    return sorted(name for name, f in files.items() if minute(f["mtime"]) != most_common)
+
+
+PYTHON_FROM_STDIN = "command -v python3 >/dev/null 2>&1 && exec python3 - || exec python -"
+
+
+def collector_source(sections, previous_descriptors=None):
+    source = COLLECTOR_COMMON
+    if previous_descriptors:
+        # ASCII-only JSON, so the literal means the same thing to python2 and python3
+        source = source.replace("PREVIOUS_DESCRIPTORS = {}", "PREVIOUS_DESCRIPTORS = json.loads({!r})".format(
+            json.dumps(previous_descriptors, ensure_ascii=True)))
+    return source + "".join(sections) + COLLECTOR_OUTPUT
+
+
+def run_collector(command, source, where):
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    output, _ = proc.communicate(source)
+    if proc.returncode:
+        raise RuntimeError("Fact collector failed in {}".format(where))
+    return json.loads(output)
+
+
+class DescriptorManifest:
+    """
+    Cached descriptor hashes, keyed by the service image (i.e. the LogicHub
+    version). current.json holds the container's hashes from the last run, so
+    the collector only re-hashes files whose size or mtime changed since then;
+    baseline.json holds the hashes shipped in the image itself, computed once
+    per version; diff.json is the latest comparison (also read by the backups).
+    """
+
+    def __init__(self, image, cache_dir=MANIFEST_CACHE_DIR):
+        self.image = image
+        key = re.sub(r"[^\w.-]+", "_", image)
+        self.cache_dir = os.path.join(os.path.expanduser(cache_dir), key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def service_image():
+        return check_output(["docker", "inspect", "--format", "{{.Config.Image}}", SERVICE_CONTAINER],
+                            stdin=subprocess.DEVNULL).strip()
+
+    def _load(self, name):
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save(self, name, data):
+        path = os.path.join(self.cache_dir, name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.rename(path + ".tmp", path)
+
+    def previous(self):
+        return self._load("current.json") or {}
+
+    def save_current(self, descriptors):
+        self._save("current.json", descriptors)
+
+    def baseline(self):
+        """Hashes of the image's pristine descriptors, from a throwaway container of the same image"""
+        baseline = self._load("baseline.json")
+        if baseline is None:
+            command = ["docker", "run", "--rm", "-i", "--entrypoint", "sh", self.image, "-c", PYTHON_FROM_STDIN]
+            baseline = run_collector(command, collector_source([COLLECTOR_DESCRIPTORS]), self.image)["descriptors"]
+            self._save("baseline.json", baseline)
+        return baseline
+
+    def diff(self, descriptors):
+        baseline = self.baseline()
+        result = {"image": self.image, "baseline_count": len(baseline), "modified": [], "added": [], "removed": []}
+        for name, current in sorted(descriptors.items()):
+            shipped = baseline.get(name)
+            if shipped is None:
+                result["added"].append({"name": name, "image": current["image"]})
+            elif shipped["sha256"] != current["sha256"]:
+                result["modified"].append({"name": name, "image": current["image"], "baseline_image": shipped["image"]})
+        result["removed"] = [{"name": name, "image": baseline[name]["image"]}
+                             for name in sorted(set(baseline) - set(descriptors))]
+        self._save("diff.json", result)
+        return result
+
+
+def collect_service_facts(descriptors_only=False):
+    """Every service container fact from one docker exec, plus the descriptor diff against the image baseline"""
+    manifest = DescriptorManifest(DescriptorManifest.service_image())
+    sections = [COLLECTOR_DESCRIPTORS] if descriptors_only else [COLLECTOR_SERVICE, COLLECTOR_DESCRIPTORS]
+    facts = run_collector(
+        docker_exec(SERVICE_CONTAINER, "sh", "-c", PYTHON_FROM_STDIN, interactive=True),
+        collector_source(sections, manifest.previous()), "the {} container".format(SERVICE_CONTAINER))
+    manifest.save_current(facts["descriptors"])
+    try:
+        facts["descriptor_diff"] = manifest.diff(facts["descriptors"])
+    except (OSError, RuntimeError, ValueError) as e:
+        facts["descriptor_diff"] = {"image": manifest.image, "error": str(e)}
+    return facts
+
+
+def collect_postgres_facts():
+    """Scripts table and integration instances from one psql call"""
+    output = check_output(docker_exec(
+        POSTGRES_CONTAINER, "psql", "-X", "-At", "--username", "daemon", "lh", "-c", POSTGRES_QUERY),
+        stdin=subprocess.DEVNULL)
+    return json.loads(output)
+
+
+class ServiceLogAnalyzer:
+    """
+    Builds a per-user last-login and last-activity index in a single streaming
+    pass over the service logs. Blocks of whole lines are searched with one
+    precompiled pattern, so only matching lines are ever handled in Python;
+    gzipped logs are decompressed by a separate gzip process.
+
+    User names are matched case-insensitively, like the shell version's
+    zgrep -i: both indexes are keyed by the lower-cased name.
+    """
+
+    block_size = 1024 * 1024
+    pattern = re.compile(rb"Login request: *(\S+)|(?i:user: ([^\s(]+))")
+    date_pattern = re.compile(rb"\d{4}-")
+
+    def __init__(self):
+        self.last_login = {}
+        self.last_activity = {}
+        self.bytes_scanned = 0
+
+    @staticmethod
+    def recent_logs(log_dir=SERVICE_LOG_DIR):
+        """The newest rotated log and the current one, oldest first, like the shell version"""
+        rotated = sorted(f for f in os.listdir(log_dir) if re.match(r"service\.log\.2.*gz$", f))
+        return [os.path.join(log_dir, f) for f in rotated[-1:]] + [os.path.join(log_dir, "service.log")]
+
+    @staticmethod
+    def open_log(path, offset=0):
+        """Returns (process or None, stream) reading path from offset, through sudo only if needed"""
+        readable = os.access(path, os.R_OK)
+        if path.endswith(".gz"):
+            command = ["gzip", "-dc", path]
+        elif readable:
+            f = open(path, "rb")
+            f.seek(offset)
+            return None, f
+        else:
+            command = ["tail", "-c", "+{}".format(offset + 1), path]
+        proc = subprocess.Popen(command if readable else ["sudo"] + command,
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        return proc, proc.stdout
+
+    @classmethod
+    def read_head(cls, path, size):
+        proc, stream = cls.open_log(path)
+        try:
+            return stream.read(size)
+        finally:
+            stream.close()
+            if proc:
+                proc.kill()
+                proc.wait()
+
+    def scan_stream(self, stream, skip=0, scan_partial_line=True):
+        """
+        Scan a stream, ignoring its first skip bytes (already covered by a
+        checkpoint). Returns the offset just past the last complete line.
+        """
+        while skip:
+            skipped = len(stream.read(min(skip, self.block_size)))
+            if not skipped:
+                return 0
+            skip -= skipped
+        offset = 0
+        remainder = b""
+        for block in iter(lambda: stream.read(self.block_size), b""):
+            block = remainder + block
+            cut = block.rfind(b"\n") + 1
+            remainder = block[cut:]
+            if cut:
+                self.scan_block(block[:cut])
+                offset += cut
+        if remainder and scan_partial_line:
+            self.scan_block(remainder)
+        return offset
+
+    def scan_block(self, block):
+        self.bytes_scanned += len(block)
+        for match in self.pattern.finditer(block):
+            start = block.rfind(b"\n", 0, match.start()) + 1
+            end = block.find(b"\n", match.end())
+            line = block[start:end if end >= 0 else len(block)]
+            if match.group(1) is not None:
+                self.last_login[match.group(1).lower()] = line
+            elif self.date_pattern.match(line):
+                self.last_activity[match.group(2).lower()] = line
+
+    def scan_file(self, path, offset=0, skip=0, scan_partial_line=True):
+        proc, stream = self.open_log(path, offset)
+        try:
+            return offset + self.scan_stream(stream, skip, scan_partial_line)
+        finally:
+            stream.close()
+            if proc:
+                proc.wait()
+
+    def scan(self, paths):
+        for path in paths:
+            if os.path.exists(path):
+                self.scan_file(path)
+        return self
+
+    def update(self, other):
+        """Merge a later log's index into this one"""
+        self.last_login.update(other.last_login)
+        self.last_activity.update(other.last_activity)
+        self.bytes_scanned += other.bytes_scanned
+        return self
+
+    # latin-1 maps bytes to code points 1:1, so index state survives a round trip through JSON unchanged
+    def to_state(self):
+        return {name: {k.decode("latin-1"): v.decode("latin-1") for k, v in getattr(self, name).items()}
+                for name in ("last_login", "last_activity")}
+
+    @classmethod
+    def from_state(cls, state):
+        analyzer = cls()
+        for name in ("last_login", "last_activity"):
+            getattr(analyzer, name).update(
+                (k.encode("latin-1").lower(), v.encode("latin-1")) for k, v in (state or {}).get(name, {}).items())
+        return analyzer
+
+    def report(self):
+        decode = lambda value: value.decode("utf-8", "replace").rstrip("\r")
+        # Each user is shown as spelled in their latest login
+        names = {user: decode(self.pattern.search(line).group(1) or user) for user, line in self.last_login.items()}
+        return {
+            "users": sorted(names.values()),
+            "last_login": {names[user]: decode(line) for user, line in self.last_login.items()},
+            "latest_activity": {names[user]: decode(line) for user, line in self.last_activity.items()
+                                if user in names},
+        }
+
+
+class CheckpointedLogScanner:
+    """
+    Incremental log scanning: a checkpoint per log file (inode, offset, a
+    fingerprint of its first bytes and the index built so far) lets repeated
+    checks read only what was appended since the last run. Rotated .gz logs
+    never change, so once scanned their index is reused without reading them;
+    when service.log has been rotated, the checkpoint of the old file is matched
+    to the new .gz by fingerprint and only the part after its offset is scanned.
+    """
+
+    head_size = 4096
+
+    def __init__(self, checkpoint_file=LOG_CHECKPOINT_FILE):
+        self.checkpoint_file = os.path.expanduser(checkpoint_file)
+        try:
+            with open(self.checkpoint_file) as f:
+                self.checkpoints = json.load(f)
+        except (OSError, ValueError):
+            self.checkpoints = {}
+        self.bytes_scanned = 0
+
+    def fingerprint(self, path):
+        return hashlib.sha256(self.read_head(path)).hexdigest()
+
+    def read_head(self, path):
+        return ServiceLogAnalyzer.read_head(path, self.head_size)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.checkpoint_file), exist_ok=True)
+        with open(self.checkpoint_file + ".tmp", "w") as f:
+            json.dump(self.checkpoints, f)
+        os.rename(self.checkpoint_file + ".tmp", self.checkpoint_file)
+
+    def scan_rotated(self, path, orphan):
+        """A compressed, rotated log: reuse its index, or continue the live checkpoint it was rotated from"""
+        st = os.stat(path)
+        saved = self.checkpoints.get(path)
+        if saved and saved.get("size") == st.st_size and saved.get("mtime") == st.st_mtime:
+            return ServiceLogAnalyzer.from_state(saved["state"])
+        analyzer, skip = ServiceLogAnalyzer(), 0
+        if orphan and orphan.get("head") and self.fingerprint(path) == orphan["head"]:
+            analyzer, skip = ServiceLogAnalyzer.from_state(orphan["state"]), orphan["offset"]
+        analyzer.scan_file(path, skip=skip)
+        self.checkpoints[path] = {"size": st.st_size, "mtime": st.st_mtime, "state": analyzer.to_state()}
+        return analyzer
+
+    def live_identity(self, path):
+        """(inode, size, fingerprint of the first head_size bytes, or None while the file is shorter)"""
+        st = os.stat(path)
+        head = self.read_head(path)
+        return st.st_ino, st.st_size, hashlib.sha256(head).hexdigest() if len(head) == self.head_size else None
+
+    @staticmethod
+    def is_same_file(saved, identity):
+        inode, size, fingerprint = identity
+        return (saved.get("inode") == inode and size >= saved["offset"]
+                and fingerprint is not None and saved.get("head") == fingerprint)
+
+    def scan_live(self, path, saved, identity):
+        if saved and self.is_same_file(saved, identity):
+            analyzer, offset = ServiceLogAnalyzer.from_state(saved["state"]), saved["offset"]
+        else:
+            analyzer, offset = ServiceLogAnalyzer(), 0
+        # A trailing partial line is left for the next run, which re-reads it from the checkpointed offset
+        offset = analyzer.scan_file(path, offset=offset, scan_partial_line=False)
+        self.checkpoints[path] = {
+            "inode": identity[0], "offset": offset, "head": identity[2], "state": analyzer.to_state()}
+        return analyzer
+
+    def scan(self, paths):
+        """Index paths (oldest first) incrementally, and return the merged index"""
+        merged = ServiceLogAnalyzer()
+        identities = {}
+        orphans = {}
+        for path in paths:
+            if path.endswith(".gz") or not os.path.exists(path):
+                continue
+            identities[path] = self.live_identity(path)
+            saved = self.checkpoints.get(path)
+            # A different inode, a shrunken file or a different first block means the file was rotated
+            # (a new file can reuse the old inode), so its checkpoint now belongs to the newest .gz
+            if saved and not self.is_same_file(saved, identities[path]):
+                orphans[path] = self.checkpoints.pop(path)
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            if path.endswith(".gz"):
+                orphan = orphans.get(re.sub(r"\.2[^/]*\.gz$", "", path))
+                analyzer = self.scan_rotated(path, orphan)
+            else:
+                analyzer = self.scan_live(path, self.checkpoints.get(path), identities[path])
+            merged.update(analyzer)
+        self.bytes_scanned = merged.bytes_scanned
+        for path in list(self.checkpoints):
+            if path not in paths:
+                del self.checkpoints[path]
+        self.save()
+        return merged
+
+
+def collect_user_activity(use_checkpoints=True):
+    paths = ServiceLogAnalyzer.recent_logs()
+    if not use_checkpoints:
+        return ServiceLogAnalyzer().scan(paths).report()
+    scanner = CheckpointedLogScanner()
+    report = scanner.scan(paths).report()
+    print("(Scanned {} of new log data; checkpoints: {})".format(
+        format_size(scanner.bytes_scanned), scanner.checkpoint_file), file=sys.stderr)
+    return report
+
+
+def collect_host_facts(delete_old_logs=True, use_checkpoints=True):
+    facts = {}
+    try:
+        facts["user_activity"] = collect_user_activity(use_checkpoints)
+    except OSError as e:
+        facts["user_activity"] = {"error": str(e)}
+    facts["fstab"] = command_output(["cat", "/etc/fstab"])
+    facts["lsblk"] = command_output(["sudo", "lsblk", "-a"])
+    history_file = os.path.expanduser("~/.bash_history")
+    history = open(history_file).read().splitlines() if os.path.isfile(history_file) else []
+    facts["su_history"] = [
+        line for line in history
+        if "su " in line and 'grep "su "' not in line and not re.search(r"\b(?:print_blank_lines|run_backups)\b", line)]
+    if delete_old_logs:
+        # Postgresql logs do not appear to be aged off like other logs, so delete all logs older than 60 days
+        for log_dir in ("/var/log/logichub/postgres", SERVICE_LOG_DIR):
+            subprocess.call(["sudo", "find", log_dir, "-type", "f", "-mtime", "+60", "-delete"])
+    subprocess.call(["sudo", "mkdir", "-p", "/var/log/logichub/threaddumps/"])
+    sizes = command_output(["sudo", "du", "-s", "-B1", "/var/log/logichub", "/var/log/logichub/threaddumps/"])
+    facts["log_disk_usage"] = {path: int(size) for size, path in (line.split("\t", 1) for line in sizes.splitlines())}
+    sudoers = command_output(["sudo", "cat", "/etc/sudoers"])
+    facts["sudoers_logichub"] = [line for line in sudoers.splitlines() if "logichub" in line]
+    return facts
+
+
+def collect_facts(delete_old_logs=True, use_checkpoints=True):
+    return {
+        "hostname": socket.gethostname(),
+        "collected_at": datetime.datetime.now().isoformat(),
+        "host": collect_host_facts(delete_old_logs, use_checkpoints),
+        "service": collect_service_facts(),
+        "postgres": collect_postgres_facts(),
+    }
+
+
+class Reviewer:
+    """Prints each check, pausing for review the same way the shell script does"""
+
+    def __init__(self, pause=True):
+        self.tty = None
+        if pause:
+            try:
+                # stdin is the pasted script itself, so prompts read from the terminal directly
+                self.tty = open("/dev/tty")
+            except OSError:
+                pass
+
+    @staticmethod
+    def skip_review():
+        print("\n*********************************************************\n")
+
+    def pause_for_review(self, text):
+        print("\n\n\n\nReview: {}\n".format(text))
+        if self.tty:
+            print("Press enter when finished reviewing...", end="", flush=True)
+            self.tty.readline()
+        self.skip_review()
+
+    def check(self, lines, review, skip_message=None):
+        if not lines and skip_message:
+            print(skip_message)
+            self.skip_review()
+            return
+        print("\n".join(lines) if isinstance(lines, list) else lines)
+        self.pause_for_review(review)
+
+
+def format_table(columns, rows):
+    widths = [max([len(c)] + [len(str(r[i])) for r in rows]) for i, c in enumerate(columns)]
+    lines = [" | ".join(c.ljust(w) for c, w in zip(columns, widths)), "-+-".join("-" * w for w in widths)]
+    lines += [" | ".join(str(v).ljust(w) for v, w in zip(row, widths)) for row in rows]
+    return lines + ["({} rows)".format(len(rows))]
+
+
+def image_tag(image):
+    return image.rsplit(":", 1)[-1] if image else "(no image)"
+
+
+def descriptor_lines(service):
+    """Edited descriptors from the hash diff, or from the file date heuristic if no baseline is available"""
+    diff = service.get("descriptor_diff") or {}
+    descriptors = service["descriptors"]
+    if diff.get("error") or not diff.get("baseline_count"):
+        lines = ["(No baseline for {}: {}; falling back to file dates)".format(
+            diff.get("image", "this version"), diff.get("error", "no descriptors in the image"))]
+        names = not_most_common_mtime(descriptors)
+        return lines + ["{}  {}  {}".format(minute(descriptors[n]["mtime"]), descriptors[n]["size"], n) for n in names]
+    lines = []
+    for entry in diff["modified"]:
+        lines.append("modified  {}  {} (shipped: {})".format(
+            entry["name"], image_tag(entry["image"]), image_tag(entry["baseline_image"])))
+    for entry in diff["added"]:
+        lines.append("added     {}  {}".format(entry["name"], image_tag(entry["image"])))
+    for entry in diff["removed"]:
+        lines.append("removed   {}  {}".format(entry["name"], image_tag(entry["image"])))
+    if lines:
+        lines.append("\n(compared against {} shipped descriptors in {}; {} file(s) re-hashed)".format(
+            diff["baseline_count"], diff["image"], service.get("descriptors_rehashed", 0)))
+    return lines
+
+
+def render_descriptors(service, reviewer):
+    reviewer.check(descriptor_lines(service),
+                   "edited descriptor files (note that these need to be backed up, compared in case they are newer "
+                   "than the version being upgraded to, and potentially restored after upgrade)",
+                   "No edited descriptor files in the service container; skipping...")
+
+
+def user_activity_lines(activity):
+    if activity.get("error"):
+        return ["Could not read the service logs: {}".format(activity["error"])]
+    lines = ["Users who have logged in recently:", ""] + ["    " + user for user in activity["users"]]
+    lines += ["", "", "Latest activity:", ""] + ["    " + line for line in sorted(set(activity["latest_activity"].values()))]
+    lines += ["", "", "Current date:", "", "    " + datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S (UTC)"), ""]
+    return lines
+
+
+def render(facts, reviewer):
+    host, service, postgres = facts["host"], facts["service"], facts["postgres"]
+
+    reviewer.check(user_activity_lines(host["user_activity"]),
+                   "Review recent user activity and see if instance is currently/recently in use")
+
+    reviewer.check(host["fstab"], "/etc/fstab: Check to be sure that there are no problems or duplicates")
+    reviewer.check(host["lsblk"], "lsblk: Check to be sure that there are no problems")
+    reviewer.check(host["su_history"],
+                   "Take note... su in history (in case it suggests that much work was done as a different user)",
+                   "no su in bash history; skipping...")
+
+    pip_requirements = service["pip_requirements"]
+    if pip_requirements["created"]:
+        print("pip-requirements.txt file not found. creating an empty file...\n")
+    else:
+        print("Displaying packages in pip-requirements.txt:\n\n{}\n".format(pip_requirements["content"]))
+    reviewer.check(service["bash_history"]["pip_commands"],
+                   "pip commands in service container's bash history... make sure no packages were installed "
+                   "that are not in pip-requirements.txt",
+                   "No relevant pip commands in service container's bash history; skipping...")
+    reviewer.check(service["bash_history"]["conf_mentions"],
+                   "Take note... .conf in service container's bash history, in case unique customizations have "
+                   "been made that should be taken into consideration",
+                   ".conf not in service container's bash history; skipping...")
+
+    conf_files = service["conf_files"]
+    reviewer.check(["{}  {}  /opt/docker/conf/{}".format(minute(conf_files[name]["mtime"]), conf_files[name]["size"], name)
+                    for name in not_most_common_mtime(conf_files)],
+                   "One or more files modified in /opt/docker/config in the service container. "
+                   "These changes will NOT be carried over during an upgrade!",
+                   "No modified stock config files (/opt/docker/config) in the service container; skipping...")
+
+    usage = service["disk_usage"]
+    reviewer.check(["/opt/docker/data/service:", "", format_size(usage["/opt/docker/data/service"]), "",
+                    "Size of heapdumps folder:", "", format_size(usage["/opt/docker/data/service/heapdumps"])],
+                   "size - /opt/docker/data/service (make sure this isn't excessive gzipping during backup)")
+    reviewer.check(format_size(usage["/opt/docker/resources"]),
+                   "size - /opt/docker/resources (make sure this isn't excessive gzipping during backup)")
+    log_usage = host["log_disk_usage"]
+    reviewer.check(["Total Log Size:", format_size(log_usage.get("/var/log/logichub", 0)), "",
+                    "Thread Dumps (will be excluded):", format_size(log_usage.get("/var/log/logichub/threaddumps/", 0))],
+                   "size - /var/log/logichub (make sure this isn't excessive gzipping during backup)")
+
+    steps_dir = service["dynamic_conf"]["userdefined_steps_dir"]
+    reviewer.check(["lhub.steps.userdefined.dir = {}".format(steps_dir)] if steps_dir else [],
+                   "user-defined steps in dynamic.conf",
+                   "lhub.steps.userdefined.dir not defined in dynamic.conf; skipping...")
+
+    render_descriptors(service, reviewer)
+
+    duplicates = [line for line, count in collections.Counter(host["sudoers_logichub"]).items() if count > 1]
+    reviewer.check(host["sudoers_logichub"] if duplicates else [],
+                   "look for duplicates in sudoers. Older installers (and maybe current too?) often duplicate "
+                   "entries, so this is a cleanup task.",
+                   "No duplicates found in sudoers; skipping...")
+
+    scripts = postgres["scripts"]
+    reviewer.check(format_table(["kind", "name"], [[s["kind"], s["name"]] for s in scripts]) if scripts else [],
+                   "Take note of descriptors and jar files in the scripts table, if any, just in case",
+                   "No descriptors or jar files in the scripts table; skipping...")
+
+    reviewer.check(service["dynamic_conf"]["content"], "Showing for terminal history: dynamic.conf")
+
+    columns = ["integration_name", "label", "id", "integration_id", "docker_tag", "image"]
+    reviewer.check(format_table(["Integration Name", "label", "id", "integration_id", "Docker tag", "Full Docker Image"],
+                                [[i[c] for c in columns] for i in postgres["integration_instances"]]),
+                   "Showing for terminal history: integration instances with image versions")
+    print("Complete.\n")
+
+
+def flatten(value, prefix=""):
+    """Flatten nested facts into path -> value pairs so that two runs can be compared key by key"""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, "{}/{}".format(prefix, key) if prefix else str(key)))
+        return items
+    return {prefix: value}
+
+
+def compare(old_facts, new_facts, ignore=("collected_at", "service/collected_at")):
+    old, new = flatten(old_facts), flatten(new_facts)
+    changes = 0
+    for key in sorted(set(old) | set(new)):
+        if key in ignore or old.get(key) == new.get(key):
+            continue
+        changes += 1
+        if key not in old:
+            print("+ {}: {}".format(key, json.dumps(new[key])))
+        elif key not in new:
+            print("- {}: {}".format(key, json.dumps(old[key])))
+        else:
+            print("~ {}: {} -> {}".format(key, json.dumps(old[key]), json.dumps(new[key])))
+    print("\n{} difference(s) between {} and {}".format(
+        changes, old_facts.get("collected_at"), new_facts.get("collected_at")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade Prep - Verifications (Python fact collector)")
+    parser.add_argument("--no-pause", action="store_true", help="Print every check without pausing for review")
+    parser.add_argument("--no-log-cleanup", action="store_true", help="Don't delete logs older than 60 days")
+    parser.add_argument("--facts", metavar="JSON", help="Render a previously saved facts file instead of collecting")
+    parser.add_argument("--compare", metavar="JSON", help="Compare against a previously saved facts file")
+    parser.add_argument("--descriptors-only", action="store_true",
+                        help="Only list edited descriptors (hash manifest vs. the image's shipped baseline)")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="Re-read the service logs in full instead of resuming from the saved checkpoints")
+    parser.add_argument("--user-activity", action="store_true",
+                        help="Only report recent UI user activity from the service logs")
+    args = parser.parse_args(argv)
+
+    if args.user_activity:
+        print("\n".join(user_activity_lines(collect_user_activity(not args.no_checkpoint))))
+        return 0
+    if args.descriptors_only:
+        render_descriptors(collect_service_facts(descriptors_only=True), Reviewer(pause=False))
+        return 0
+    if args.facts:
+        with open(args.facts) as f:
+            facts = json.load(f)
+    else:
+        facts = collect_facts(delete_old_logs=not args.no_log_cleanup, use_checkpoints=not args.no_checkpoint)
+        facts_file = "upgrade_prep_facts_{}_{}.json".format(
+            facts["hostname"], datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+        with open(facts_file, "w") as f:
+            json.dump(facts, f, indent=2, sort_keys=True)
+
+    print("\n\n")
+    render(facts, Reviewer(pause=not args.no_pause))
+    if not args.facts:
+        print("Facts saved to: {}\n".format(os.path.abspath(facts_file)))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), facts)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -195,7 +195,7 @@ run_prep_commands() {
     docker exec -it service cat /opt/docker/data/service/conf/dynamic.conf
     pause_for_review "Showing for terminal history: dynamic.conf"
 
-    docker exec -it postgres psql -P pager --u daemon lh -c "select substring(cast(descriptor::json->'name' as varchar) from '\"(.+)\"') as \"Integration Name\", label, id, integration_id, substring(cast(descriptor::json->'runtimeEnvironment'->'descriptor'->'image' as varchar) from ':([^:]+?)\"$') as \"Docker tag\", substring(cast(descriptor::json->'runtimeEnvironment'->'descriptor'->'image' as varchar) from '\"(.+)\"') as \"Full Docker Image\" from integration_instances order by integration_id, label;"
+    docker exec -it postgres psql -P pager --u daemon lh -c "select d.name as \"Integration Name\", i.label, i.id, i.integration_id, substring(d.image from ':([^:]+)$') as \"Docker tag\", d.image as \"Full Docker Image\" from integration_instances i cross join lateral (select j->>'name' as name, j#>>'{runtimeEnvironment,descriptor,image}' as image from (select i.descriptor::jsonb as j) x) d order by i.integration_id, i.label;"
     pause_for_review "Showing for terminal history: integration instances with image versions"
 
     # ToDo Add a step to check whether Stepped Navigation is enabled in dynamic.conf
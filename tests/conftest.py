@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "plugin"))
+
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes")
+
+
+@pytest.fixture(scope="session")
+def lhub():
+    import LHUB
+    return LHUB
@@ -0,0 +1,54 @@
+"""
+Stand-in for psql, backed by an in-memory SQLite database. It speaks the same subset
+of the psql pipe protocol as PsqlSession: statements terminated by ";", COPY (...) TO
+STDOUT WITH (FORMAT csv, HEADER), "\\echo <text> :ERROR" and "\\q". Errors are written
+to stderr as "ERROR:  ..." and reflected in :ERROR, as with psql 11+.
+"""
+import csv
+import re
+import sqlite3
+import sys
+
+copy_pattern = re.compile(r"^COPY \((.*)\) TO STDOUT WITH \(FORMAT csv, HEADER\);$", re.S)
+
+
+def main():
+    db = sqlite3.connect(":memory:")
+    error = False
+    buffer = []
+    for line in sys.stdin:
+        line = line.rstrip("\n")
+        if not buffer and line == "\\q":
+            return
+        if not buffer and line.startswith("\\echo "):
+            sys.stdout.write(line[len("\\echo "):].replace(":ERROR", "true" if error else "false") + "\n")
+            sys.stdout.flush()
+            continue
+        buffer.append(line)
+        if not line.rstrip().endswith(";"):
+            continue
+        statement = "\n".join(buffer)
+        buffer = []
+        try:
+            match = copy_pattern.match(statement)
+            if match:
+                cursor = db.execute(match.group(1))
+                writer = csv.writer(sys.stdout, lineterminator="\n")
+                writer.writerow([c[0] for c in cursor.description])
+                writer.writerows(cursor)
+            elif statement.strip() == "select pg_sleep_forever();":
+                sys.stdout.flush()
+                sys.stdin.readline()
+            else:
+                for row in db.execute(statement):
+                    sys.stdout.write("|".join("" if v is None else str(v) for v in row) + "\n")
+            error = False
+        except sqlite3.Error as err:
+            sys.stderr.write("ERROR:  {}\n".format(err))
+            sys.stderr.flush()
+            error = True
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+import types
+
+import pytest
+
+
+@pytest.fixture
+def fake_plugin(tmp_path):
+    """A process started the way spawn_background_action starts one: <python> <plugin script> <action id>"""
+    script = tmp_path / "LHUB.py"
+    script.write_text("import time\ntime.sleep(30)\n")
+    proc = subprocess.Popen([sys.executable, str(script), "_userspace_forward_web"])
+    yield types.SimpleNamespace(script_name=str(script)), proc
+    proc.kill()
+    proc.wait()
+
+
+def test_process_running_the_action_is_recognised(lhub, fake_plugin):
+    actions, proc = fake_plugin
+    assert lhub.Actions._is_background_action_process(actions, proc.pid, "_userspace_forward_web")
+
+
+def test_other_action_or_reused_pid_is_not_recognised(lhub, fake_plugin):
+    actions, proc = fake_plugin
+    assert not lhub.Actions._is_background_action_process(actions, proc.pid, "_userspace_forward_db")
+    unrelated = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)", "_userspace_forward_web"])
+    try:
+        assert not lhub.Actions._is_background_action_process(actions, unrelated.pid, "_userspace_forward_web")
+    finally:
+        unrelated.kill()
+        unrelated.wait()
+
+
+def test_missing_pid_is_not_recognised(lhub, fake_plugin):
+    actions, _ = fake_plugin
+    assert not lhub.Actions._is_background_action_process(actions, 0, "_userspace_forward_web")
+    assert not lhub.Actions._is_background_action_process(actions, 2 ** 22 + 1, "_userspace_forward_web")
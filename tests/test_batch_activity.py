@@ -0,0 +1,50 @@
+import re
+
+
+class FakeDb:
+    """Answers BatchActivityCollector queries from an in-memory batches table"""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.queries = []
+
+    def query_to_dicts(self, query):
+        self.queries.append(query)
+        where = query.split(" where ", 1)[1]
+        watermark = re.search(r"a\.id > (\d+)", where)
+        tracked = re.search(r"a\.id in \(([\d, ]+)\)", where)
+        tracked = {int(x) for x in tracked.group(1).split(",")} if tracked else set()
+        not_in = re.search(r"a\.state not in \(([^)]*)\)", where)
+        finished = set(re.findall(r"'([^']+)'", not_in.group(1))) if not_in else None
+        rows = []
+        for batch_id, state in self.batches.items():
+            if (finished is not None and state not in finished) \
+                    or ("select max(id)" in where and batch_id == max(self.batches)) \
+                    or (watermark and batch_id > int(watermark.group(1))) \
+                    or batch_id in tracked:
+                rows.append({"id": str(batch_id), "state": state, "stream_id": "1", "stream_name": "stream-1"})
+        return rows
+
+
+def test_batch_queued_below_watermark_is_seen_when_it_starts(lhub, tmp_path):
+    collector = lhub.BatchActivityCollector(str(tmp_path / "batches.json"))
+    db = FakeDb({1: "scheduled", 2: "executing", 3: "finished"})
+    collector.poll(db)
+    assert set(collector.executing) == {"2"}
+    assert collector.state["watermark"] == 3
+
+    db.batches[1] = "executing"
+    collector.poll(db)
+    assert set(collector.executing) == {"1", "2"}
+    # Later polls stay incremental: only past the watermark, or tracked by ID
+    assert "a.state" not in db.queries[-1].split(" where ", 1)[1]
+
+
+def test_finished_batches_stop_being_tracked(lhub, tmp_path):
+    collector = lhub.BatchActivityCollector(str(tmp_path / "batches.json"))
+    db = FakeDb({5: "executing"})
+    collector.poll(db)
+    db.batches[5] = "finished"
+    db.batches[6] = "executing"
+    collector.poll(db)
+    assert set(collector.executing) == {"6"}
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def html_dir(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    for n, color in enumerate(["red", "green", "blue"], start=1):
+        (pages / f"page_{n}.html").write_text(f"<html><body style='background: {color}'><h1>Page {n}</h1></body></html>")
+    (pages / "notes.txt").write_text("not an HTML file")
+    return pages
+
+
+def test_directory_resolves_to_file_urls_of_its_html_files(lhub, html_dir):
+    urls = lhub.BatchScreenshotter.resolve_items(str(html_dir))
+    assert urls == [(html_dir / f"page_{n}.html").as_uri() for n in (1, 2, 3)]
+
+
+def test_list_file_resolves_urls_and_paths(lhub, html_dir, tmp_path):
+    list_file = tmp_path / "urls.txt"
+    list_file.write_text(f"# comment\nhttps://example.com/a\n\n{html_dir / 'page_1.html'}\n")
+    assert lhub.BatchScreenshotter.resolve_items(str(list_file)) == [
+        "https://example.com/a", (html_dir / "page_1.html").as_uri()]
+
+
+def test_output_names_are_deterministic(lhub, html_dir):
+    url = (html_dir / "page_1.html").as_uri()
+    name = lhub.BatchScreenshotter.output_name(1, url)
+    assert name == lhub.BatchScreenshotter.output_name(1, url)
+    assert name.startswith("001_page_1_") and name.endswith(".png")
+    assert name != lhub.BatchScreenshotter.output_name(1, url + "?v=2")
+
+
+def test_batch_renders_local_html_files(lhub, html_dir, tmp_path):
+    if lhub.chrome_driver_error:
+        pytest.skip(lhub.chrome_driver_error)
+    urls = lhub.BatchScreenshotter.resolve_items(str(html_dir))
+    output_dir = str(tmp_path / "screenshots")
+    progress = []
+    results = lhub.BatchScreenshotter(workers=2, timeout=30, window_size="800,600").run(urls, output_dir, progress=progress.append)
+
+    assert [r["index"] for r in results] == [1, 2, 3]
+    assert len(progress) == 3
+    for result in results:
+        assert result["status"] == "ok", result["error"]
+        with open(os.path.join(output_dir, result["file"]), "rb") as f:
+            assert f.read(8) == PNG_SIGNATURE
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        assert [item["file"] for item in json.load(f)["items"]] == [r["file"] for r in results]
@@ -0,0 +1,107 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import types
+
+import pytest
+
+
+class FakeActions:
+    """Just enough of Actions for _browser_pool_client, with a pool process which exits without listening"""
+
+    def __init__(self, lhub, data_dir):
+        self.lhub = lhub
+        self.data_dir = data_dir
+        self.config = types.SimpleNamespace(plugin_data_path=lambda name: os.path.join(data_dir, name))
+        self.script_name = os.path.join(data_dir, "LHUB.py")
+        self.spawned = 0
+
+    def spawn_background_action(self, action_id, lock_name):
+        self.spawned += 1
+        process = subprocess.Popen([sys.executable, "-c", "pass", self.script_name, action_id])
+        self.lhub.Reusable.write_json_file(self.config.plugin_data_path(f"{lock_name}.pid"), {"pid": process.pid})
+        self.process = process
+
+    def _is_background_action_process(self, pid, action_id):
+        return self.lhub.Actions._is_background_action_process(self, pid, action_id)
+
+    def _browser_pool_client(self, wait=30):
+        return self.lhub.Actions._browser_pool_client(self, wait=wait)
+
+
+@pytest.fixture
+def actions(lhub, tmp_path):
+    return FakeActions(lhub, str(tmp_path))
+
+
+def test_failed_pool_start_is_detected_without_waiting(actions):
+    start = time.time()
+    assert actions._browser_pool_client(wait=30) is None
+    assert time.time() - start < 10
+    failure = actions.lhub.Reusable.read_json_file(actions.config.plugin_data_path("browser_pool_failure.json"))
+    assert failure["attempts"] == 1
+    assert failure["retry_at"] > time.time() + 250
+
+
+def test_pool_is_not_restarted_during_backoff(actions):
+    actions._browser_pool_client(wait=30)
+    start = time.time()
+    assert actions._browser_pool_client(wait=30) is None
+    assert time.time() - start < 1
+    assert actions.spawned == 1
+
+
+def test_backoff_doubles_after_each_failure(actions):
+    failure_file = actions.config.plugin_data_path("browser_pool_failure.json")
+    actions._browser_pool_client(wait=30)
+    failure = actions.lhub.Reusable.read_json_file(failure_file)
+    actions.lhub.Reusable.write_json_file(failure_file, dict(failure, retry_at=0))
+    actions._browser_pool_client(wait=30)
+    failure = actions.lhub.Reusable.read_json_file(failure_file)
+    assert failure["attempts"] == 2
+    assert failure["retry_at"] - time.time() > 550
+
+
+class HangingDriver:
+    """Stands in for a Chrome driver whose page loads always hit the page load timeout"""
+
+    def __init__(self, lhub):
+        self.lhub = lhub
+        self.window_handles = ["base"]
+        self.current_window_handle = "base"
+        self.quit_called = False
+
+    def execute_script(self, script):
+        self.window_handles.append(f"tab{len(self.window_handles)}")
+
+    @property
+    def switch_to(self):
+        return types.SimpleNamespace(window=lambda handle: setattr(self, "current_window_handle", handle))
+
+    def set_window_size(self, width, height):
+        pass
+
+    def get(self, url):
+        raise self.lhub.TimeoutException("timeout: Timed out receiving message from renderer")
+
+    def close(self):
+        self.window_handles.remove(self.current_window_handle)
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_hung_page_fails_its_capture_and_keeps_the_browser(lhub, tmp_path):
+    server = lhub.BrowserPoolServer(str(tmp_path / "pool.sock"), page_load_timeout=5)
+    driver = HangingDriver(lhub)
+    server.browser = types.SimpleNamespace(driver=driver, window_size="800x600")
+    client_side, server_side = socket.socketpair()
+    with client_side, server_side:
+        client_side.sendall(b'{"url": "https://example.com", "save_path": "/tmp/x.png"}\n')
+        server._handle(server_side)
+        response = client_side.makefile().readline()
+    assert "within 5 seconds" in response
+    assert driver.window_handles == ["base"] and driver.current_window_handle == "base"
+    assert server.browser is not None and not driver.quit_called
@@ -0,0 +1,28 @@
+import subprocess
+import types
+
+import pytest
+
+from conftest import REPO_DIR
+
+
+class FakeActions:
+    def __init__(self):
+        self.config = types.SimpleNamespace(dir_supporting_scripts=f"{REPO_DIR}/scripts")
+        self.clipboard = None
+
+    def write_clipboard(self, text):
+        self.clipboard = text
+
+    def display_notification_error(self, message):
+        raise AssertionError(message)
+
+
+@pytest.mark.parametrize("file_name", ["upgrade_prep-backups.py", "upgrade_prep-verify.py"])
+def test_copied_script_runs_when_pasted_into_a_shell(lhub, file_name):
+    actions = FakeActions()
+    lhub.Actions.copy_python_script_to_clipboard(actions, file_name, args="--help")
+    assert actions.clipboard.startswith("python3 - --help <<'LHUB_SCRIPT_EOF'\n")
+    result = subprocess.run(["bash", "-c", actions.clipboard], capture_output=True, universal_newlines=True)
+    assert result.returncode == 0, result.stderr
+    assert "usage:" in result.stdout
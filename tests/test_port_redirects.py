@@ -0,0 +1,51 @@
+import subprocess
+
+import pytest
+
+
+@pytest.fixture
+def pfctl_calls(lhub, monkeypatch):
+    calls = []
+
+    def fake_run(command, input=None, **kwargs):
+        calls.append((command, input))
+        return subprocess.CompletedProcess(command, 0, stdout="", stderr="")
+
+    monkeypatch.setattr(lhub.subprocess, "run", fake_run)
+    monkeypatch.setattr(lhub.Reusable, "do_prompt_for_sudo", lambda *args, **kwargs: None)
+    return calls
+
+
+@pytest.fixture
+def anchor(lhub, tmp_path):
+    return lhub.PortRedirectAnchor(str(tmp_path / "pf_redirects.json"))
+
+
+def test_main_ruleset_is_reset_once_then_only_the_anchor_changes(lhub, anchor, pfctl_calls, tmp_path):
+    anchor.add("web", "127.0.0.2", 443, "127.0.0.1", 8443)
+    anchor.load()
+    anchor.remove("web")
+    anchor.load()
+    anchor.flush()
+    commands = [command for command, _ in pfctl_calls]
+    assert commands[0] == ["sudo", "pfctl", "-f", "/etc/pf.conf"]
+    assert all(command[2:4] == ["-a", lhub.PortRedirectAnchor.anchor] for command in commands[1:])
+    assert len(commands) == 4
+    # A new instance (i.e. a later menu click) doesn't reset the main ruleset again
+    lhub.PortRedirectAnchor(str(tmp_path / "pf_redirects.json")).flush()
+    assert pfctl_calls[-1][0][2:4] == ["-a", lhub.PortRedirectAnchor.anchor]
+
+
+def test_rules_are_loaded_into_the_anchor(lhub, anchor, pfctl_calls):
+    anchor.add("web", "127.0.0.2", 443, "127.0.0.1", 8443)
+    anchor.load()
+    command, rules = pfctl_calls[-1]
+    assert command[-2:] == ["-ef", "-"]
+    assert "rdr pass inet proto tcp from any to 127.0.0.2 port 443 -> 127.0.0.1 port 8443" in rules
+
+
+def test_emptying_the_anchor_never_flushes_global_state(anchor, pfctl_calls):
+    anchor.load()
+    anchor.flush()
+    flushes = [command for command, _ in pfctl_calls if "-F" in command]
+    assert flushes and all(command[command.index("-F") + 1] == "nat" for command in flushes)
@@ -0,0 +1,61 @@
+import os
+import shlex
+import sys
+
+import pytest
+
+from conftest import FAKES_DIR
+
+FAKE_PSQL = "{} {}".format(shlex.quote(sys.executable), shlex.quote(os.path.join(FAKES_DIR, "psql.py")))
+
+
+@pytest.fixture
+def db(lhub):
+    with lhub.PsqlSession(psql_command=FAKE_PSQL, timeout=10) as session:
+        session.execute("create table users (id integer, name text)")
+        session.execute("insert into users values (1, 'admin'), (2, 'a, \"quoted\"\nname')")
+        yield session
+
+
+def test_csv_rows_include_header_and_quoted_values(db):
+    rows = list(db.iter_csv_rows("select id, name from users order by id;"))
+    assert rows == [["id", "name"], ["1", "admin"], ["2", 'a, "quoted"\nname']]
+
+
+def test_query_to_dicts(db):
+    assert db.query_to_dicts("select name from users where id = 1") == [{"name": "admin"}]
+
+
+def test_iter_lines_and_multiple_queries_share_one_process(db):
+    pid = db.process.pid
+    assert list(db.iter_lines("select count(*) from users")) == ["2"]
+    assert list(db.iter_lines("select max(id) from users")) == ["2"]
+    assert db.process.pid == pid
+
+
+def test_query_to_csv_counts_rows(db, tmp_path):
+    csv_file = str(tmp_path / "users.csv")
+    assert db.query_to_csv("select * from users", csv_file) == 2
+    with open(csv_file) as f:
+        assert f.readline().strip() == "id,name"
+
+
+def test_error_is_raised_and_session_stays_usable(db):
+    with pytest.raises(RuntimeError, match="no such table"):
+        db.execute("select * from missing_table")
+    assert list(db.iter_lines("select 1")) == ["1"]
+
+
+def test_timeout_kills_the_session(lhub):
+    with lhub.PsqlSession(psql_command=FAKE_PSQL, timeout=1) as session:
+        with pytest.raises(RuntimeError, match="ended unexpectedly"):
+            session.execute("select pg_sleep_forever()")
+        # The killed process may not have been reaped yet, so either error is fine
+        with pytest.raises(RuntimeError):
+            session.execute("select 1")
+
+
+def test_missing_binary_raises_runtime_error(lhub):
+    session = lhub.PsqlSession(psql_command="/nonexistent/psql")
+    with pytest.raises(RuntimeError, match="Failed to start psql session"):
+        session.open()
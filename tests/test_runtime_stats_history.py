@@ -0,0 +1,29 @@
+import sqlite3
+import types
+
+import pytest
+
+
+class BrokenHistory:
+    def __init__(self, error):
+        self.error = error
+
+    def record_batch(self, batch_stats):
+        raise self.error
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("error", [sqlite3.OperationalError("database is locked"), KeyError("runtimeStats"), ValueError("bad timestamp")])
+def test_history_errors_never_reach_the_action(lhub, error):
+    actions = types.SimpleNamespace(_open_runtime_stats_history=lambda: BrokenHistory(error))
+    lhub.Actions._record_runtime_stats_history(actions, {"runtimeStats": {}})
+
+
+def test_unwritable_history_database_is_ignored(lhub):
+    def open_history():
+        raise PermissionError(13, "Permission denied")
+
+    actions = types.SimpleNamespace(_open_runtime_stats_history=open_history)
+    lhub.Actions._record_runtime_stats_history(actions, {"runtimeStats": {}})
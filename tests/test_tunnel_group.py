@@ -0,0 +1,47 @@
+import types
+
+import pytest
+
+
+class FakeLoopback:
+    def __init__(self):
+        self.planned = []
+
+    def plan(self, addresses):
+        self.planned.append(set(addresses))
+        return [], []
+
+    def apply(self, add=()):
+        raise AssertionError(f"No aliases should be created: {add}")
+
+
+@pytest.fixture
+def actions(lhub, tmp_path, monkeypatch):
+    def tunnel(local_address):
+        return {"type": "ssh", "ssh_server": "jumphost", "remote_ip": "10.0.0.5", "remote_port": "443",
+                "local_address": local_address, "local_port": "8443"}
+
+    configs = {"default": tunnel("127.0.0.1"), "outside": tunnel("10.1.2.3")}
+    actions = types.SimpleNamespace(
+        config=types.SimpleNamespace(
+            menu_networking=types.SimpleNamespace(configs=configs),
+            main=types.SimpleNamespace(ssh_control_master=False),
+            local_user="user", default_ssh_key="~/.ssh/id_rsa",
+        ),
+        loopback=FakeLoopback(),
+        notifications=[],
+    )
+    actions.display_notification = actions.notifications.append
+    actions._open_tunnel_registry = lambda: lhub.TunnelRegistry(str(tmp_path / "tunnels.json"))
+    actions._build_ssh_tunnel = lhub.Actions._build_ssh_tunnel.__get__(actions)
+    actions._validate_loopback_addresses = lhub.Actions._validate_loopback_addresses
+    monkeypatch.setattr(lhub.Reusable, "do_prompt_for_sudo", lambda *args, **kwargs: pytest.fail("No sudo expected"))
+    return actions
+
+
+def test_group_members_with_unusable_loopback_addresses_fail_before_aliases_are_planned(lhub, actions, capsys):
+    lhub.Actions.do_execute_ssh_tunnel_group(actions, "group", ["default", "outside"])
+    assert actions.loopback.planned == [set()]
+    assert actions.notifications == ["0 of 2 tunnels started; 2 failed"]
+    output = capsys.readouterr().out
+    assert "other than 127.0.0.1" in output and "Invalid loopback address (10.1.2.3)" in output
@@ -0,0 +1,78 @@
+import socket
+import time
+
+import pytest
+
+
+@pytest.fixture
+def listening_port():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def closed_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.fixture
+def monitor(lhub, tmp_path):
+    return lhub.TunnelHealthMonitor(str(tmp_path / "tunnel_health.json"), timeout=1.0, backoff_base=30, backoff_max=100)
+
+
+def test_listening_endpoint_is_up(monitor, listening_port):
+    results = monitor.probe([("127.0.0.1", listening_port)])
+    key = f"127.0.0.1:{listening_port}"
+    assert results[key]["up"] and results[key]["latency_ms"] is not None
+    assert not monitor.is_down(key)
+    assert monitor.status_label(key).endswith("ms")
+
+
+def test_closed_endpoint_is_down(monitor, closed_port):
+    key = f"127.0.0.1:{closed_port}"
+    monitor.probe([("127.0.0.1", closed_port)])
+    assert monitor.is_down(key)
+    assert monitor.status_label(key, expected_up=True) == "○ down"
+    assert monitor.status_label(key) == ""
+
+
+def test_unprobed_endpoint_is_not_down(monitor):
+    assert not monitor.is_down("127.0.0.1:1")
+
+
+def test_restart_backoff_doubles_up_to_the_maximum(monitor, closed_port):
+    key = f"127.0.0.1:{closed_port}"
+    monitor.probe([("127.0.0.1", closed_port)])
+    assert monitor.is_down(key) and monitor.restart_due(key)
+
+    delays = []
+    for _ in range(4):
+        before = time.time()
+        monitor.record_restart(key, "failed")
+        next_attempt = monitor.state["restarts"][key]["next_attempt"]
+        delays.append(round(next_attempt - before))
+        assert not monitor.restart_due(key)
+        assert monitor.restart_due(key, now=next_attempt)
+    assert delays == [30, 60, 100, 100]
+
+
+def test_endpoint_seen_up_resets_backoff(monitor, listening_port):
+    key = f"127.0.0.1:{listening_port}"
+    monitor.record_restart(key, "failed")
+    assert not monitor.restart_due(key)
+    monitor.probe([("127.0.0.1", listening_port)])
+    assert monitor.restart_due(key)
+
+
+def test_state_is_saved_and_reloaded(lhub, monitor, closed_port, tmp_path):
+    monitor.probe([("127.0.0.1", closed_port)])
+    monitor.save()
+    reloaded = lhub.TunnelHealthMonitor(str(tmp_path / "tunnel_health.json"))
+    assert reloaded.is_down(f"127.0.0.1:{closed_port}")
@@ -0,0 +1,74 @@
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+FORWARD = ("127.0.0.2", "8443", "10.0.0.5", "443")
+
+
+@pytest.fixture
+def fake_ssh(tmp_path):
+    """A long-running process named ssh, with a -L forward on its command line"""
+    ssh = tmp_path / "ssh"
+    ssh.symlink_to(shutil.which("bash"))
+    proc = subprocess.Popen([str(ssh), "-c", "sleep 30; :", "-L", ":".join(FORWARD), "-N", "user@jumphost"])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+@pytest.fixture
+def other_process():
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def register(lhub, tmp_path, pid, forward=FORWARD):
+    registry = lhub.TunnelRegistry(str(tmp_path / "tunnels.json"))
+    local_address, local_port, remote_address, remote_port = forward
+    registry.add(pid, "test", local_address, local_port, remote_address, remote_port, "user@jumphost")
+    return registry
+
+
+def test_registered_ssh_tunnel_is_found(lhub, tmp_path, fake_ssh):
+    registry = register(lhub, tmp_path, fake_ssh.pid)
+    assert registry.tunnels["127.0.0.2:8443"]["create_time"]
+    assert set(registry.find()) == {"127.0.0.2:8443"}
+
+
+def test_ssh_process_without_the_forward_is_dropped(lhub, tmp_path, fake_ssh):
+    registry = register(lhub, tmp_path, fake_ssh.pid, forward=("127.0.0.2", "9000", "10.0.0.5", "443"))
+    assert registry.find() == {}
+    assert registry.tunnels == {}
+
+
+def test_reused_pid_is_dropped(lhub, tmp_path, fake_ssh):
+    registry = register(lhub, tmp_path, fake_ssh.pid)
+    registry.tunnels["127.0.0.2:8443"]["create_time"] -= 3600
+    assert registry.find() == {}
+    assert registry.tunnels == {}
+
+
+def test_non_ssh_process_is_dropped(lhub, tmp_path, other_process):
+    registry = register(lhub, tmp_path, other_process.pid)
+    assert registry.find() == {}
+    assert other_process.poll() is None
+
+
+def test_terminate_never_kills_non_ssh_processes(lhub, monkeypatch, other_process):
+    calls = []
+    monkeypatch.setattr(lhub.Reusable, "do_prompt_for_sudo", lambda *args, **kwargs: calls.append("sudo"))
+    monkeypatch.setattr(lhub.Reusable, "run_cli_command", lambda command, *args, **kwargs: calls.append(command))
+    lhub.TunnelRegistry.terminate([other_process.pid, 2 ** 22 + 1])
+    assert calls == []
+
+
+def test_terminate_kills_ssh_processes(lhub, monkeypatch, fake_ssh):
+    calls = []
+    monkeypatch.setattr(lhub.Reusable, "do_prompt_for_sudo", lambda *args, **kwargs: None)
+    monkeypatch.setattr(lhub.Reusable, "run_cli_command", lambda command, *args, **kwargs: calls.append(command))
+    lhub.TunnelRegistry.terminate([fake_ssh.pid])
+    assert calls == [["sudo", "kill", "-9", str(fake_ssh.pid)]]